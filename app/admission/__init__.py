@@ -0,0 +1,234 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, NamedTuple, Optional, Tuple
+from starlette.responses import JSONResponse
+from app.metrics import Counter, Gauge, Histogram
+from app.sessions import SessionStore, session_store
+
+# Admission control перед маршрутизацією: окремі пули для читання та запису, ліміти
+# для окремих маршрутів запису, token bucket на клієнта і коротка обмежена черга.
+# Коли черга повна або очікування задовге — одразу 503 з Retry-After, а не наростання латентності.
+
+
+class PoolLimits(NamedTuple):
+    concurrency: int
+    queue_size: int
+    queue_timeout: float
+    # Token bucket на клієнта: запитів за секунду і розмір сплеску; None — без обмеження
+    rate: Optional[float] = None
+    burst: Optional[int] = None
+
+
+POOLS: Dict[str, PoolLimits] = {
+    'read': PoolLimits(concurrency=64, queue_size=128, queue_timeout=2.0),
+    'write': PoolLimits(concurrency=16, queue_size=32, queue_timeout=1.0, rate=5.0, burst=20),
+}
+# Додаткові ліміти гарячих маршрутів запису (у межах пулу write)
+ROUTE_LIMITS: Dict[Tuple[str, str], PoolLimits] = {
+    ('POST', '/order'): PoolLimits(concurrency=8, queue_size=16, queue_timeout=1.0),
+    ('POST', '/orders/bulk'): PoolLimits(concurrency=2, queue_size=4, queue_timeout=1.0),
+    ('POST', '/register'): PoolLimits(concurrency=4, queue_size=8, queue_timeout=1.0),
+    ('POST', '/login'): PoolLimits(concurrency=8, queue_size=16, queue_timeout=1.0),
+}
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Scrape метрик і довгі SSE-потоки не займають слоти пулів
+EXEMPT_PATHS = ('/metrics',)
+EXEMPT_SUFFIXES = ('/events',)
+SESSION_COOKIE = 'session_token'
+# TECHSTORE_ADMISSION=0 вимикає шар повністю, TECHSTORE_RATE_LIMIT=0 — лише ліміт частоти
+# (навантажувальні тести з однієї адреси)
+ADMISSION_ENABLED = os.environ.get('TECHSTORE_ADMISSION', '1') != '0'
+RATE_LIMIT_ENABLED = os.environ.get('TECHSTORE_RATE_LIMIT', '1') != '0'
+MAX_CLIENTS = 10000
+
+admission_queue_seconds = Histogram('admission_queue_seconds', 'Time requests waited for an admission slot.',
+                                    ('pool',))
+admission_rejections_total = Counter('admission_rejections_total', 'Requests rejected by admission control.',
+                                     ('pool', 'reason'))
+admission_active = Gauge('admission_active', 'Requests holding an admission slot.', ('pool',))
+admission_queued = Gauge('admission_queued', 'Requests waiting for an admission slot.', ('pool',))
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CapacityPool:
+    # Працює в одному event loop воркера, тож без блокувань; звільнений слот передається
+    # першому в черзі напряму, без гонки з новими запитами
+    def __init__(self, name: str, limits: PoolLimits):
+        self.name = name
+        self.limits = limits
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _publish(self):
+        admission_active.set(self.active, pool=self.name)
+        admission_queued.set(len(self._waiters), pool=self.name)
+
+    async def acquire(self) -> float:
+        if self.active < self.limits.concurrency and not self._waiters:
+            self.active += 1
+            self._publish()
+            return 0.0
+        if len(self._waiters) >= self.limits.queue_size:
+            raise Rejected(503, 'queue_full', self.limits.queue_timeout)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._publish()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.limits.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._abandon(future)
+                raise Rejected(503, 'queue_timeout', self.limits.queue_timeout)
+        except asyncio.CancelledError:
+            # Клієнт відʼєднався: слот, переданий у той самий момент, повертається
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self._abandon(future)
+            raise
+        return time.perf_counter() - start
+
+    def _abandon(self, future: asyncio.Future):
+        future.cancel()
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+        self._publish()
+
+    def release(self):
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._publish()
+                return
+        self.active -= 1
+        self._publish()
+
+    def stats(self) -> dict:
+        return {'active': self.active, 'queued': len(self._waiters), 'limit': self.limits.concurrency}
+
+
+class TokenBuckets:
+    def __init__(self, rate: float, burst: int, maxsize: int = MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        # key -> (токени, час останнього поповнення); LRU-витіснення неактивних клієнтів
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+
+    def take(self, key: str) -> float:
+        # 0 — запит дозволено, інакше секунди до наступного токена
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+def client_key(scope, sessions: SessionStore = session_store) -> str:
+    # Користувач дійсної сесії (кілька людей за одним NAT не ділять ліміт), інакше IP.
+    # Довільне значення cookie не дає нового bucket: токен має бути в локальному кеші сесій.
+    # Backend не читається: middleware працює в event loop, а вигадані токени не кешуються
+    for name, value in scope.get('headers', ()):
+        if name == b'cookie':
+            for part in value.decode('latin-1').split(';'):
+                key, _, token = part.strip().partition('=')
+                if key == SESSION_COOKIE and token:
+                    principal = sessions.cached(token)
+                    if principal is not None:
+                        return f'user:{principal.id}'
+    client = scope.get('client')
+    return 'ip:' + (client[0] if client else 'unknown')
+
+
+class AdmissionController:
+    def __init__(self, pools: Dict[str, PoolLimits] = None, routes: Dict[Tuple[str, str], PoolLimits] = None,
+                 sessions: SessionStore = session_store):
+        pools = POOLS if pools is None else pools
+        routes = ROUTE_LIMITS if routes is None else routes
+        self.enabled = ADMISSION_ENABLED
+        self.rate_limit = RATE_LIMIT_ENABLED
+        self.sessions = sessions
+        self.pools = {name: CapacityPool(name, limits) for name, limits in pools.items()}
+        self.routes = {key: CapacityPool(f'{key[0]} {key[1]}', limits) for key, limits in routes.items()}
+        self.buckets = {name: TokenBuckets(limits.rate, limits.burst or 1)
+                        for name, limits in pools.items() if limits.rate}
+
+    def classify(self, method: str, path: str) -> Optional[str]:
+        if path in EXEMPT_PATHS or path.endswith(EXEMPT_SUFFIXES):
+            return None
+        return 'read' if method in READ_METHODS else 'write'
+
+    async def admit(self, scope, pool_name: str) -> Tuple[CapacityPool, ...]:
+        if self.rate_limit and pool_name in self.buckets:
+            wait = self.buckets[pool_name].take(client_key(scope, self.sessions))
+            if wait:
+                raise Rejected(429, 'rate_limited', wait)
+        held = []
+        try:
+            # Спершу ліміт маршруту, потім пул: запити одного гарячого маршруту не займають увесь пул
+            route = self.routes.get((scope['method'], scope['path']))
+            for pool in (route, self.pools[pool_name]):
+                if pool is None:
+                    continue
+                waited = await pool.acquire()
+                held.append(pool)
+                admission_queue_seconds.observe(waited, pool=pool.name)
+        except BaseException:
+            for pool in reversed(held):
+                pool.release()
+            raise
+        return tuple(held)
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in (*self.pools.items(), *self.routes.items())}
+
+
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        pool_name = controller.classify(scope['method'], scope['path']) if scope['type'] == 'http' else None
+        if pool_name is None or not controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        try:
+            held = await controller.admit(scope, pool_name)
+        except Rejected as e:
+            admission_rejections_total.inc(pool=pool_name, reason=e.reason)
+            response = JSONResponse({'detail': 'Too many requests' if e.status == 429 else 'Server busy'},
+                                    status_code=e.status,
+                                    headers={'Retry-After': str(max(1, math.ceil(e.retry_after)))})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            for pool in reversed(held):
+                pool.release()
@@ -1,25 +1,214 @@
-from app.models import Order, User, Product, SessionLocal
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Iterable, List, Optional
+from sqlalchemy import insert, select
+from app.models import Order, User, Product, SessionLocal, AsyncSessionLocal
+from app.inventory import inventory
+from app.reports import apply_in_transaction
+from app.utils import order_changes
+
+# Group commit: конкурентні OrderBuilder.save() обʼєднуються одним потоком-писачем
+# в одну транзакцію, тож SQLite робить один commit (і один fsync) на пакет
+class GroupCommitWriter:
+    def __init__(self, session_factory=SessionLocal, max_batch: int = 256, max_wait: float = 0.002):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.orders = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='order-group-commit', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+            self._thread = None
+
+    def submit_future(self, order: Order) -> Future:
+        self.start()
+        future = Future()
+        self._queue.put((order, future))
+        return future
+
+    def submit(self, order: Order) -> Order:
+        return self.submit_future(order).result()
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.max_wait)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            try:
+                self._commit([order for order, _ in batch])
+            except Exception:
+                # Один некоректний рядок не повинен зламати весь пакет: повтор поодинці
+                for order, future in batch:
+                    try:
+                        self._commit([order])
+                    except Exception as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(order)
+            else:
+                for order, future in batch:
+                    future.set_result(order)
+
+    def _commit(self, orders: List[Order]):
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            # Резерв залишку в тій самій транзакції; OutOfStock повертає пакет на повтор поодинці
+            inventory.reserve_orders(db, orders)
+            db.add_all(orders)
+            db.flush()
+            apply_in_transaction(db, [order.id for order in orders])
+            db.commit()
+            db.expunge_all()
+        except Exception:
+            db.rollback()
+            db.expunge_all()
+            raise
+        finally:
+            db.close()
+        order_changes.publish(order.id for order in orders)
+        self.batches += 1
+        self.orders += len(orders)
+
+GROUP_COMMIT = False
 
 class OrderBuilder:
+    # GroupCommitWriter для save() без сесії; None - звичайний commit на кожне замовлення
+    group_commit: Optional[GroupCommitWriter] = None
+
     def __init__(self):
         self._order = None
+        self._batch = []
 
     def create_order(self, user: User, product: Product):
         self._order = Order(user_id=user.id, product_id=product.id, status='created')
         return self
 
+    def create_orders(self, items: Iterable[tuple]):
+        # items: (user_id, product_id) або (user_id, product_id, status). Статус задають лише
+        # внутрішні пакетні задачі (перенесення історії); HTTP-запити створюють 'created'
+        self._batch = []
+        for user_id, product_id, *rest in items:
+            self._batch.append({'user_id': user_id, 'product_id': product_id,
+                                'status': rest[0] if rest else 'created'})
+        return self
+
     def set_status(self, status: str):
         if self._order:
             self._order.status = status
+        for row in self._batch:
+            row['status'] = status
         return self
 
-    def save(self):
+    def save(self, session=None):
+        # У межах unit of work: лише flush, commit робить власник сесії (і публікує order_changes).
+        # Власні commit-и нижче одразу повідомляють order_changes: id після видалення може повторитись
+        if session is not None:
+            inventory.reserve_orders(session, [self._order])
+            session.add(self._order)
+            session.flush()
+            apply_in_transaction(session, [self._order.id])
+            return self._order
+        if OrderBuilder.group_commit is not None:
+            return OrderBuilder.group_commit.submit(self._order)
         db = SessionLocal()
-        db.add(self._order)
-        db.commit()
-        db.refresh(self._order)
-        db.close()
+        try:
+            inventory.reserve_orders(db, [self._order])
+            db.add(self._order)
+            db.flush()
+            apply_in_transaction(db, [self._order.id])
+            db.commit()
+            db.refresh(self._order)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        order_changes.publish([self._order.id])
+        return self._order
+
+    async def save_async(self, session=None):
+        if session is not None:
+            await session.run_sync(inventory.reserve_orders, [self._order])
+            session.add(self._order)
+            await session.flush()
+            await session.run_sync(apply_in_transaction, [self._order.id])
+            return self._order
+        if OrderBuilder.group_commit is not None:
+            return await asyncio.wrap_future(OrderBuilder.group_commit.submit_future(self._order))
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(inventory.reserve_orders, [self._order])
+            db.add(self._order)
+            await db.flush()
+            await db.run_sync(apply_in_transaction, [self._order.id])
+            await db.commit()
+            await db.refresh(self._order)
+        order_changes.publish([self._order.id])
         return self._order
 
+    def save_many(self, session=None) -> List[Order]:
+        if not self._batch:
+            return []
+        if session is not None:
+            return self._insert_batch(session)
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            orders = self._insert_batch(db)
+            db.commit()
+            order_changes.publish(order.id for order in orders)
+            return orders
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _insert_batch(self, session) -> List[Order]:
+        # Один IN-запит на користувачів і один на товари замість запиту на кожен рядок
+        user_ids = {row['user_id'] for row in self._batch}
+        product_ids = {row['product_id'] for row in self._batch}
+        missing_users = user_ids - set(session.scalars(select(User.id).where(User.id.in_(user_ids))))
+        missing_products = product_ids - set(session.scalars(select(Product.id).where(Product.id.in_(product_ids))))
+        if missing_users:
+            raise ValueError(f'Unknown users: {sorted(missing_users)}')
+        if missing_products:
+            raise ValueError(f'Unknown products: {sorted(missing_products)}')
+        inventory.reserve_rows(session, self._batch)
+        # executemany з RETURNING: усі рядки однією транзакцією, id без окремого refresh
+        orders = list(session.scalars(insert(Order).returning(Order), self._batch))
+        apply_in_transaction(session, [order.id for order in orders])
+        return orders
+
+    def get_orders(self):
+        return self._batch
+
     def get_order(self):
         return self._order
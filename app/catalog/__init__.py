@@ -0,0 +1,306 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Sequence, Tuple
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.orm import Session, with_polymorphic
+from app.models import DB_PATH, Product, SessionLocal, AsyncSessionLocal
+from app.snapshot import SHARED_SNAPSHOTS, SharedSnapshotStore
+
+
+class ProductView(NamedTuple):
+    id: int
+    name: str
+    price: float
+    type: str
+    sim_count: Optional[int] = None
+    cpu: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, product: Product) -> 'ProductView':
+        return cls(product.id, product.name, product.price, product.type,
+                   getattr(product, 'sim_count', None), getattr(product, 'cpu', None))
+
+
+class CatalogSnapshot(NamedTuple):
+    version: int
+    # Кортеж з БД або ліниві записи змапованого знімка (app/snapshot)
+    products: Sequence[ProductView]
+    by_id: Mapping[int, ProductView]
+
+
+class ProductFilter(NamedTuple):
+    type: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    cpu: Optional[str] = None
+    sim_count: Optional[int] = None
+
+
+class ProductPage(NamedTuple):
+    items: Tuple[ProductView, ...]
+    next_cursor: Optional[str]
+
+
+SORT_KEYS = ('price', 'name')
+# Спільний для воркерів знімок поруч з БД; TECHSTORE_CATALOG_SNAPSHOT='' залишає знімок у памʼяті процесу
+CATALOG_SNAPSHOT_PATH = os.environ.get('TECHSTORE_CATALOG_SNAPSHOT', DB_PATH + '.catalog')
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(value, product_id: int) -> str:
+    raw = json.dumps([value, product_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, product_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+    if not isinstance(product_id, int):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return value, product_id
+
+
+def page_query(sort: str = 'price', after: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+               filters: ProductFilter = ProductFilter()):
+    if sort not in SORT_KEYS:
+        raise ValueError(f'Unknown sort key: {sort}')
+    poly = with_polymorphic(Product, '*')
+    column = getattr(poly, sort)
+    stmt = select(poly)
+    if filters.type is not None:
+        stmt = stmt.where(poly.type == filters.type)
+    if filters.min_price is not None:
+        stmt = stmt.where(poly.price >= filters.min_price)
+    if filters.max_price is not None:
+        stmt = stmt.where(poly.price <= filters.max_price)
+    if filters.cpu is not None:
+        stmt = stmt.where(poly.Computer.cpu == filters.cpu)
+    if filters.sim_count is not None:
+        stmt = stmt.where(poly.Phone.sim_count == filters.sim_count)
+    if after:
+        # Seek замість OFFSET: індекс (sort, id) дає однаковий час для будь-якої сторінки
+        value, last_id = decode_cursor(after)
+        stmt = stmt.where(tuple_(column, poly.id) > tuple_(value, last_id))
+    # Один зайвий рядок показує, чи є наступна сторінка
+    return stmt.order_by(column, poly.id).limit(limit + 1)
+
+
+def build_page(sort: str, limit: int, products) -> ProductPage:
+    views = tuple(ProductView.from_model(p) for p in products)
+    if len(views) <= limit:
+        return ProductPage(views, None)
+    last = views[limit - 1]
+    return ProductPage(views[:limit], encode_cursor(getattr(last, sort), last.id))
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def catalog_query():
+    # Один запит з JOIN на phones/computers замість lazy load кожного підкласу
+    return select(with_polymorphic(Product, '*')).order_by(Product.id)
+
+
+def build_snapshot(version: int, products) -> CatalogSnapshot:
+    views = tuple(ProductView.from_model(p) for p in products)
+    return CatalogSnapshot(version, views, MappingProxyType({v.id: v for v in views}))
+
+
+# Незмінний знімок каталогу в памʼяті; версія збільшується після кожного
+# commit, який вставив, змінив або видалив Product. Зі store версія — спільне покоління
+# всіх процесів, а знімок читається з memory-mapped файлу
+class CatalogCache:
+    def __init__(self, max_pages: int = 256, store: Optional[SharedSnapshotStore] = None):
+        self._lock = threading.Lock()
+        self._version = 0
+        self.store = store
+        self._snapshot: Optional[CatalogSnapshot] = None
+        # Кеш сторінок: (version, sort, after, limit, filters) -> ProductPage
+        self._pages: 'OrderedDict[tuple, ProductPage]' = OrderedDict()
+        self.max_pages = max_pages
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def version(self) -> int:
+        return self.store.generation if self.store is not None else self._version
+
+    def invalidate(self):
+        with self._lock:
+            if self.store is not None:
+                self.store.bump()
+            else:
+                self._version += 1
+            self.invalidations += 1
+            self._pages.clear()
+
+    def _cached(self) -> Optional[CatalogSnapshot]:
+        snapshot = self._snapshot
+        version = self.version
+        with self._lock:
+            if snapshot is not None and snapshot.version == version:
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            return None
+
+    def _store(self, snapshot: CatalogSnapshot) -> CatalogSnapshot:
+        with self._lock:
+            # Якщо каталог змінився під час завантаження, знімок уже застарів
+            if snapshot.version == self.version:
+                self._snapshot = snapshot
+        return snapshot
+
+    def _shared_snapshot(self) -> CatalogSnapshot:
+        mapped = self.store.current()
+        if mapped is None:
+            with self.store.building():
+                # Поки чекали lock, інший воркер міг уже опублікувати це покоління
+                mapped = self.store.current()
+                if mapped is None:
+                    generation = self.store.generation
+                    db = SessionLocal()
+                    try:
+                        views = [ProductView.from_model(p) for p in db.execute(catalog_query()).scalars()]
+                    finally:
+                        db.close()
+                    mapped = self.store.publish(generation, views)
+        return self._store(CatalogSnapshot(mapped.generation, mapped.products, mapped.by_id))
+
+    def snapshot(self) -> CatalogSnapshot:
+        cached = self._cached()
+        if cached is not None:
+            return cached
+        if self.store is not None:
+            return self._shared_snapshot()
+        version = self._version
+        db = SessionLocal()
+        try:
+            products = db.execute(catalog_query()).scalars().all()
+        finally:
+            db.close()
+        return self._store(build_snapshot(version, products))
+
+    async def snapshot_async(self) -> CatalogSnapshot:
+        cached = self._cached()
+        if cached is not None:
+            return cached
+        if self.store is not None:
+            mapped = self.store.current()
+            if mapped is not None:
+                return self._store(CatalogSnapshot(mapped.generation, mapped.products, mapped.by_id))
+            # Перебудова чекає міжпроцесний lock, тому не в event loop
+            return await asyncio.to_thread(self._shared_snapshot)
+        version = self._version
+        async with AsyncSessionLocal() as db:
+            products = (await db.execute(catalog_query())).scalars().all()
+        return self._store(build_snapshot(version, products))
+
+    def _cached_page(self, key: tuple) -> Optional[ProductPage]:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+            return None
+
+    def _store_page(self, key: tuple, page: ProductPage) -> ProductPage:
+        with self._lock:
+            if key[0] == self.version:
+                self._pages[key] = page
+                if len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+        return page
+
+    def page(self, sort: str = 'price', after: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+             filters: ProductFilter = ProductFilter()) -> ProductPage:
+        limit = clamp_limit(limit)
+        key = (self.version, sort, after, limit, filters)
+        cached = self._cached_page(key)
+        if cached is not None:
+            return cached
+        stmt = page_query(sort, after, limit, filters)
+        db = SessionLocal()
+        try:
+            products = db.execute(stmt).scalars().all()
+        finally:
+            db.close()
+        return self._store_page(key, build_page(sort, limit, products))
+
+    async def page_async(self, sort: str = 'price', after: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                         filters: ProductFilter = ProductFilter()) -> ProductPage:
+        limit = clamp_limit(limit)
+        key = (self.version, sort, after, limit, filters)
+        cached = self._cached_page(key)
+        if cached is not None:
+            return cached
+        stmt = page_query(sort, after, limit, filters)
+        async with AsyncSessionLocal() as db:
+            products = (await db.execute(stmt)).scalars().all()
+        return self._store_page(key, build_page(sort, limit, products))
+
+    def all(self) -> Sequence[ProductView]:
+        return self.snapshot().products
+
+    def get(self, product_id: int) -> Optional[ProductView]:
+        return self.snapshot().by_id.get(product_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'invalidations': self.invalidations,
+                'size': len(self._snapshot.products) if self._snapshot else 0,
+                'pages': len(self._pages),
+                'shared': self.store.stats() if self.store is not None else None,
+            }
+
+
+catalog = CatalogCache(store=SharedSnapshotStore(CATALOG_SNAPSHOT_PATH)
+                       if CATALOG_SNAPSHOT_PATH and SHARED_SNAPSHOTS else None)
+
+_DIRTY_KEY = 'catalog_dirty'
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_product_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product):
+            session.info[_DIRTY_KEY] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_product_changes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.isa(Product.__mapper__):
+            orm_execute_state.session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_catalog_version(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        catalog.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_product_changes(session):
+    session.info.pop(_DIRTY_KEY, None)
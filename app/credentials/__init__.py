@@ -0,0 +1,248 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import select, update
+from app.models import User
+from app.metrics import Gauge, Histogram
+
+# Паролі зберігаються як "<алгоритм>$<параметри>$<salt>$<hash>" (base64 без padding):
+#   scrypt$16384,8,1$...$...   pbkdf2_sha256$600000$...$...
+# Рядок без відомого префікса — легасі plaintext; він перехешовується при першому успішному логіні.
+KDF_ALGORITHM = os.environ.get('TECHSTORE_KDF', 'scrypt')
+SCRYPT_N = int(os.environ.get('TECHSTORE_SCRYPT_N', 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = int(os.environ.get('TECHSTORE_PBKDF2_ITERATIONS', 600000))
+# Окремий пул під KDF, незалежний від threadpool обробників FastAPI
+KDF_WORKERS = int(os.environ.get('TECHSTORE_KDF_WORKERS', max(2, os.cpu_count() or 1)))
+SALT_BYTES = 16
+HASH_BYTES = 32
+ALGORITHMS = ('scrypt', 'pbkdf2_sha256')
+
+LOGIN_CACHE_TTL = 300
+LOGIN_CACHE_SIZE = 10000
+
+kdf_seconds = Histogram('password_kdf_seconds', 'Password hashing and verification time.', ('op',))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.b64decode(value + '=' * (-len(value) % 4))
+
+
+class PasswordHasher:
+    def __init__(self, algorithm: str = KDF_ALGORITHM, scrypt_n: int = SCRYPT_N, scrypt_r: int = SCRYPT_R,
+                 scrypt_p: int = SCRYPT_P, pbkdf2_iterations: int = PBKDF2_ITERATIONS):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f'Unknown KDF algorithm: {algorithm}')
+        self.algorithm = algorithm
+        self.params = (scrypt_n, scrypt_r, scrypt_p) if algorithm == 'scrypt' else (pbkdf2_iterations,)
+
+    @staticmethod
+    def _derive(algorithm: str, params: Tuple[int, ...], password: str, salt: bytes) -> bytes:
+        # hashlib відпускає GIL під час scrypt/pbkdf2, тож потоки пулу справді працюють паралельно
+        if algorithm == 'scrypt':
+            n, r, p = params
+            return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                                  maxmem=128 * r * (n + p + 2) + (1 << 20), dklen=HASH_BYTES)
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params[0], HASH_BYTES)
+
+    @staticmethod
+    def parse(encoded: str) -> Optional[Tuple[str, Tuple[int, ...], bytes, bytes]]:
+        parts = encoded.split('$')
+        if len(parts) != 4 or parts[0] not in ALGORITHMS:
+            return None
+        try:
+            return parts[0], tuple(int(v) for v in parts[1].split(',')), _b64decode(parts[2]), _b64decode(parts[3])
+        except ValueError:
+            return None
+
+    @staticmethod
+    def is_hashed(value: str) -> bool:
+        return PasswordHasher.parse(value) is not None
+
+    def hash(self, password: str) -> str:
+        start = time.perf_counter()
+        salt = os.urandom(SALT_BYTES)
+        digest = self._derive(self.algorithm, self.params, password, salt)
+        kdf_seconds.observe(time.perf_counter() - start, op='hash')
+        return f"{self.algorithm}${','.join(map(str, self.params))}${_b64encode(salt)}${_b64encode(digest)}"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        parsed = self.parse(encoded)
+        if parsed is None:
+            return False
+        algorithm, params, salt, expected = parsed
+        start = time.perf_counter()
+        try:
+            digest = self._derive(algorithm, params, password, salt)
+        except (ValueError, MemoryError):
+            return False
+        finally:
+            kdf_seconds.observe(time.perf_counter() - start, op='verify')
+        return hmac.compare_digest(digest, expected)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        parsed = self.parse(encoded)
+        return parsed is None or parsed[0] != self.algorithm or parsed[1] != self.params
+
+
+class KDFPool:
+    def __init__(self, workers: int = KDF_WORKERS):
+        self.workers = workers
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _done(self, future: Future):
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            # Пул створюється ліниво і заново після shutdown (повторний startup у тестах)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='kdf')
+            self.pending += 1
+            future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+# Кеш успішних перевірок: ключ — HMAC(секрет процесу, збережений хеш + пароль), тож
+# кеш не містить паролів, а зміна пароля (новий хеш) автоматично робить старі записи недійсними
+class VerifiedLoginCache:
+    def __init__(self, ttl: float = LOGIN_CACHE_TTL, maxsize: int = LOGIN_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._secret = os.urandom(32)
+        self._entries: 'OrderedDict[bytes, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, encoded: str, password: str) -> bytes:
+        return hmac.new(self._secret, encoded.encode() + b'\0' + password.encode(), hashlib.sha256).digest()
+
+    def check(self, encoded: str, password: str) -> bool:
+        key = self._key(encoded, password)
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def store(self, encoded: str, password: str):
+        if self.ttl <= 0:
+            return
+        key = self._key(encoded, password)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class CredentialService:
+    def __init__(self, hasher: PasswordHasher = None, pool: KDFPool = None, cache: VerifiedLoginCache = None):
+        self.hasher = hasher or PasswordHasher()
+        self.pool = pool or KDFPool()
+        self.cache = cache if cache is not None else VerifiedLoginCache()
+        self.migrated = 0
+        self._dummy_hash: Optional[str] = None
+
+    def hash_password(self, password: str) -> str:
+        return self.pool.run(self.hasher.hash, password)
+
+    async def hash_password_async(self, password: str) -> str:
+        return await self.pool.run_async(self.hasher.hash, password)
+
+    def hash_passwords(self, passwords: Iterable[str]) -> List[str]:
+        # Пакетна реєстрація: хеші рахуються паралельно на всіх потоках пулу
+        futures = [self.pool.submit(self.hasher.hash, password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def prepare(self):
+        # Хеш для невідомих email рахується при старті: інакше перший промах платить два KDF
+        # (помітно за часом), а рахунок у event loop блокує всі запити
+        if self._dummy_hash is None:
+            self._dummy_hash = self.pool.run(self.hasher.hash, _b64encode(os.urandom(12)))
+
+    async def _dummy(self) -> str:
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.pool.run_async(self.hasher.hash, _b64encode(os.urandom(12)))
+        return self._dummy_hash
+
+    async def verify_async(self, password: str, encoded: str) -> bool:
+        if self.cache.check(encoded, password):
+            return True
+        if PasswordHasher.is_hashed(encoded):
+            ok = await self.pool.run_async(self.hasher.verify, password, encoded)
+        else:
+            ok = hmac.compare_digest(encoded.encode(), password.encode())
+        if ok:
+            self.cache.store(encoded, password)
+        return ok
+
+    async def authenticate(self, uow, email: str, password: str) -> Optional[User]:
+        user = (await uow.session.execute(select(User).filter_by(email=email))).scalars().first()
+        if user is None:
+            # Невідомий email коштує стільки ж, скільки й невірний пароль: без перебору адрес за часом
+            await self.pool.run_async(self.hasher.verify, password, await self._dummy())
+            return None
+        stored = user.password
+        if not await self.verify_async(password, stored):
+            return None
+        if self.hasher.needs_rehash(stored):
+            await self._rehash(uow, user, stored, password)
+        return user
+
+    async def _rehash(self, uow, user: User, stored: str, password: str):
+        # Легасі plaintext або застарілі параметри KDF; умова на старе значення не перезапише
+        # пароль, змінений паралельно
+        new_hash = await self.hash_password_async(password)
+        result = await uow.session.execute(
+            update(User).where(User.id == user.id, User.password == stored).values(password=new_hash)
+            .execution_options(synchronize_session=False))
+        await uow.commit()
+        if result.rowcount:
+            self.migrated += 1
+            self.cache.store(new_hash, password)
+
+
+credentials = CredentialService()
+Gauge('kdf_pool_pending', 'Password KDF jobs queued or running.', function=lambda: credentials.pool.pending)
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set
+from app.models import DB_PATH
+from app.metrics import Gauge
+from app.utils import Logger, OrderEvent, OrderObserver
+
+HEARTBEAT_SECONDS = 15
+CLIENT_BUFFER = 16
+RELAY_ENABLED = True
+RELAY_POLL_INTERVAL = 0.5
+RELAY_RETENTION = 600
+RELAY_PRUNE_EVERY = 120
+
+
+class Subscription:
+    __slots__ = ('order_id', 'queue', 'dropped')
+
+    def __init__(self, order_id: int, buffer: int):
+        self.order_id = order_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.dropped = 0
+
+    def put(self, event: Optional[OrderEvent]):
+        # Повільний клієнт не накопичує події без меж: найстаріша відкидається, остання важливіша
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+# Pub/sub у межах процесу: підписки живуть у event loop, publish можна викликати з будь-якого потоку
+class OrderEventHub:
+    def __init__(self, buffer: int = CLIENT_BUFFER):
+        self.buffer = buffer
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Слухачі всіх подій (локальних і ретрансльованих), викликаються в потоці publish
+        self._listeners: List[Callable[[OrderEvent], None]] = []
+
+    def subscribe(self, order_id: int) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(order_id, self.buffer)
+        self._subscribers.setdefault(order_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.order_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        self.dropped += subscription.dropped
+        subscription.dropped = 0
+        if not subscribers:
+            self._subscribers.pop(subscription.order_id, None)
+
+    def add_listener(self, listener: Callable[[OrderEvent], None]):
+        self._listeners.append(listener)
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in list(self._subscribers.values()))
+
+    def publish(self, event: OrderEvent):
+        self.published += 1
+        for listener in self._listeners:
+            listener(event)
+        loop = self._loop
+        if loop is None or loop.is_closed() or event.id not in self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(event)
+        else:
+            loop.call_soon_threadsafe(self._fanout, event)
+
+    def _fanout(self, event: OrderEvent):
+        for subscription in list(self._subscribers.get(event.id, ())):
+            subscription.put(event)
+            self.delivered += 1
+
+    def close(self):
+        # Завершує всі відкриті потоки (None — сигнал кінця)
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        def close_all():
+            for subscribers in list(self._subscribers.values()):
+                for subscription in list(subscribers):
+                    subscription.put(None)
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            close_all()
+        else:
+            loop.call_soon_threadsafe(close_all)
+
+    def stats(self) -> dict:
+        return {'subscribers': self.subscriber_count(), 'published': self.published,
+                'delivered': self.delivered, 'dropped': self.dropped}
+
+
+# Ретрансляція між воркерами через таблицю order_events у спільній SQLite-БД:
+# кожен воркер пише свої події й опитує чужі за id > останнього побаченого
+class SQLiteEventRelay:
+    def __init__(self, hub: OrderEventHub, path: str = DB_PATH, poll_interval: float = RELAY_POLL_INTERVAL,
+                 retention: float = RELAY_RETENTION):
+        self.hub = hub
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = uuid.uuid4().hex
+        self.last_id = 0
+        self.relayed = 0
+        self._local = threading.local()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Запис власних подій — окремим потоком: INSERT може чекати на блокування БД до busy_timeout,
+        # а enqueue викликається з event loop після commit замовлення
+        self._outbox: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.execute('CREATE TABLE IF NOT EXISTS order_events (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'order_id INTEGER NOT NULL, user_id INTEGER, product_id INTEGER, status TEXT, '
+                         'origin TEXT NOT NULL, created_at REAL NOT NULL)')
+            self._local.conn = conn
+        return conn
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def publish(self, event: OrderEvent):
+        self.publish_many([event])
+
+    def publish_many(self, events: List[OrderEvent]):
+        # Пакет однією транзакцією: один fsync замість рядка на подію
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT INTO order_events (order_id, user_id, product_id, status, origin, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(e.id, e.user_id, e.product_id, e.status, self.origin, now) for e in events])
+
+    def enqueue(self, events: List[OrderEvent]):
+        self._outbox.put(list(events))
+
+    def pending(self) -> int:
+        return self._outbox.qsize()
+
+    def _write_loop(self):
+        while True:
+            events = self._outbox.get()
+            if events is None:
+                return
+            # Усе, що накопичилось за час попереднього запису, — однією транзакцією
+            stopping = False
+            while True:
+                try:
+                    more = self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    stopping = True
+                    break
+                events.extend(more)
+            try:
+                self.publish_many(events)
+            except sqlite3.Error as e:
+                Logger().log(f"Order event relay write failed: {e}", level='ERROR', source='events',
+                             orders=[event.id for event in events])
+            if stopping:
+                return
+
+    def poll(self) -> int:
+        rows = self._conn().execute(
+            'SELECT id, order_id, user_id, product_id, status, origin FROM order_events WHERE id > ? ORDER BY id',
+            (self.last_id,)).fetchall()
+        relayed = 0
+        for row_id, order_id, user_id, product_id, status, origin in rows:
+            self.last_id = row_id
+            if origin != self.origin:
+                self.hub.publish(OrderEvent(order_id, user_id, product_id, status))
+                relayed += 1
+        self.relayed += relayed
+        return relayed
+
+    def prune(self):
+        self._conn().execute('DELETE FROM order_events WHERE created_at < ?', (time.time() - self.retention,))
+
+    def start(self):
+        if self.running:
+            return
+        # Нові воркери не відтворюють стару історію
+        self.last_id = self._conn().execute('SELECT coalesce(max(id), 0) FROM order_events').fetchone()[0]
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='order-event-relay', daemon=True)
+        self._thread.start()
+        self._writer = threading.Thread(target=self._write_loop, name='order-event-relay-writer', daemon=True)
+        self._writer.start()
+
+    def _run(self):
+        polls = 0
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                self.poll()
+                polls += 1
+                if polls % RELAY_PRUNE_EVERY == 0:
+                    self.prune()
+            except sqlite3.Error as e:
+                Logger().log(f"Order event relay failed: {e}", level='ERROR', source='events')
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Події, поставлені до stop, ще записуються
+        if self._writer is not None:
+            self._outbox.put(None)
+            self._writer.join(timeout)
+            self._writer = None
+
+
+order_event_hub = OrderEventHub()
+event_relay = SQLiteEventRelay(order_event_hub)
+Gauge('sse_subscribers', 'Connected order event stream clients.', function=order_event_hub.subscriber_count)
+Gauge('order_event_relay_pending', 'Order events waiting to be written to the relay table.',
+      function=event_relay.pending)
+
+
+class HubObserver(OrderObserver):
+    def __init__(self, hub: OrderEventHub = order_event_hub, relay: SQLiteEventRelay = event_relay):
+        self.hub = hub
+        self.relay = relay
+
+    def update(self, order):
+        self.update_many([order])
+
+    def update_many(self, orders):
+        events = [o if isinstance(o, OrderEvent) else OrderEvent.from_order(o) for o in orders]
+        for event in events:
+            self.hub.publish(event)
+        # Хаб — синхронно (лише пам'ять); запис у спільну БД — через чергу потоку ретрансляції
+        if self.relay is not None and self.relay.running:
+            self.relay.enqueue(events)
+
+
+def format_sse(event: OrderEvent, event_id: int) -> str:
+    data = json.dumps({'order_id': event.id, 'status': event.status})
+    return f'id: {event_id}\nevent: status\ndata: {data}\n\n'
+
+
+async def event_stream(hub: OrderEventHub, subscription: Subscription, initial: OrderEvent,
+                       heartbeat: float = HEARTBEAT_SECONDS):
+    # Поточний стан одразу, далі зміни; коментар-heartbeat тримає зʼєднання через проксі
+    event_id = 1
+    try:
+        yield 'retry: 3000\n' + format_sse(initial, event_id)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                continue
+            if event is None:
+                return
+            event_id += 1
+            yield format_sse(event, event_id)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple, Optional, Sequence
+from sqlalchemy import select
+from sqlalchemy.orm import with_polymorphic
+from app.models import Order, Product, SessionLocal, User
+
+EXPORT_FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+YIELD_PER = 1000
+# Дрібні рядки збираються в блоки ~64 КБ перед відправкою клієнту
+CHUNK_BYTES = 64 * 1024
+
+PRODUCT_FIELDS = ('id', 'type', 'name', 'price', 'sim_count', 'cpu')
+ORDER_FIELDS = ('id', 'created_at', 'status', 'user_id', 'user_email', 'user_name',
+                'product_id', 'product_name', 'product_type', 'price')
+
+class OrderExportFilter(NamedTuple):
+    user_id: Optional[int] = None
+    status: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+def products_query(product_type: Optional[str] = None):
+    # Плоскі колонки з JOIN на phones/computers: без ORM-обʼєктів і identity map
+    poly = with_polymorphic(Product, '*')
+    stmt = select(poly.id, poly.type, poly.name, poly.price, poly.Phone.sim_count, poly.Computer.cpu)
+    if product_type is not None:
+        stmt = stmt.where(poly.type == product_type)
+    return stmt.order_by(poly.id)
+
+def orders_query(filters: OrderExportFilter = OrderExportFilter()):
+    stmt = (select(Order.id, Order.created_at, Order.status, Order.user_id, User.email, User.name,
+                   Order.product_id, Product.name, Product.type, Product.price)
+            .outerjoin(Order.user).outerjoin(Order.product))
+    if filters.user_id is not None:
+        stmt = stmt.where(Order.user_id == filters.user_id)
+    if filters.status is not None:
+        stmt = stmt.where(Order.status == filters.status)
+    if filters.since is not None:
+        stmt = stmt.where(Order.created_at >= filters.since)
+    if filters.until is not None:
+        stmt = stmt.where(Order.created_at < filters.until)
+    return stmt.order_by(Order.id)
+
+def stream_rows(stmt, session_factory=SessionLocal, yield_per: int = YIELD_PER) -> Iterator[tuple]:
+    # Серверний курсор + yield_per: у памʼяті лише один пакет рядків
+    db = session_factory()
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=yield_per))
+        for row in result:
+            yield tuple(row)
+    finally:
+        db.close()
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def encode_csv(fields: Sequence[str], rows: Iterable[tuple]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([_value(v) for v in row])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def encode_ndjson(fields: Sequence[str], rows: Iterable[tuple]) -> Iterator[bytes]:
+    parts = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(fields, map(_value, row))), ensure_ascii=False) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(parts).encode()
+            parts, size = [], 0
+    if parts:
+        yield ''.join(parts).encode()
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    # wbits=31: формат gzip; кожен блок стискається одразу, без буферизації всього файлу
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(fmt: str, fields: Sequence[str], stmt, gzip: bool = False,
+                  session_factory=SessionLocal) -> Iterator[bytes]:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {fmt}')
+    encode = encode_csv if fmt == 'csv' else encode_ndjson
+    chunks = encode(fields, stream_rows(stmt, session_factory))
+    return gzip_stream(chunks) if gzip else chunks
@@ -1,26 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
 from app.models import SessionLocal, User
-from email_validator import validate_email, EmailNotValidError
-import smtplib
-from email.mime.text import MIMEText
+from email_validator import validate_email, EmailNotValidError, EmailUndeliverableError
+from email_validator.deliverability import validate_email_deliverability
+from sqlalchemy import insert, select
 from sqlalchemy.exc import IntegrityError
+from app.mail import send_mail
+from app.credentials import credentials
 
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_HOST_USER = 'xchangeua@gmail.com'
-EMAIL_HOST_PASSWORD = 'XXX'
-EMAIL_USE_TLS = True
+def dns_resolver(domain: str, domain_i18n: str) -> dict:
+    # MX/A-запит через dnspython; кидає EmailUndeliverableError для недоставних доменів
+    return validate_email_deliverability(domain, domain_i18n)
+
+# Кеш доставності на рівні домену: позитивні та негативні відповіді з власними TTL, LRU-витіснення
+class DeliverabilityCache:
+    def __init__(self, resolver=dns_resolver, ttl: float = 3600, negative_ttl: float = 300, maxsize: int = 10000):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, Tuple[float, Optional[str]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, domain: str, domain_i18n: str = None):
+        domain = domain.lower()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(domain)
+                self.hits += 1
+                if entry[1] is not None:
+                    raise EmailUndeliverableError(entry[1])
+                return
+            self.misses += 1
+        try:
+            info = self.resolver(domain, domain_i18n or domain)
+        except EmailUndeliverableError as e:
+            self._store(domain, now + self.negative_ttl, str(e))
+            raise
+        # Таймаут DNS не є відповіддю: пропускаємо, але не кешуємо
+        if info and info.get('unknown-deliverability'):
+            return
+        self._store(domain, now + self.ttl, None)
+
+    def _store(self, domain: str, expires_at: float, error: Optional[str]):
+        with self._lock:
+            self._entries[domain] = (expires_at, error)
+            self._entries.move_to_end(domain)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+deliverability_cache = DeliverabilityCache()
 
 class RegistrationFacade:
     @staticmethod
-    def register_user(email: str, password: str, name: str):
-        # 1. Перевірка email
+    def validate(email: str, password: str, name: str) -> Optional[str]:
+        # Повертає повідомлення про помилку або None; email нормалізується окремо
         try:
-            validate_email(email)
+            result = validate_email(email, check_deliverability=False)
+            deliverability_cache.check(result.ascii_domain, result.domain)
         except EmailNotValidError as e:
-            return False, f"Invalid email: {str(e)}"
-        # 2. Збереження у БД
+            return f"Invalid email: {str(e)}"
+        if not password:
+            return "Invalid password: must not be empty."
+        if not name:
+            return "Invalid name: must not be empty."
+        return None
+
+    @staticmethod
+    def register_user(email: str, password: str, name: str, uow=None):
+        # 1. Перевірка email
+        # 2. Валідація даних
+        error = RegistrationFacade.validate(email, password, name)
+        if error:
+            return False, error
+        # 3. Збереження у БД
+        if uow is not None:
+            return RegistrationFacade._register_in_uow(uow, email, password, name)
         db = SessionLocal()
-        user = User(email=email, password=password, name=name)
+        user = User(email=email, password=credentials.hash_password(password), name=name)
         try:
             db.add(user)
             db.commit()
@@ -29,24 +100,64 @@ class RegistrationFacade:
             return False, "Email already registered."
         finally:
             db.close()
-        # 3. Надсилання email
+        # 4. Надсилання email
         RegistrationFacade.send_confirmation_email(email, name)
         return True, "Registration successful. Confirmation email sent."
 
+    @staticmethod
+    def _register_in_uow(uow, email: str, password: str, name: str):
+        user = User(email=email, password=credentials.hash_password(password), name=name)
+        try:
+            uow.session.add(user)
+            uow.session.flush()
+        except IntegrityError:
+            uow.rollback()
+            return False, "Email already registered."
+        # 4. Лист надсилається лише після успішного commit
+        uow.on_commit(lambda: RegistrationFacade.send_confirmation_email(email, name))
+        return True, "Registration successful. Confirmation email sent."
+
+    @staticmethod
+    def register_users(accounts: Iterable[Tuple[str, str, str]], send_email: bool = True) -> List[Tuple[bool, str]]:
+        # Пакетна реєстрація (імпорт акаунтів партнерів): один IN-запит на дублікати
+        # і одна транзакція на вставку всіх валідних рядків
+        accounts = list(accounts)
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(accounts)
+        valid = {}
+        for i, (email, password, name) in enumerate(accounts):
+            error = RegistrationFacade.validate(email, password, name)
+            if error:
+                results[i] = (False, error)
+            elif email in valid:
+                results[i] = (False, "Email already registered.")
+            else:
+                valid[email] = i
+        db = SessionLocal()
+        try:
+            if valid:
+                existing = set(db.scalars(select(User.email).where(User.email.in_(list(valid)))))
+                for email in existing:
+                    results[valid.pop(email)] = (False, "Email already registered.")
+            hashes = credentials.hash_passwords(accounts[i][1] for i in valid.values())
+            rows = [{'email': email, 'password': password_hash, 'name': accounts[i][2]}
+                    for (email, i), password_hash in zip(valid.items(), hashes)]
+            if rows:
+                db.execute(insert(User), rows)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        for email, i in valid.items():
+            results[i] = (True, "Registration successful. Confirmation email sent." if send_email
+                          else "Registration successful.")
+            if send_email:
+                RegistrationFacade.send_confirmation_email(email, accounts[i][2])
+        return results
+
     @staticmethod
     def send_confirmation_email(email: str, name: str):
         subject = "Підтвердження реєстрації"
         body = f"Вітаємо, {name}! Ви успішно зареєстровані у Tech Store."
-        msg = MIMEText(body)
-        msg['Subject'] = subject
-        msg['From'] = EMAIL_HOST_USER
-        msg['To'] = email
-        try:
-            server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-            if EMAIL_USE_TLS:
-                server.starttls()
-            server.login(EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)
-            server.sendmail(EMAIL_HOST_USER, [email], msg.as_string())
-            server.quit()
-        except Exception as e:
-            print(f"Email send error: {e}")
+        send_mail(email, subject, body)
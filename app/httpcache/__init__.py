@@ -0,0 +1,193 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, NamedTuple, Optional, Set
+from starlette.requests import Request
+from starlette.responses import Response
+from app.events import order_event_hub
+from app.metrics import Counter, Gauge
+from app.startup import templates
+from app.utils import OrderEvent, order_changes
+
+# Кеш відрендерених сторінок. Ключ містить маршрут, входи шаблону, користувача і версію каталогу,
+# тож зміна товарів (спільне покоління app/snapshot) робить старі записи недосяжними.
+# Записи з тегом ('order', id) видаляються order_changes і подіями замовлення з інших воркерів
+MAX_ENTRIES = 1024
+MAX_BYTES = 16 * 1024 * 1024
+# Скільки останніх інвалідованих тегів памʼятає epoch-перевірка put
+INVALIDATION_HISTORY = 10000
+# Персональні сторінки: браузер зберігає, але перевіряє ETag при кожному показі
+PRIVATE_REVALIDATE = 'private, no-cache'
+STATIC_CACHE_CONTROL = 'public, max-age=300'
+HTML = 'text/html; charset=utf-8'
+
+http_cache_requests_total = Counter('http_cache_requests_total', 'Cached page lookups by route and result.',
+                                    ('route', 'result'))
+
+
+class CachedPage(NamedTuple):
+    body: bytes
+    etag: str
+    media_type: str = HTML
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    # If-None-Match порівнюється слабко (RFC 9110): W/"x" відповідає "x"
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def page_response(request: Request, page: CachedPage, cache_control: str = PRIVATE_REVALIDATE,
+                  route: str = None) -> Response:
+    headers = {'ETag': page.etag, 'Cache-Control': cache_control}
+    if cache_control.startswith('private'):
+        headers['Vary'] = 'Cookie'
+    if etag_matches(request, page.etag):
+        if route:
+            http_cache_requests_total.inc(route=route, result='not_modified')
+        return Response(status_code=304, headers=headers)
+    return Response(page.body, media_type=page.media_type, headers=headers)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES,
+                 history: int = INVALIDATION_HISTORY):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.history = history
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Лічильник інвалідацій і epoch останньої інвалідації кожного тегу: сторінка не зберігається,
+        # лише якщо один з її тегів інвалідовано після початку рендеру. Для тегів, витіснених з
+        # історії, діє _floor — найбільший витіснений epoch
+        self.epoch = 0
+        self._tag_epochs: 'OrderedDict[Hashable, int]' = OrderedDict()
+        self._floor = 0
+        self._entries: 'OrderedDict[Hashable, CachedPage]' = OrderedDict()
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._key_tags: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, route: str = None) -> Optional[CachedPage]:
+        with self._lock:
+            page = self._entries.get(key)
+            if page is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if route:
+            http_cache_requests_total.inc(route=route, result='miss' if page is None else 'hit')
+        return page
+
+    def put(self, key: Hashable, body: bytes, tags: Iterable[Hashable] = (), media_type: str = HTML,
+            epoch: int = None) -> CachedPage:
+        page = CachedPage(body, strong_etag(body), media_type)
+        if len(body) > self.max_bytes:
+            return page
+        tags = tuple(tags)
+        with self._lock:
+            if epoch is not None and self._stale(tags, epoch):
+                return page
+            self._remove(key)
+            self._entries[key] = page
+            self.size += len(body)
+            self._key_tags[key] = tags
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return page
+
+    def _stale(self, tags: tuple, epoch: int) -> bool:
+        if epoch >= self.epoch:
+            return False
+        return any(self._tag_epochs.get(tag, self._floor) > epoch for tag in tags)
+
+    def _remove(self, key: Hashable):
+        page = self._entries.pop(key, None)
+        if page is None:
+            return
+        self.size -= len(page.body)
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, tag: Hashable) -> int:
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.epoch += 1
+            self._tag_epochs[tag] = self.epoch
+            self._tag_epochs.move_to_end(tag)
+            while len(self._tag_epochs) > self.history:
+                self._floor = max(self._floor, self._tag_epochs.popitem(last=False)[1])
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def on_order_event(self, event: OrderEvent):
+        self.invalidate(('order', event.id))
+
+    def invalidate_orders(self, order_ids: Iterable[int]) -> int:
+        return sum(self.invalidate(('order', order_id)) for order_id in order_ids)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._key_tags.clear()
+            self._tag_epochs.clear()
+            self._floor = self.epoch
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': self.hits / total if total else 0.0, 'evictions': self.evictions,
+                    'invalidations': self.invalidations}
+
+
+response_cache = ResponseCache()
+# Зміни цього процесу — одразу з коду, що комітить статус; інших воркерів — через ретрансляцію хабу
+order_changes.add_listener(response_cache.invalidate_orders)
+order_event_hub.add_listener(response_cache.on_order_event)
+Gauge('http_cache_bytes', 'Bytes held by the rendered page cache.', function=lambda: response_cache.size)
+
+
+# Сторінки без змінних рендеряться один раз при старті й віддаються з памʼяті
+class StaticPages:
+    def __init__(self, templates=templates):
+        self.templates = templates
+        self._pages: Dict[str, CachedPage] = {}
+
+    def load(self, name: str) -> CachedPage:
+        body = self.templates.get_template(name).render().encode()
+        page = self._pages[name] = CachedPage(body, strong_etag(body))
+        return page
+
+    def get(self, name: str) -> CachedPage:
+        page = self._pages.get(name)
+        return page if page is not None else self.load(name)
+
+    def response(self, request: Request, name: str) -> Response:
+        return page_response(request, self.get(name), STATIC_CACHE_CONTROL)
+
+
+static_pages = StaticPages()
@@ -0,0 +1,172 @@
+import csv
+import io
+import json
+import sys
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import insert, select, update
+from app.models import Product, SessionLocal
+from app.utils import Logger
+import app.catalog  # noqa: F401  (слухачі сесії інвалідовують кеш каталогу після commit)
+
+DEFAULT_CHUNK_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def tick(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'chunks': self.chunks,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+def detect_format(path: str) -> str:
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise ValueError(f'Cannot detect format of {path}, pass it explicitly')
+
+def iter_csv(stream) -> Iterator[dict]:
+    yield from csv.DictReader(stream)
+
+def iter_jsonl(stream) -> Iterator[dict]:
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def open_rows(path: str, fmt: str = None) -> Iterator[dict]:
+    # Файл читається порядково: памʼять не залежить від розміру фіду
+    fmt = fmt or detect_format(path)
+    reader = iter_csv if fmt == 'csv' else iter_jsonl
+    if path == '-':
+        yield from reader(io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline=''))
+        return
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        yield from reader(f)
+
+def extra_columns(cls):
+    # Колонки таблиці нащадка (phones.sim_count, computers.cpu), крім FK на products.id
+    return [c for c in cls.__table__.columns if not c.primary_key]
+
+def parse_row(row: dict) -> Tuple[type, dict]:
+    # Тип рядка визначає фабрика Product.product_class, як і в Product.create_product
+    cls = Product.product_class((row.get('type') or '').strip())
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise ValueError('Missing name')
+    values = {'name': name, 'price': float(row['price'])}
+    for column in extra_columns(cls):
+        value = row.get(column.name)
+        if value is not None and value != '':
+            values[column.name] = column.type.python_type(value)
+    return cls, values
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+# Потоковий імпорт товарів: пакетні INSERT/UPDATE у products + phones/computers,
+# одна транзакція на chunk; upsert за назвою товару
+class ProductImporter:
+    def __init__(self, session_factory=SessionLocal, chunk_size: int = DEFAULT_CHUNK_SIZE, upsert: bool = True,
+                 progress: Optional[Callable[[ImportStats], None]] = None):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.upsert = upsert
+        self.progress = progress
+
+    def run(self, rows: Iterable[dict]) -> ImportStats:
+        stats = ImportStats()
+        db = self.session_factory()
+        try:
+            for chunk in chunked(enumerate(rows, 1), self.chunk_size):
+                self._write_chunk(db, chunk, stats)
+                db.commit()
+                stats.chunks += 1
+                stats.tick()
+                if self.progress:
+                    self.progress(stats)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        stats.tick()
+        return stats
+
+    def _parse(self, chunk: List[Tuple[int, dict]], stats: ImportStats) -> Dict[str, Tuple[type, dict]]:
+        parsed: Dict[str, Tuple[type, dict]] = {}
+        for line, row in chunk:
+            stats.rows += 1
+            try:
+                cls, values = parse_row(row)
+            except (KeyError, TypeError, ValueError) as e:
+                stats.skipped += 1
+                Logger().log(f"Row {line} skipped: {e}", level='WARNING', source='importer')
+                continue
+            if not self.upsert:
+                parsed[len(parsed)] = (cls, values)
+                continue
+            if values['name'] in parsed:
+                # Повтор назви в межах chunk: останній рядок перемагає
+                stats.skipped += 1
+            parsed[values['name']] = (cls, values)
+        return parsed
+
+    def _write_chunk(self, db, chunk: List[Tuple[int, dict]], stats: ImportStats):
+        parsed = self._parse(chunk, stats)
+        existing = {}
+        if self.upsert and parsed:
+            found = db.execute(select(Product.name, Product.id, Product.type)
+                               .where(Product.name.in_(list(parsed))).order_by(Product.id))
+            for name, product_id, product_type in found:
+                existing.setdefault(name, (product_id, product_type))
+        inserts: Dict[type, List[dict]] = {}
+        updates: Dict[type, List[dict]] = {}
+        for cls, values in parsed.values():
+            match = existing.get(values['name'])
+            if match is None:
+                inserts.setdefault(cls, []).append(values)
+            elif match[1] != cls.__mapper__.polymorphic_identity:
+                stats.skipped += 1
+                Logger().log(f"Product {values['name']!r} exists with type {match[1]}", level='WARNING',
+                             source='importer')
+            else:
+                updates.setdefault(cls, []).append(dict(values, id=match[0]))
+        # ORM bulk INSERT/UPDATE для joined inheritance пише обидві таблиці executemany-пакетами
+        for cls, rows in inserts.items():
+            db.execute(insert(cls), rows)
+            stats.inserted += len(rows)
+        for cls, rows in updates.items():
+            db.execute(update(cls), rows)
+            stats.updated += len(rows)
+
+def import_products(path: str, fmt: str = None, **kwargs) -> ImportStats:
+    return ProductImporter(**kwargs).run(open_rows(path, fmt))
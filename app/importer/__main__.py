@@ -0,0 +1,39 @@
+# Імпорт фіду товарів:
+#   python -m app.importer feed.csv
+#   python -m app.importer feed.jsonl --chunk-size 5000 --database sqlite:///other.db
+import argparse
+import sys
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, SessionLocal, STORAGE_PROFILE, apply_storage_profile
+from app.importer import DEFAULT_CHUNK_SIZE, FORMATS, ProductImporter, open_rows
+
+
+def report(stats):
+    print(f"{stats.rows} rows, {stats.inserted} inserted, {stats.updated} updated, {stats.skipped} skipped, "
+          f"{stats.rows_per_sec:.0f} rows/s", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Streaming product importer (CSV / JSONL)')
+    parser.add_argument('path', help="input file, '-' for stdin")
+    parser.add_argument('--format', choices=FORMATS, help='default: detected from the file extension')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows per transaction')
+    parser.add_argument('--no-upsert', action='store_true', help='always insert, do not match existing names')
+    parser.add_argument('--database', help='SQLAlchemy URL, default: the application database')
+    parser.add_argument('--quiet', action='store_true', help='no per-chunk progress')
+    args = parser.parse_args(argv)
+    session_factory = SessionLocal
+    if args.database:
+        engine = create_engine(args.database)
+        apply_storage_profile(engine, STORAGE_PROFILE)
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+    Base.metadata.create_all(session_factory.kw['bind'])
+    importer = ProductImporter(session_factory, chunk_size=args.chunk_size, upsert=not args.no_upsert,
+                               progress=None if args.quiet else report)
+    stats = importer.run(open_rows(args.path, args.format))
+    print(' '.join(f'{k}={v}' for k, v in stats.snapshot().items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+from sqlalchemy import delete, func, insert, or_, select, update
+from app.models import Order, Product, StockShard, SessionLocal, utc_now
+from app.metrics import Counter
+from app.reports import apply_in_transaction
+from app.utils import Logger, OrderEvent, order_changes
+
+# Неоплачене замовлення тримає резерв RESERVATION_TTL секунд, потім товар повертається на склад.
+# Переходу в оплачений статус у застосунку ще немає, тож строк резерву вмикається явно:
+# інакше reaper скасовував би кожне справжнє замовлення товару з обліком
+RESERVATION_EXPIRY = os.environ.get('TECHSTORE_RESERVATION_EXPIRY', '0') == '1'
+RESERVATION_TTL = 15 * 60
+SWEEP_INTERVAL = 30
+# Скільки воркер вважає товар розпроданим без перевірки БД (поповнення в іншому процесі)
+SOLD_OUT_TTL = 5.0
+MAX_SHARDS = 64
+
+# Core-оновлення таблиць, а не ORM: зміна залишку не інвалідовує знімок каталогу
+# (stock не входить у ProductView), а FTS-тригери слідкують лише за name/type
+products_table = Product.__table__
+shards_table = StockShard.__table__
+orders_table = Order.__table__
+
+stock_reservations_total = Counter('stock_reservations_total', 'Stock reservation attempts by outcome.',
+                                   ('outcome',))
+stock_released_total = Counter('stock_released_total', 'Units returned to stock by expired reservations.')
+
+
+class OutOfStock(ValueError):
+    def __init__(self, product_id: int):
+        super().__init__(f'Product {product_id} is sold out')
+        self.product_id = product_id
+
+
+class SoldOutCache:
+    def __init__(self, ttl: float = SOLD_OUT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self._entries: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, product_id: int):
+        with self._lock:
+            self._entries[product_id] = time.monotonic() + self.ttl
+
+    def discard(self, product_id: int):
+        with self._lock:
+            self._entries.pop(product_id, None)
+
+    def is_sold_out(self, product_id: int) -> bool:
+        expires_at = self._entries.get(product_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            self.discard(product_id)
+            return False
+        self.hits += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'size': len(self._entries)}
+
+
+# Резервування одним умовним UPDATE ... WHERE stock >= n у транзакції замовлення:
+# без read-check-write, тож конкурентні покупці не можуть продати більше, ніж є
+class Inventory:
+    def __init__(self, sold_out: SoldOutCache = None, reservation_ttl: float = RESERVATION_TTL,
+                 expiry: bool = RESERVATION_EXPIRY):
+        self.sold_out = sold_out or SoldOutCache()
+        self.reservation_ttl = reservation_ttl
+        self.expiry = expiry
+        # Підказка, які товари шардовані; помилкова підказка коштує лише ще одного UPDATE
+        self._sharded: Set[int] = set()
+        # Товари без обліку: замість UPDATE рядка товару лише читання stock; підказка перевіряється щоразу
+        self._untracked: Set[int] = set()
+
+    @staticmethod
+    def _is_untracked(session, product_id: int) -> bool:
+        row = session.execute(select(products_table.c.stock).where(products_table.c.id == product_id)).first()
+        return row is not None and row[0] is None
+
+    @staticmethod
+    def _take_main(session, product_id: int, quantity: int):
+        # stock IS NULL (без обліку) теж повертає рядок: NULL - n лишається NULL
+        return session.execute(
+            update(products_table)
+            .where(products_table.c.id == product_id,
+                   or_(products_table.c.stock.is_(None), products_table.c.stock >= quantity))
+            .values(stock=products_table.c.stock - quantity)
+            .returning(products_table.c.stock)).first()
+
+    @staticmethod
+    def _take_shard(session, product_id: int, quantity: int):
+        # Випадковий стартовий шард розводить конкурентних покупців по різних рядках
+        start = random.randrange(MAX_SHARDS)
+        candidate = (select(shards_table.c.shard)
+                     .where(shards_table.c.product_id == product_id, shards_table.c.stock >= quantity)
+                     .order_by((shards_table.c.shard + MAX_SHARDS - start) % MAX_SHARDS)
+                     .limit(1).scalar_subquery())
+        return session.execute(
+            update(shards_table)
+            .where(shards_table.c.product_id == product_id, shards_table.c.shard == candidate,
+                   shards_table.c.stock >= quantity)
+            .values(stock=shards_table.c.stock - quantity)
+            .returning(shards_table.c.stock)).first()
+
+    def reserve(self, session, product_id: int, quantity: int = 1) -> bool:
+        # True — товар з обліком залишків, False — без обліку; OutOfStock, якщо не вистачає
+        if self.sold_out.is_sold_out(product_id):
+            stock_reservations_total.inc(outcome='short_circuit')
+            raise OutOfStock(product_id)
+        if product_id in self._untracked:
+            if self._is_untracked(session, product_id):
+                stock_reservations_total.inc(outcome='untracked')
+                return False
+            # Облік увімкнено (set_stock в іншому процесі): звичайне резервування
+            self._untracked.discard(product_id)
+        sharded = product_id in self._sharded
+        for take in ((self._take_shard, self._take_main) if sharded else (self._take_main, self._take_shard)):
+            row = take(session, product_id, quantity)
+            if row is None:
+                continue
+            remaining = row[0]
+            if take is self._take_shard:
+                self._sharded.add(product_id)
+            elif remaining is None:
+                self._untracked.add(product_id)
+            stock_reservations_total.inc(outcome='untracked' if remaining is None else 'reserved')
+            return remaining is not None
+        if quantity > 1 and self._take_units(session, product_id, quantity):
+            stock_reservations_total.inc(outcome='reserved')
+            return True
+        stock_reservations_total.inc(outcome='sold_out')
+        if quantity == 1:
+            # Ні основний лічильник, ні шарди не мають залишку: наступні запити відхиляються без БД
+            self.sold_out.mark(product_id)
+        raise OutOfStock(product_id)
+
+    def _take_units(self, session, product_id: int, quantity: int) -> bool:
+        # Жоден шард не має n одиниць: по одній з різних рядків. Після невдачі частково
+        # списаний залишок відкочується разом з транзакцією (OutOfStock => rollback)
+        for _ in range(quantity):
+            if self._take_shard(session, product_id, 1) is None and self._take_main(session, product_id, 1) is None:
+                return False
+        return True
+
+    def _reserve_all(self, session, product_ids: Iterable[int]) -> Dict[int, bool]:
+        counts: Dict[int, int] = {}
+        for product_id in product_ids:
+            counts[product_id] = counts.get(product_id, 0) + 1
+        return {product_id: self.reserve(session, product_id, n) for product_id, n in counts.items()}
+
+    def _reserved_until(self) -> Optional[datetime]:
+        if not self.expiry:
+            return None
+        return utc_now() + timedelta(seconds=self.reservation_ttl)
+
+    def reserve_orders(self, session, orders: Sequence[Order]):
+        tracked = self._reserve_all(session, (order.product_id for order in orders))
+        until = self._reserved_until()
+        for order in orders:
+            if tracked[order.product_id] and order.status in (None, 'created'):
+                order.reserved_until = until
+
+    def reserve_rows(self, session, rows: List[dict]):
+        # Пакетна вставка: усі рядки executemany мають однаковий набір ключів
+        tracked = self._reserve_all(session, (row['product_id'] for row in rows))
+        until = self._reserved_until()
+        for row in rows:
+            row['reserved_until'] = until if tracked[row['product_id']] and row['status'] == 'created' else None
+
+    def set_stock(self, product_id: int, stock: Optional[int], shards: int = 1, session_factory=SessionLocal):
+        # None знімає облік залишків; shards > 1 ділить залишок між рядками product_stock_shards
+        if not 1 <= shards <= MAX_SHARDS:
+            raise ValueError(f'shards must be between 1 and {MAX_SHARDS}')
+        if shards > 1 and stock is None:
+            raise ValueError('Sharded stock needs a quantity')
+        db = session_factory()
+        try:
+            db.execute(delete(shards_table).where(shards_table.c.product_id == product_id))
+            main = 0 if shards > 1 else stock
+            result = db.execute(update(products_table).where(products_table.c.id == product_id).values(stock=main))
+            if not result.rowcount:
+                raise ValueError(f'Unknown product: {product_id}')
+            if shards > 1:
+                db.execute(insert(shards_table), [
+                    {'product_id': product_id, 'shard': i, 'stock': stock // shards + (1 if i < stock % shards else 0)}
+                    for i in range(shards)])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        if shards > 1:
+            self._sharded.add(product_id)
+        else:
+            self._sharded.discard(product_id)
+        self._untracked.discard(product_id)
+        self.sold_out.discard(product_id)
+
+    def stock_level(self, product_id: int, session_factory=SessionLocal) -> Optional[int]:
+        db = session_factory()
+        try:
+            main = db.execute(select(products_table.c.stock).where(products_table.c.id == product_id)).scalar()
+            shards = db.execute(select(func.sum(shards_table.c.stock))
+                                .where(shards_table.c.product_id == product_id)).scalar()
+        finally:
+            db.close()
+        if main is None and shards is None:
+            return None
+        return (main or 0) + (shards or 0)
+
+    def release_expired(self, session_factory=SessionLocal, now: datetime = None) -> List[OrderEvent]:
+        # Один UPDATE ... RETURNING позначає прострочені замовлення: конкурентні воркери
+        # не повернуть ту саму одиницю двічі
+        db = session_factory()
+        try:
+            rows = db.execute(
+                update(orders_table)
+                .where(orders_table.c.status == 'created', orders_table.c.reserved_until < (now or utc_now()))
+                .values(status='expired', reserved_until=None)
+                .returning(orders_table.c.id, orders_table.c.user_id, orders_table.c.product_id)).all()
+            counts: Dict[int, int] = {}
+            for _, _, product_id in rows:
+                counts[product_id] = counts.get(product_id, 0) + 1
+            for product_id, n in counts.items():
+                db.execute(update(products_table)
+                           .where(products_table.c.id == product_id, products_table.c.stock.is_not(None))
+                           .values(stock=products_table.c.stock + n))
+            # Прострочені замовлення виходять зі зведень продажів у тій самій транзакції
+            apply_in_transaction(db, [order_id for order_id, _, _ in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        for product_id in counts:
+            self.sold_out.discard(product_id)
+        order_changes.publish(order_id for order_id, _, _ in rows)
+        stock_released_total.inc(len(rows))
+        return [OrderEvent(order_id, user_id, product_id, 'expired') for order_id, user_id, product_id in rows]
+
+    def stats(self) -> dict:
+        return {'sold_out': self.sold_out.stats(), 'sharded': len(self._sharded)}
+
+
+inventory = Inventory()
+
+
+class ReservationReaper:
+    def __init__(self, inventory: Inventory = inventory, interval: float = SWEEP_INTERVAL):
+        self.inventory = inventory
+        self.interval = interval
+        self.subject = None
+        self.released = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def sweep(self) -> int:
+        events = self.inventory.release_expired()
+        if events:
+            self.released += len(events)
+            Logger().log(f"Released {len(events)} expired reservations", source='inventory',
+                         orders=[e.id for e in events])
+            if self.subject is not None:
+                self.subject.notify_many(events)
+        return len(events)
+
+    def start(self, subject=None):
+        # subject отримує події 'expired' (SSE-клієнти бачать зміну статусу)
+        if self.running:
+            return
+        self.subject = subject
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='reservation-reaper', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                Logger().log(f"Reservation sweep failed: {e}", level='ERROR', source='inventory')
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+reservation_reaper = ReservationReaper()
@@ -0,0 +1,36 @@
+# Керування залишками товарів:
+#   python -m app.inventory set 1 500            (облік залишку)
+#   python -m app.inventory set 1 5000 --shards 8  (гарячий товар для флеш-розпродажу)
+#   python -m app.inventory set 1 none           (без обліку)
+#   python -m app.inventory show 1
+#   python -m app.inventory expire               (повернути прострочені резерви)
+import argparse
+from app.inventory import inventory
+
+
+def stock_value(value: str):
+    return None if value.lower() == 'none' else int(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Product stock and reservations')
+    commands = parser.add_subparsers(dest='command', required=True)
+    set_stock = commands.add_parser('set', help='set the stock level of a product')
+    set_stock.add_argument('product_id', type=int)
+    set_stock.add_argument('stock', type=stock_value, help="quantity or 'none' to stop tracking")
+    set_stock.add_argument('--shards', type=int, default=1, help='split the stock across counter rows')
+    show = commands.add_parser('show', help='print the current stock level')
+    show.add_argument('product_id', type=int)
+    commands.add_parser('expire', help='release expired reservations now')
+    args = parser.parse_args(argv)
+    if args.command == 'set':
+        inventory.set_stock(args.product_id, args.stock, args.shards)
+    if args.command in ('set', 'show'):
+        level = inventory.stock_level(args.product_id)
+        print(f"{args.product_id}\t{'untracked' if level is None else level}")
+    else:
+        print(f'released {len(inventory.release_expired())} reservations')
+
+
+if __name__ == '__main__':
+    main()
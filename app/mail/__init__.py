@@ -0,0 +1,318 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from typing import List
+from app.utils import Logger
+from app.metrics import Gauge, mail_send_seconds
+
+# Параметри SMTP лише із середовища: облікові дані не зберігаються в коді.
+# Без TECHSTORE_EMAIL_USER вхід на сервер не виконується
+EMAIL_HOST = os.environ.get('TECHSTORE_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('TECHSTORE_EMAIL_PORT', 587))
+EMAIL_HOST_USER = os.environ.get('TECHSTORE_EMAIL_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('TECHSTORE_EMAIL_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('TECHSTORE_EMAIL_TLS', '1') != '0'
+EMAIL_FROM = os.environ.get('TECHSTORE_EMAIL_FROM', EMAIL_HOST_USER or 'noreply@techstore.local')
+
+# Що робити, коли черга заповнена
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_NEW = 'drop_new'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_RAISE = 'raise'
+
+
+class MailQueueFull(Exception):
+    pass
+
+
+def is_permanent(error: Exception) -> bool:
+    # 5xx — сервер відхилив лист чи адресу, повтор дасть те саме. Розрив зʼєднання, таймаут і 4xx — тимчасові
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class MailMessage:
+    def __init__(self, to: str, subject: str, body: str, sender: str = EMAIL_FROM):
+        self.to = to
+        self.subject = subject
+        self.body = body
+        self.sender = sender
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+    def as_string(self) -> str:
+        msg = MIMEText(self.body)
+        msg['Subject'] = self.subject
+        msg['From'] = self.sender
+        msg['To'] = self.to
+        return msg.as_string()
+
+
+# Одне автентифіковане SMTP-зʼєднання, яке перевикористовується між листами
+class SMTPConnection:
+    def __init__(self, host=EMAIL_HOST, port=EMAIL_PORT, user=EMAIL_HOST_USER, password=EMAIL_HOST_PASSWORD,
+                 use_tls=EMAIL_USE_TLS, timeout: float = 10, smtp_class=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.smtp_class = smtp_class
+        self.connects = 0
+        self._server = None
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def open(self):
+        if self._server is not None:
+            return
+        server = self.smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self.connects += 1
+
+    def send(self, message: MailMessage):
+        self.open()
+        try:
+            self._server.sendmail(message.sender, [message.to], message.as_string())
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Зʼєднання більше не придатне, наступна спроба відкриє нове
+            self.close()
+            raise
+
+    def close(self):
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+
+class MailStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.retries = 0
+        self.batches = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def record_sent(self, latency: float):
+        with self._lock:
+            self.sent += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'enqueued': self.enqueued,
+                'sent': self.sent,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'dropped': self.dropped,
+                'retries': self.retries,
+                'batches': self.batches,
+                'latency_avg': self.latency_total / self.sent if self.sent else 0.0,
+                'latency_max': self.latency_max,
+            }
+
+
+# Обмежена черга вихідної пошти; кожен воркер тримає власне SMTP-зʼєднання
+# відкритим між пакетами і закриває його після idle_timeout секунд простою
+class MailQueue:
+    def __init__(self, host=EMAIL_HOST, port=EMAIL_PORT, user=EMAIL_HOST_USER, password=EMAIL_HOST_PASSWORD,
+                 use_tls=EMAIL_USE_TLS, workers: int = 1, maxsize: int = 1000, overflow: str = OVERFLOW_DROP_OLDEST,
+                 batch_size: int = 20, batch_wait: float = 0.05, max_retries: int = 3, backoff: float = 0.5,
+                 backoff_max: float = 30.0, idle_timeout: float = 30.0, autostart: bool = True,
+                 sender: str = EMAIL_FROM, smtp_class=smtplib.SMTP):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST, OVERFLOW_RAISE):
+            raise ValueError(f'Unknown overflow policy: {overflow}')
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.workers = workers
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.idle_timeout = idle_timeout
+        self.autostart = autostart
+        self.sender = sender
+        self.smtp_class = smtp_class
+        self.stats = MailStats()
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._threads: List[threading.Thread] = []
+        self._connections: List[SMTPConnection] = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._threads = []
+            self._connections = []
+            for i in range(self.workers):
+                conn = SMTPConnection(self.host, self.port, self.user, self.password, self.use_tls,
+                                      smtp_class=self.smtp_class)
+                thread = threading.Thread(target=self._worker, args=(conn,), name=f'mail-worker-{i}', daemon=True)
+                self._connections.append(conn)
+                self._threads.append(thread)
+                thread.start()
+
+    def stop(self, drain: bool = True, timeout: float = 10.0):
+        if drain:
+            deadline = time.monotonic() + timeout
+            while self._queue.unfinished_tasks and self.running and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def join(self, timeout: float = 10.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def enqueue(self, to: str, subject: str, body: str) -> bool:
+        return self.put(MailMessage(to, subject, body, sender=self.sender))
+
+    def put(self, message: MailMessage) -> bool:
+        if self.autostart and not self.running and not self._stopping.is_set():
+            self.start()
+        if self.overflow == OVERFLOW_BLOCK:
+            self._queue.put(message)
+        else:
+            try:
+                self._queue.put_nowait(message)
+            except queue.Full:
+                if self.overflow == OVERFLOW_RAISE:
+                    raise MailQueueFull(f'Mail queue is full ({self._queue.maxsize})')
+                if self.overflow == OVERFLOW_DROP_NEW:
+                    self.stats.incr('dropped')
+                    return False
+                self._drop_oldest(message)
+        self.stats.incr('enqueued')
+        return True
+
+    def _drop_oldest(self, message: MailMessage):
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.stats.incr('dropped')
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(message)
+                return
+            except queue.Full:
+                continue
+
+    def _next_batch(self) -> List[MailMessage]:
+        try:
+            first = self._queue.get(timeout=min(self.idle_timeout, 0.5))
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self, conn: SMTPConnection):
+        last_activity = time.monotonic()
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                if conn.connected and time.monotonic() - last_activity > self.idle_timeout:
+                    conn.close()
+                continue
+            self.stats.incr('batches')
+            for message in batch:
+                self._deliver(conn, message)
+                self._queue.task_done()
+            last_activity = time.monotonic()
+        conn.close()
+
+    def _deliver(self, conn: SMTPConnection, message: MailMessage):
+        while True:
+            message.attempts += 1
+            start = time.perf_counter()
+            try:
+                conn.send(message)
+                mail_send_seconds.observe(time.perf_counter() - start, outcome='ok')
+                self.stats.record_sent(time.monotonic() - message.enqueued_at)
+                return
+            except Exception as e:
+                if is_permanent(e):
+                    mail_send_seconds.observe(time.perf_counter() - start, outcome='rejected')
+                    self.stats.incr('rejected')
+                    Logger().log(f"Mail rejected ({message.to}): {e}", level='ERROR', source='mail')
+                    return
+                mail_send_seconds.observe(time.perf_counter() - start, outcome='error')
+                if message.attempts > self.max_retries or self._stopping.is_set():
+                    self.stats.incr('failed')
+                    Logger().log(f"Mail send error ({message.to}): {e}", level='ERROR', source='mail')
+                    return
+                self.stats.incr('retries')
+                delay = min(self.backoff * 2 ** (message.attempts - 1), self.backoff_max)
+                if self._stopping.wait(delay):
+                    self.stats.incr('failed')
+                    return
+
+
+# Спільна черга не стартує сама: воркери запускає app.main при старті, тож імпорт застосунку
+# (тести, CLI) не відкриває SMTP-зʼєднань. Листи до старту лише накопичуються в черзі
+mail_queue = MailQueue(autostart=False)
+Gauge('mail_queue_depth', 'Emails waiting to be sent.', function=lambda: mail_queue.depth)
+
+
+def send_mail(to: str, subject: str, body: str) -> bool:
+    return mail_queue.enqueue(to, subject, body)
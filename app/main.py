@@ -1,20 +1,72 @@
+import time
+# Профілювання імпорту: від першого рядка app.main до готового обʼєкта app
+_import_started = time.perf_counter()
 from fastapi import FastAPI, Request
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-import os
-from app.models import Base, engine, seed_products
-from app.controllers import router as user_router
+from fastapi.responses import HTMLResponse, Response
+from app.models import async_engine
+from app.controllers import order_subject, router as user_router
+from app.mail import mail_queue
+from app.utils import Logger, observer_dispatcher
+from app.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from app.builder import GROUP_COMMIT, GroupCommitWriter, OrderBuilder
+from app.startup import FirstRequestMiddleware, bootstrap, profile
+from app.events import RELAY_ENABLED, event_relay, order_event_hub
+from app.credentials import credentials
+from app.inventory import inventory, reservation_reaper
+from app.admission import AdmissionMiddleware
+from app.httpcache import static_pages
+from app.sessions import session_purger
 
 app = FastAPI()
-templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), 'views/templates'))
+# Admission всередині метрик: відхилені 429/503 теж потрапляють у http_requests_total
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(FirstRequestMiddleware)
+profile.started = _import_started
+profile.record('import', time.perf_counter() - _import_started)
 
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
-    seed_products()
+    Logger().start()
+    # Схема і seed — лише якщо версія схеми застаріла; шаблони компілюються заздалегідь
+    bootstrap()
+    # Статична головна сторінка рендериться один раз і далі віддається з памʼяті
+    static_pages.load('index.html')
+    with profile.phase('services'):
+        mail_queue.start()
+        credentials.prepare()
+        observer_dispatcher.start()
+        if RELAY_ENABLED:
+            event_relay.start()
+        # Прострочені резерви повертаються на склад; SSE-клієнти отримують статус 'expired'.
+        # Лише з TECHSTORE_RESERVATION_EXPIRY=1: без оплати reaper скасовував би справжні замовлення
+        if inventory.expiry:
+            reservation_reaper.start(order_subject())
+        # Прострочені сесії та старі відкликання видаляються при старті й далі раз на годину
+        session_purger.start()
+        if GROUP_COMMIT and OrderBuilder.group_commit is None:
+            OrderBuilder.group_commit = GroupCommitWriter()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    order_event_hub.close()
+    observer_dispatcher.shutdown()
+    event_relay.stop()
+    reservation_reaper.stop()
+    session_purger.stop()
+    if OrderBuilder.group_commit is not None:
+        OrderBuilder.group_commit.stop()
+    mail_queue.stop()
+    credentials.pool.shutdown()
+    await async_engine.dispose()
+    Logger().stop()
 
 @app.get("/", response_class=HTMLResponse)
-def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+async def index(request: Request):
+    return static_pages.response(request, "index.html")
+
+@app.get("/metrics")
+def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
 
 app.include_router(user_router)
@@ -0,0 +1,289 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+
+# Метрики у текстовому форматі Prometheus без зовнішніх залежностей.
+# Модуль не імпортує app.*, тож його можуть використовувати utils, models і mail.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Поріг повільного запиту в секундах; None вимикає лог і збір SQL-текстів
+SLOW_REQUEST_SECONDS: Optional[float] = None
+MAX_LOGGED_STATEMENTS = 50
+MAX_STATEMENT_LENGTH = 500
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List['Metric'] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: 'Metric'):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def get(self, name: str) -> Optional['Metric']:
+        return next((m for m in self._metrics if m.name == name), None)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), registry: Registry = registry):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return []
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}' for k, v in items]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def __init__(self, *args, function: Callable[[], float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # function обчислюється під час scrape (глибина черги тощо)
+        self.function = function
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        if self.function is not None:
+            return [f'{self.name} {_format_value(self.function())}']
+        return super().render()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [лічильники по кошиках (+Inf останній), sum, count]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def sum(self, **labels) -> float:
+        entry = self._values.get(self._key(labels))
+        return entry[1] if entry else 0.0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, float('inf')), counts):
+                cumulative += bucket
+                le = (('le', _format_value(float(bound))),)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+http_requests_total = Counter('http_requests_total', 'HTTP requests by route and status.',
+                              ('method', 'route', 'status'))
+http_request_seconds = Histogram('http_request_duration_seconds', 'HTTP request latency.', ('method', 'route'))
+http_requests_in_flight = Gauge('http_requests_in_flight', 'HTTP requests being processed.')
+http_request_queries = Histogram('http_request_db_queries', 'SQL statements executed per HTTP request.',
+                                 ('route',), buckets=QUERY_COUNT_BUCKETS)
+http_request_db_seconds = Histogram('http_request_db_seconds', 'Time spent in SQL per HTTP request.', ('route',))
+db_query_seconds = Histogram('db_query_duration_seconds', 'SQL statement latency.')
+template_render_seconds = Histogram('template_render_seconds', 'Jinja2 template rendering time.', ('template',))
+observer_call_seconds = Histogram('observer_call_seconds', 'Order observer call latency.', ('observer', 'outcome'))
+observer_events_dropped = Counter('observer_events_dropped_total',
+                                  'Order events dropped because an observer queue was full or closed.', ('observer',))
+mail_send_seconds = Histogram('mail_send_seconds', 'SMTP send latency per attempt.', ('outcome',))
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'statements')
+
+    def __init__(self, capture_statements: bool = False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: Optional[List[str]] = [] if capture_statements else None
+
+
+# Статистика поточного HTTP-запиту; threadpool FastAPI і greenlet async-сесії
+# копіюють контекст, тож SQL із sync- та async-обробників потрапляє в той самий обʼєкт
+_request_stats: contextvars.ContextVar = contextvars.ContextVar('request_stats', default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+_START_KEY = 'metrics_query_start'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_query_seconds.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.statements is not None and len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append(statement[:MAX_STATEMENT_LENGTH])
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get(_START_KEY):
+        conn.info[_START_KEY].pop()
+
+
+def instrument_engine(engine):
+    sync_engine = getattr(engine, 'sync_engine', engine)
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(sync_engine, 'handle_error', _handle_error)
+
+
+def route_label(scope) -> str:
+    # Шаблон шляху (/order_success/{order_id}), а не фактичний URL: обмежена кардинальність
+    route = scope.get('route')
+    return getattr(route, 'path', None) or 'unmatched'
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        slow = SLOW_REQUEST_SECONDS
+        stats = RequestStats(capture_statements=slow is not None)
+        token = _request_stats.set(stats)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            _request_stats.reset(token)
+            route = route_label(scope)
+            method = scope['method']
+            http_requests_total.inc(method=method, route=route, status=str(status[0]))
+            http_request_seconds.observe(elapsed, method=method, route=route)
+            http_request_queries.observe(stats.queries, route=route)
+            http_request_db_seconds.observe(stats.db_time, route=route)
+            if slow is not None and elapsed >= slow:
+                log_slow_request(method, scope.get('path', ''), route, status[0], elapsed, stats)
+
+
+def log_slow_request(method: str, path: str, route: str, status: int, elapsed: float, stats: RequestStats):
+    from app.utils import Logger
+    Logger().log(f"Slow request {method} {path}", level='WARNING', source='slow_request', route=route,
+                 status=status, duration_ms=round(elapsed * 1000, 2), queries=stats.queries,
+                 db_ms=round(stats.db_time * 1000, 2), statements=stats.statements)
+
+
+class TimedTemplates(Jinja2Templates):
+    # Jinja2Templates, що вимірює час рендерингу кожного шаблону
+    def TemplateResponse(self, *args, **kwargs):
+        name = kwargs.get('name') or (args[1] if len(args) > 1 else '')
+        start = time.perf_counter()
+        try:
+            return super().TemplateResponse(*args, **kwargs)
+        finally:
+            template_render_seconds.observe(time.perf_counter() - start, template=name)
@@ -1,5 +1,11 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, create_engine
+import os
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+from sqlalchemy import Column, DateTime, Integer, String, ForeignKey, Float, Index, create_engine, event, inspect, text
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.utils import route_sql_logging
+from app.metrics import instrument_engine
 
 Base = declarative_base()
 
@@ -10,28 +16,50 @@ class Product(Base):
     name = Column(String, nullable=False)
     price = Column(Float, nullable=False)
     type = Column(String, nullable=False)
+    # Залишок на складі; NULL — товар без обліку залишків. Змінюється лише атомарним UPDATE (app/inventory)
+    stock = Column(Integer, nullable=True)
     __mapper_args__ = {'polymorphic_on': type, 'polymorphic_identity': 'product'}
+    # Індекси під keyset-пагінацію каталогу: (price, id) та (name, id), з фільтром за type
+    __table_args__ = (
+        Index('ix_products_price_id', 'price', 'id'),
+        Index('ix_products_name_id', 'name', 'id'),
+        Index('ix_products_type_price_id', 'type', 'price', 'id'),
+        Index('ix_products_type_name_id', 'type', 'name', 'id'),
+    )
 
     @staticmethod
-    def create_product(product_type, name, price, **kwargs):
+    def product_class(product_type):
         if product_type == 'phone':
-            return Phone(name=name, price=price, **kwargs)
+            return Phone
         elif product_type == 'computer':
-            return Computer(name=name, price=price, **kwargs)
+            return Computer
         else:
             raise ValueError('Unknown product type')
 
+    @staticmethod
+    def create_product(product_type, name, price, **kwargs):
+        return Product.product_class(product_type)(name=name, price=price, **kwargs)
+
 class Phone(Product):
     __tablename__ = 'phones'
     id = Column(Integer, ForeignKey('products.id'), primary_key=True)
     sim_count = Column(Integer, default=1)
     __mapper_args__ = {'polymorphic_identity': 'phone'}
+    __table_args__ = (Index('ix_phones_sim_count_id', 'sim_count', 'id'),)
 
 class Computer(Product):
     __tablename__ = 'computers'
     id = Column(Integer, ForeignKey('products.id'), primary_key=True)
     cpu = Column(String)
     __mapper_args__ = {'polymorphic_identity': 'computer'}
+    __table_args__ = (Index('ix_computers_cpu_id', 'cpu', 'id'),)
+
+# Шарди залишку для дуже гарячих товарів: резервування розподіляються між кількома рядками
+class StockShard(Base):
+    __tablename__ = 'product_stock_shards'
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    stock = Column(Integer, nullable=False)
 
 class User(Base):
     __tablename__ = 'users'
@@ -41,21 +69,143 @@ class User(Base):
     name = Column(String, nullable=False)
     orders = relationship('Order', back_populates='user')
 
+def utc_now() -> datetime:
+    # SQLite DateTime зберігає naive-значення; час завжди в UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Order(Base):
     __tablename__ = 'orders'
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     product_id = Column(Integer, ForeignKey('products.id'))
     status = Column(String, default='created')
+    created_at = Column(DateTime, default=utc_now, index=True)
+    # До цього часу неоплачене замовлення тримає резерв товару з обліком залишків
+    reserved_until = Column(DateTime, nullable=True, index=True)
     user = relationship('User', back_populates='orders')
     product = relationship('Product')
+    # (user_id, id) обслуговує історію замовлень з keyset-пагінацією; product_id — JOIN/FK на products
+    __table_args__ = (
+        Index('ix_orders_user_id_id', 'user_id', 'id'),
+        Index('ix_orders_product_id', 'product_id'),
+    )
+
+# Зведення продажів (app/reports): оновлюються інкрементно при створенні та зміні статусу замовлень.
+# Журнал фіксує внесок кожного замовлення, тож повторна подія чи backfill не рахують його двічі
+class SalesLedger(Base):
+    __tablename__ = 'sales_ledger'
+    order_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    type = Column(String, nullable=False)
+    day = Column(String, nullable=False)
+    revenue = Column(Float, nullable=False)
+    counted = Column(Integer, nullable=False)
+
+class SalesByProduct(Base):
+    __tablename__ = 'sales_by_product'
+    product_id = Column(Integer, primary_key=True)
+    type = Column(String, nullable=False)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class SalesByType(Base):
+    __tablename__ = 'sales_by_type'
+    type = Column(String, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class SalesByDay(Base):
+    __tablename__ = 'sales_by_day'
+    day = Column(String, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+# Профіль зберігання SQLite: PRAGMA, що виконуються при кожному новому зʼєднанні
+class StorageProfile(NamedTuple):
+    journal_mode: Optional[str] = None
+    synchronous: Optional[str] = None
+    busy_timeout_ms: Optional[int] = None
+    mmap_size: Optional[int] = None
+
+STORAGE_PROFILES = {
+    # Режим SQLite за замовчуванням: rollback journal, synchronous=FULL
+    'default': StorageProfile(),
+    # WAL: читачі не блокують писача; NORMAL: fsync лише на checkpoint;
+    # busy_timeout: чекати на блокування замість "database is locked"
+    'tuned': StorageProfile(journal_mode='WAL', synchronous='NORMAL', busy_timeout_ms=5000,
+                            mmap_size=256 * 1024 * 1024),
+}
+STORAGE_PROFILE = 'tuned'
+
+def apply_storage_profile(engine, profile):
+    if isinstance(profile, str):
+        profile = STORAGE_PROFILES[profile]
+    pragmas = []
+    if profile.journal_mode:
+        pragmas.append(f'PRAGMA journal_mode={profile.journal_mode}')
+    if profile.synchronous:
+        pragmas.append(f'PRAGMA synchronous={profile.synchronous}')
+    if profile.busy_timeout_ms is not None:
+        pragmas.append(f'PRAGMA busy_timeout={int(profile.busy_timeout_ms)}')
+    if profile.mmap_size is not None:
+        pragmas.append(f'PRAGMA mmap_size={int(profile.mmap_size)}')
+    if not pragmas:
+        return
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    event.listen(getattr(engine, 'sync_engine', engine), 'connect', set_pragmas)
 
 # SQLite engine and session
-engine = create_engine('sqlite:///app.db', echo=True, future=True)
+# SQL echo іде через Logger (JSON, семплінг), а не синхронним print у stdout
+SQL_ECHO = True
+# Шлях до БД можна перевизначити змінною середовища (бенчмарки, окремі стенди)
+DB_PATH = os.environ.get('TECHSTORE_DB_PATH', 'app.db')
+DATABASE_URL = f'sqlite:///{DB_PATH}'
+ASYNC_DATABASE_URL = f'sqlite+aiosqlite:///{DB_PATH}'
+engine = create_engine(DATABASE_URL, echo=False, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
-def seed_products():
-    db = SessionLocal()
+# Async engine and session (aiosqlite) для async-обробників.
+# expire_on_commit=False: після commit атрибути не перечитуються ліниво,
+# бо lazy load в async-контексті неможливий
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+apply_storage_profile(engine, STORAGE_PROFILE)
+apply_storage_profile(async_engine, STORAGE_PROFILE)
+# Кількість і час SQL-запитів на HTTP-запит для /metrics і логу повільних запитів
+instrument_engine(engine)
+instrument_engine(async_engine)
+
+if SQL_ECHO:
+    route_sql_logging()
+
+def ensure_indexes(bind=engine):
+    # create_all не додає нові індекси до вже існуючих таблиць
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+def ensure_columns(bind=engine):
+    # create_all не змінює існуючі таблиці: нові nullable-колонки додаються через ALTER TABLE
+    existing_tables = set(inspect(bind).get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c['name'] for c in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in present and column.nullable:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def seed_products(bind=engine):
+    db = SessionLocal(bind=bind)
     if db.query(Product).count() == 0:
         phone = Product.create_product('phone', name='iPhone 15', price=35000, sim_count=2)
         computer = Product.create_product('computer', name='MacBook Air', price=50000, cpu='M2')
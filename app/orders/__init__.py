@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload, with_polymorphic
+from app.models import Order, Product
+from app.catalog import ProductView, DEFAULT_PAGE_SIZE, clamp_limit
+
+
+class OrderView(NamedTuple):
+    id: int
+    status: str
+    created_at: Optional[datetime]
+    product: Optional[ProductView]
+
+    @classmethod
+    def from_model(cls, order: Order) -> 'OrderView':
+        product = ProductView.from_model(order.product) if order.product is not None else None
+        return cls(order.id, order.status, order.created_at, product)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'product': self.product._asdict() if self.product else None,
+        }
+
+
+class OrderPage(NamedTuple):
+    items: Tuple[OrderView, ...]
+    next_before: Optional[int]
+
+
+def history_query(user_id: int, before: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+    # Два запити на сторінку незалежно від її розміру: замовлення (індекс (user_id, id))
+    # і один SELECT ... IN для товарів разом з колонками phones/computers
+    product = with_polymorphic(Product, '*')
+    stmt = (select(Order).where(Order.user_id == user_id)
+            .options(selectinload(Order.product.of_type(product))))
+    if before is not None:
+        # Seek за Order.id: найновіші замовлення першими, без OFFSET
+        stmt = stmt.where(Order.id < before)
+    return stmt.order_by(Order.id.desc()).limit(limit + 1)
+
+
+def build_history_page(limit: int, orders) -> OrderPage:
+    views = tuple(OrderView.from_model(o) for o in orders)
+    if len(views) <= limit:
+        return OrderPage(views, None)
+    return OrderPage(views[:limit], views[limit - 1].id)
+
+
+def order_history(session, user_id: int, before: Optional[int] = None,
+                  limit: int = DEFAULT_PAGE_SIZE) -> OrderPage:
+    limit = clamp_limit(limit)
+    return build_history_page(limit, session.scalars(history_query(user_id, before, limit)).all())
+
+
+async def order_history_async(session, user_id: int, before: Optional[int] = None,
+                              limit: int = DEFAULT_PAGE_SIZE) -> OrderPage:
+    limit = clamp_limit(limit)
+    result = await session.scalars(history_query(user_id, before, limit))
+    return build_history_page(limit, result.all())
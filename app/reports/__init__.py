@@ -0,0 +1,276 @@
+from datetime import date
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import bindparam, case, delete, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from app.models import (Order, Product, SalesByDay, SalesByProduct, SalesByType, SalesLedger, SessionLocal, engine,
+                        utc_now)
+from app.metrics import Counter
+from app.utils import OrderObserver
+
+# Замовлення з цими статусами не входять у продажі; перехід у них віднімає внесок замовлення
+EXCLUDED_STATUSES = ('expired', 'cancelled')
+REPORT_GROUPS = ('product', 'type', 'day')
+BACKFILL_CHUNK_SIZE = 5000
+DEFAULT_REPORT_LIMIT = 100
+MAX_REPORT_LIMIT = 1000
+
+ledger = SalesLedger.__table__
+by_product = SalesByProduct.__table__
+by_type = SalesByType.__table__
+by_day = SalesByDay.__table__
+
+sales_rollup_changes_total = Counter('sales_rollup_changes_total', 'Orders added to or removed from sales rollups.',
+                                     ('change',))
+sales_rollup_reconciled_total = Counter('sales_rollup_reconciled_total',
+                                        'Orders that were out of sync with the rollups and fixed by reconcile.')
+
+
+class OrderFact(NamedTuple):
+    order_id: int
+    product_id: int
+    type: str
+    day: str
+    revenue: float
+    counted: bool
+
+
+class SalesRow(NamedTuple):
+    key: str
+    orders: int
+    revenue: float
+    name: Optional[str] = None
+    type: Optional[str] = None
+
+
+class SalesReport(NamedTuple):
+    group: str
+    rows: Tuple[SalesRow, ...]
+    orders: int
+    revenue: float
+
+
+def fact_query():
+    # Ціна береться з товару на момент першого обліку і далі живе в журналі
+    return (select(Order.id, Order.product_id, Order.status, Order.created_at, Product.type, Product.price)
+            .join(Product, Product.id == Order.product_id))
+
+
+def to_fact(row) -> OrderFact:
+    day = (row.created_at or utc_now()).date().isoformat()
+    return OrderFact(row.id, row.product_id, row.type, day, float(row.price), row.status not in EXCLUDED_STATUSES)
+
+
+class _Deltas:
+    def __init__(self):
+        self.products: Dict[Tuple[int, str], List[float]] = {}
+        self.types: Dict[str, List[float]] = {}
+        self.days: Dict[str, List[float]] = {}
+
+    def add(self, sign: int, product_id: int, type: str, day: str, revenue: float):
+        for bucket, key in ((self.products, (product_id, type)), (self.types, type), (self.days, day)):
+            entry = bucket.setdefault(key, [0, 0.0])
+            entry[0] += sign
+            entry[1] += sign * revenue
+
+    def write(self, session):
+        for table, rows in (
+                (by_product, [{'product_id': k[0], 'type': k[1], 'orders': v[0], 'revenue': v[1]}
+                              for k, v in self.products.items()]),
+                (by_type, [{'type': k, 'orders': v[0], 'revenue': v[1]} for k, v in self.types.items()]),
+                (by_day, [{'day': k, 'orders': v[0], 'revenue': v[1]} for k, v in self.days.items()])):
+            if not rows:
+                continue
+            stmt = insert(table)
+            keys = [c.name for c in table.primary_key]
+            session.execute(stmt.on_conflict_do_update(index_elements=keys, set_={
+                'orders': table.c.orders + stmt.excluded.orders,
+                'revenue': table.c.revenue + stmt.excluded.revenue,
+            }), rows)
+
+
+def apply_facts(session, facts: Iterable[OrderFact]) -> int:
+    # Перший запис — пакетний INSERT ... ON CONFLICT DO NOTHING RETURNING: нові замовлення враховуються,
+    # а транзакція вже тримає блокування запису. Тому подальше читання журналу для решти замовлень
+    # узгоджене: повторна подія, backfill під час трафіку чи два воркери не подвоять суму
+    facts = {fact.order_id: fact for fact in facts}
+    if not facts:
+        return 0
+    deltas = _Deltas()
+    inserted = set(session.scalars(
+        insert(ledger).on_conflict_do_nothing(index_elements=['order_id']).returning(ledger.c.order_id),
+        [{**fact._asdict(), 'counted': int(fact.counted)} for fact in facts.values()]))
+    changes = []
+    for order_id in inserted:
+        fact = facts[order_id]
+        if fact.counted:
+            deltas.add(1, fact.product_id, fact.type, fact.day, fact.revenue)
+            changes.append('added')
+    existing = [order_id for order_id in facts if order_id not in inserted]
+    if existing:
+        transitions = []
+        rows = session.execute(select(ledger.c.order_id, ledger.c.counted, ledger.c.product_id, ledger.c.type,
+                                      ledger.c.day, ledger.c.revenue).where(ledger.c.order_id.in_(existing)))
+        for order_id, counted, product_id, type, day, revenue in rows:
+            fact = facts[order_id]
+            if bool(counted) != fact.counted:
+                # Сума з журналу: виручка за ціною на момент першого обліку
+                deltas.add(1 if fact.counted else -1, product_id, type, day, revenue)
+                transitions.append({'id': order_id, 'counted': int(fact.counted)})
+                changes.append('added' if fact.counted else 'removed')
+        if transitions:
+            session.execute(update(ledger).where(ledger.c.order_id == bindparam('id'))
+                            .values(counted=bindparam('counted')), transitions)
+    deltas.write(session)
+    for change in changes:
+        sales_rollup_changes_total.inc(change=change)
+    return len(changes)
+
+
+def apply_in_transaction(session, order_ids: Iterable[int]) -> int:
+    # Викликається кодом, що пише замовлення (OrderBuilder, group commit, Inventory.release_expired),
+    # після flush і до commit: зведення змінюються атомарно з замовленням і не залежать від подій
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+    rows = session.execute(fact_query().where(Order.id.in_(order_ids))).all()
+    return apply_facts(session, [to_fact(row) for row in rows])
+
+
+def apply_orders(order_ids: Iterable[int], bind=engine) -> int:
+    # Поточний стан замовлень з БД, а не з події: порядок і дублікати подій не важливі
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+    db = SessionLocal(bind=bind)
+    try:
+        changed = apply_in_transaction(db, order_ids)
+        db.commit()
+        return changed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def backfill(bind=engine, chunk_size: int = BACKFILL_CHUNK_SIZE, rebuild: bool = False,
+             progress: Callable[[int], None] = None) -> int:
+    # Історія обробляється порціями за id (keyset), одна транзакція на порцію.
+    # Без rebuild лише дораховує пропущені замовлення; можна запускати під трафіком
+    db = SessionLocal(bind=bind)
+    try:
+        if rebuild:
+            for table in (ledger, by_product, by_type, by_day):
+                db.execute(delete(table))
+            db.commit()
+        last_id, processed = 0, 0
+        while True:
+            rows = db.execute(fact_query().where(Order.id > last_id).order_by(Order.id).limit(chunk_size)).all()
+            if not rows:
+                break
+            apply_facts(db, [to_fact(row) for row in rows])
+            db.commit()
+            last_id = rows[-1].id
+            processed += len(rows)
+            if progress is not None:
+                progress(processed)
+        return processed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def unreconciled_orders(session, after: int = 0, limit: int = BACKFILL_CHUNK_SIZE) -> List[int]:
+    # Замовлення без запису в журналі або з облікованим станом, що розійшовся з поточним статусом
+    counted = case((Order.status.in_(EXCLUDED_STATUSES), 0), else_=1)
+    return list(session.scalars(
+        select(Order.id).join(Product, Product.id == Order.product_id)
+        .outerjoin(ledger, ledger.c.order_id == Order.id)
+        .where(Order.id > after, or_(ledger.c.order_id.is_(None), ledger.c.counted != counted))
+        .order_by(Order.id).limit(limit)))
+
+
+def reconcile(bind=engine, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    # Ручна перевірка (python -m app.reports reconcile), наприклад після зміни статусів поза застосунком.
+    # Сканує всю історію замовлень, тож не запускається періодично
+    db = SessionLocal(bind=bind)
+    try:
+        last_id, changed = 0, 0
+        while True:
+            order_ids = unreconciled_orders(db, last_id, chunk_size)
+            if not order_ids:
+                break
+            rows = db.execute(fact_query().where(Order.id.in_(order_ids))).all()
+            changed += apply_facts(db, [to_fact(row) for row in rows])
+            db.commit()
+            last_id = order_ids[-1]
+        if changed:
+            sales_rollup_reconciled_total.inc(changed)
+        return changed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def report_statements(group: str, since: Optional[date] = None, until: Optional[date] = None,
+                      limit: int = DEFAULT_REPORT_LIMIT):
+    # Лише таблиці зведень: розмір — товари, типи й дні, а не кількість замовлень
+    if group not in REPORT_GROUPS:
+        raise ValueError(f'Unknown report group: {group}')
+    limit = max(1, min(limit, MAX_REPORT_LIMIT))
+    if group == 'product':
+        rows = (select(by_product.c.product_id, by_product.c.orders, by_product.c.revenue, Product.name,
+                       by_product.c.type)
+                .outerjoin(Product.__table__, Product.id == by_product.c.product_id)
+                .order_by(by_product.c.revenue.desc(), by_product.c.product_id).limit(limit))
+    elif group == 'type':
+        rows = select(by_type.c.type, by_type.c.orders, by_type.c.revenue).order_by(by_type.c.revenue.desc())
+    else:
+        rows = select(by_day.c.day, by_day.c.orders, by_day.c.revenue).order_by(by_day.c.day.desc()).limit(limit)
+    if group == 'day' and (since or until):
+        bounds = []
+        if since:
+            bounds.append(by_day.c.day >= since.isoformat())
+        if until:
+            bounds.append(by_day.c.day <= until.isoformat())
+        rows = rows.where(*bounds)
+        totals = select(func.sum(by_day.c.orders), func.sum(by_day.c.revenue)).where(*bounds)
+    else:
+        totals = select(func.sum(by_type.c.orders), func.sum(by_type.c.revenue))
+    return rows, totals
+
+
+def build_report(group: str, rows, totals) -> SalesReport:
+    items = tuple(SalesRow(str(row[0]), row[1], round(row[2], 2), *row[3:]) for row in rows)
+    orders, revenue = totals
+    return SalesReport(group, items, orders or 0, round(revenue or 0.0, 2))
+
+
+def sales_report(session, group: str = 'type', since: Optional[date] = None, until: Optional[date] = None,
+                 limit: int = DEFAULT_REPORT_LIMIT) -> SalesReport:
+    rows, totals = report_statements(group, since, until, limit)
+    return build_report(group, session.execute(rows).all(), session.execute(totals).one())
+
+
+async def sales_report_async(session, group: str = 'type', since: Optional[date] = None,
+                             until: Optional[date] = None, limit: int = DEFAULT_REPORT_LIMIT) -> SalesReport:
+    rows, totals = report_statements(group, since, until, limit)
+    return build_report(group, (await session.execute(rows)).all(), (await session.execute(totals)).one())
+
+
+# Для змін статусу поза OrderBuilder/Inventory (скрипти, інтеграції); код застосунку оновлює
+# зведення у транзакції замовлення
+class RollupObserver(OrderObserver):
+    def __init__(self, bind=engine):
+        self.bind = bind
+
+    def update(self, order):
+        apply_orders([order.id], self.bind)
+
+    def update_many(self, orders):
+        apply_orders([order.id for order in orders], self.bind)
+
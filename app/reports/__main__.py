@@ -0,0 +1,51 @@
+# Зведення продажів:
+#   python -m app.reports backfill                (дорахувати пропущені замовлення, безпечно під трафіком)
+#   python -m app.reports backfill --rebuild      (очистити зведення і перерахувати всю історію)
+#   python -m app.reports reconcile               (замовлення, змінені в обхід застосунку)
+#   python -m app.reports show --group day --since 2026-01-01
+import argparse
+import sys
+import time
+from datetime import date
+from app.models import Base, SessionLocal, engine
+from app.reports import (BACKFILL_CHUNK_SIZE, DEFAULT_REPORT_LIMIT, REPORT_GROUPS, backfill, reconcile,
+                         sales_report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sales rollup tables')
+    commands = parser.add_subparsers(dest='command', required=True)
+    fill = commands.add_parser('backfill', help='apply order history to the rollups in chunks')
+    fill.add_argument('--rebuild', action='store_true', help='truncate the rollups first')
+    fill.add_argument('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE, help='orders per transaction')
+    fill.add_argument('--quiet', action='store_true', help='no per-chunk progress')
+    fix = commands.add_parser('reconcile', help='apply orders whose rollup events were missed')
+    fix.add_argument('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE, help='orders per transaction')
+    show = commands.add_parser('show', help='print a report from the rollups')
+    show.add_argument('--group', choices=REPORT_GROUPS, default='type')
+    show.add_argument('--since', type=date.fromisoformat)
+    show.add_argument('--until', type=date.fromisoformat)
+    show.add_argument('--limit', type=int, default=DEFAULT_REPORT_LIMIT)
+    args = parser.parse_args(argv)
+    if args.command == 'backfill':
+        Base.metadata.create_all(bind=engine)
+        start = time.perf_counter()
+        progress = None if args.quiet else (lambda n: print(f'{n} orders', file=sys.stderr))
+        processed = backfill(chunk_size=args.chunk_size, rebuild=args.rebuild, progress=progress)
+        print(f'processed {processed} orders in {time.perf_counter() - start:.2f}s')
+        return
+    if args.command == 'reconcile':
+        print(f'reconciled {reconcile(chunk_size=args.chunk_size)} orders')
+        return
+    db = SessionLocal()
+    try:
+        report = sales_report(db, args.group, args.since, args.until, args.limit)
+    finally:
+        db.close()
+    for row in report.rows:
+        print('\t'.join(str(v) for v in row if v is not None))
+    print(f'total\t{report.orders}\t{report.revenue}')
+
+
+if __name__ == '__main__':
+    main()
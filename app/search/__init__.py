@@ -0,0 +1,124 @@
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from app.models import AsyncSessionLocal, SessionLocal, engine
+from app.catalog import ProductView, clamp_limit
+
+FTS_TABLE = 'products_fts'
+# Ваги bm25 для колонок name, cpu, sim_count, type (type не індексується)
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 0.0)
+DEFAULT_SEARCH_LIMIT = 10
+
+# prefix='2 3': окремі індекси префіксів для type-ahead без сканування словника
+CREATE_FTS = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, cpu, sim_count, type UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+# Тригери тримають індекс синхронним з products/phones/computers для будь-якого запису:
+# ORM, пакетний INSERT імпортера чи сирий SQL
+TRIGGERS = {
+    'products_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, name, type) VALUES (new.id, new.name, new.type);
+        END""",
+    'products_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, type ON products BEGIN
+            UPDATE {FTS_TABLE} SET name = new.name, type = new.type WHERE rowid = new.id;
+        END""",
+    'products_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        END""",
+    'phones_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS phones_fts_ai AFTER INSERT ON phones BEGIN
+            UPDATE {FTS_TABLE} SET sim_count = new.sim_count WHERE rowid = new.id;
+        END""",
+    'phones_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS phones_fts_au AFTER UPDATE OF sim_count ON phones BEGIN
+            UPDATE {FTS_TABLE} SET sim_count = new.sim_count WHERE rowid = new.id;
+        END""",
+    'computers_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS computers_fts_ai AFTER INSERT ON computers BEGIN
+            UPDATE {FTS_TABLE} SET cpu = new.cpu WHERE rowid = new.id;
+        END""",
+    'computers_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS computers_fts_au AFTER UPDATE OF cpu ON computers BEGIN
+            UPDATE {FTS_TABLE} SET cpu = new.cpu WHERE rowid = new.id;
+        END""",
+}
+
+REBUILD = f"""
+INSERT INTO {FTS_TABLE} (rowid, name, cpu, sim_count, type)
+SELECT p.id, p.name, c.cpu, ph.sim_count, p.type
+FROM products p
+LEFT JOIN phones ph ON ph.id = p.id
+LEFT JOIN computers c ON c.id = p.id
+"""
+
+SEARCH = f"""
+SELECT p.id, p.name, p.price, p.type, ph.sim_count, c.cpu
+FROM {FTS_TABLE} f
+JOIN products p ON p.id = f.rowid
+LEFT JOIN phones ph ON ph.id = p.id
+LEFT JOIN computers c ON c.id = p.id
+WHERE {FTS_TABLE} MATCH :match AND (:type IS NULL OR p.type = :type)
+ORDER BY bm25({FTS_TABLE}, {', '.join(str(w) for w in BM25_WEIGHTS)}), p.id
+LIMIT :limit
+"""
+
+def ensure_search_index(bind=engine) -> bool:
+    # Повертає True, якщо індекс створено щойно (і заповнено з існуючого каталогу)
+    with bind.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                              {'name': FTS_TABLE}).first() is not None
+        conn.execute(text(CREATE_FTS))
+        for ddl in TRIGGERS.values():
+            conn.execute(text(ddl))
+        if not exists:
+            conn.execute(text(REBUILD))
+    return not exists
+
+def rebuild_search_index(bind=engine) -> int:
+    ensure_search_index(bind)
+    with bind.begin() as conn:
+        conn.execute(text(f'DELETE FROM {FTS_TABLE}'))
+        conn.execute(text(REBUILD))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"))
+        return conn.execute(text(f'SELECT count(*) FROM {FTS_TABLE}')).scalar()
+
+def match_expression(query: str) -> Optional[str]:
+    # Кожне слово — окремий префіксний терм у лапках: спецсимволи FTS5 з вводу не інтерпретуються
+    terms = re.findall(r'\w+', query or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_params(query: str, limit: int, product_type: Optional[str]) -> Optional[dict]:
+    match = match_expression(query)
+    if match is None:
+        return None
+    return {'match': match, 'type': product_type or None, 'limit': clamp_limit(limit)}
+
+def search(query: str, limit: int = DEFAULT_SEARCH_LIMIT, product_type: Optional[str] = None,
+           session_factory=SessionLocal) -> Tuple[ProductView, ...]:
+    params = search_params(query, limit, product_type)
+    if params is None:
+        return ()
+    db = session_factory()
+    try:
+        return tuple(ProductView(*row) for row in db.execute(text(SEARCH), params))
+    finally:
+        db.close()
+
+async def search_async(query: str, limit: int = DEFAULT_SEARCH_LIMIT, product_type: Optional[str] = None,
+                       session_factory=AsyncSessionLocal) -> Tuple[ProductView, ...]:
+    params = search_params(query, limit, product_type)
+    if params is None:
+        return ()
+    async with session_factory() as session:
+        result = await session.execute(text(SEARCH), params)
+        return tuple(ProductView(*row) for row in result)
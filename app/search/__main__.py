@@ -0,0 +1,26 @@
+# Перебудова FTS-індексу товарів для існуючого каталогу:
+#   python -m app.search rebuild
+#   python -m app.search query "iphone 15"
+import argparse
+from app.models import Base, engine
+from app.search import rebuild_search_index, search
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Product full-text search index')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help='recreate the index from products/phones/computers')
+    query = commands.add_parser('query', help='run a search against the index')
+    query.add_argument('text')
+    query.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args(argv)
+    if args.command == 'rebuild':
+        Base.metadata.create_all(bind=engine)
+        print(f'indexed {rebuild_search_index()} products')
+    else:
+        for product in search(args.text, args.limit):
+            print(f'{product.id}\t{product.type}\t{product.name}\t{product.price}')
+
+
+if __name__ == '__main__':
+    main()
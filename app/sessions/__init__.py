@@ -0,0 +1,338 @@
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+from app.snapshot import SHARED_SNAPSHOTS, SharedGeneration
+from app.utils import Logger
+
+SESSION_TTL = 7 * 24 * 3600
+# Скільки секунд воркер довіряє локальній копії сесії без звернення до backend. Відкликання
+# видно одразу через журнал revocations; без нього (Windows, видалення напряму в backend)
+# інший воркер може приймати відкликаний токен ще до LOCAL_CACHE_TTL секунд
+LOCAL_CACHE_TTL = 30
+LOCAL_CACHE_SIZE = 10000
+SESSIONS_DB_PATH = os.environ.get('TECHSTORE_SESSIONS_DB_PATH', 'sessions.db')
+# Покоління журналу відкликань: logout у будь-якому воркері прибирає цей ключ з кешів інших
+SESSIONS_REVOKED_PATH = os.environ.get('TECHSTORE_SESSIONS_REVOKED_PATH', SESSIONS_DB_PATH + '.revoked')
+# Запис журналу потрібен, доки відкликаний ключ може лежати в чиємусь локальному кеші
+REVOCATION_RETENTION = 10 * LOCAL_CACHE_TTL
+PURGE_INTERVAL = 3600
+
+
+class Principal(NamedTuple):
+    id: int
+    name: str
+    email: str
+
+
+# Співробітники з доступом до внутрішніх звітів: email через кому. Ролей у таблиці users немає
+STAFF_EMAILS = frozenset(email.strip().lower() for email in os.environ.get('TECHSTORE_STAFF_EMAILS', '').split(',')
+                         if email.strip())
+
+
+def is_staff(principal: Optional[Principal]) -> bool:
+    return principal is not None and principal.email.lower() in STAFF_EMAILS
+
+
+def token_key(token: str) -> str:
+    # У backend зберігається лише хеш токена
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Principal, float]]:
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key: str, principal: Principal, expires_at: float):
+        with self._lock:
+            self._data[key] = (principal, expires_at)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def purge(self, now: float):
+        with self._lock:
+            for key in [k for k, (_, exp) in self._data.items() if exp <= now]:
+                del self._data[key]
+
+
+class SQLiteBackend:
+    def __init__(self, path: str = SESSIONS_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Окреме зʼєднання на потік; файл і таблиця створюються при першому зверненні
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS auth_sessions ('
+                         'key TEXT PRIMARY KEY, user_id INTEGER NOT NULL, name TEXT NOT NULL, '
+                         'email TEXT NOT NULL, expires_at REAL NOT NULL)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[Principal, float]]:
+        row = self._connect().execute(
+            'SELECT user_id, name, email, expires_at FROM auth_sessions WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return Principal(row[0], row[1], row[2]), row[3]
+
+    def set(self, key: str, principal: Principal, expires_at: float):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO auth_sessions VALUES (?, ?, ?, ?, ?)',
+                         (key, principal.id, principal.name, principal.email, expires_at))
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM auth_sessions WHERE key = ?', (key,))
+
+    def purge(self, now: float):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM auth_sessions WHERE expires_at <= ?', (now,))
+
+
+class FileBackend:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> Optional[Tuple[Principal, float]]:
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return Principal(*data['principal']), data['expires_at']
+
+    def set(self, key: str, principal: Principal, expires_at: float):
+        tmp = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'principal': list(principal), 'expires_at': expires_at}, f)
+        os.replace(tmp, self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def purge(self, now: float):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                key = name[:-len('.json')]
+                entry = self.get(key)
+                if entry is None or entry[1] <= now:
+                    self.delete(key)
+
+
+# Журнал відкликаних ключів у sessions.db. Спільне покоління змінюється після кожного запису,
+# тож на запиті воркер лише читає mmap, а журнал перечитує тільки після нового logout
+class RevocationLog:
+    def __init__(self, path: str = SESSIONS_DB_PATH, generation_path: str = SESSIONS_REVOKED_PATH,
+                 retention: float = REVOCATION_RETENTION):
+        self.path = path
+        self.generation = SharedGeneration(generation_path)
+        self.retention = retention
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._seen: Optional[int] = None
+        self._last_seq = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS auth_revocations ('
+                         'seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, revoked_at REAL NOT NULL)')
+            self._local.conn = conn
+        return conn
+
+    def changed(self) -> bool:
+        return self.generation.value != self._seen
+
+    def add(self, key: str):
+        with self._connect() as conn:
+            conn.execute('INSERT INTO auth_revocations (key, revoked_at) VALUES (?, ?)', (key, time.time()))
+        self.generation.bump()
+
+    def poll(self) -> List[str]:
+        # Ключі, відкликані після попереднього poll. Покоління читається до журналу: запис,
+        # зроблений під час читання, потрапить у наступний poll
+        generation = self.generation.value
+        if generation == self._seen:
+            return []
+        with self._lock:
+            if generation == self._seen:
+                return []
+            conn = self._connect()
+            if self._seen is None:
+                # Перший виклик: старі відкликання не стосуються ще порожнього кешу
+                self._last_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM auth_revocations').fetchone()[0]
+                self._seen = generation
+                return []
+            rows = conn.execute('SELECT seq, key FROM auth_revocations WHERE seq > ? ORDER BY seq',
+                                (self._last_seq,)).fetchall()
+            if rows:
+                self._last_seq = rows[-1][0]
+            self._seen = generation
+            return [key for _, key in rows]
+
+    def purge(self, now: float):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM auth_revocations WHERE revoked_at <= ?', (now - self.retention,))
+
+
+# Непрозорі токени сесій -> Principal; локальний LRU з TTL перед спільним backend.
+# Ключі, відкликані в інших воркерах, прибираються з кешу за журналом revocations
+class SessionStore:
+    def __init__(self, backend=None, ttl: float = SESSION_TTL, cache_size: int = LOCAL_CACHE_SIZE,
+                 cache_ttl: float = LOCAL_CACHE_TTL, revocations: RevocationLog = None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.revocations = revocations
+        self._cache: 'OrderedDict[str, Tuple[Principal, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _sync_revocations(self):
+        if self.revocations is None:
+            return
+        keys = self.revocations.poll()
+        if keys:
+            with self._lock:
+                for key in keys:
+                    self._cache.pop(key, None)
+
+    def create(self, principal: Principal) -> str:
+        token = secrets.token_urlsafe(32)
+        key = token_key(token)
+        expires_at = time.time() + self.ttl
+        self._sync_revocations()
+        self.backend.set(key, principal, expires_at)
+        self._remember(key, principal, expires_at)
+        return token
+
+    def get(self, token: Optional[str]) -> Optional[Principal]:
+        if not token:
+            return None
+        key = token_key(token)
+        now = time.time()
+        # Журнал читається до backend: відкликання під час читання прибере запис наступним poll
+        self._sync_revocations()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._cache[key]
+            self.misses += 1
+        stored = self.backend.get(key)
+        if stored is None:
+            return None
+        principal, expires_at = stored
+        if expires_at <= now:
+            self.backend.delete(key)
+            return None
+        self._remember(key, principal, expires_at)
+        return principal
+
+    def cached(self, token: Optional[str]) -> Optional[Principal]:
+        # Лише локальний кеш, без звернення до backend: для коду в event loop (admission).
+        # Поки журнал відкликань не перечитано, кешу не довіряємо
+        if not token or (self.revocations is not None and self.revocations.changed()):
+            return None
+        with self._lock:
+            entry = self._cache.get(token_key(token))
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def revoke(self, token: Optional[str]):
+        if not token:
+            return
+        key = token_key(token)
+        with self._lock:
+            self._cache.pop(key, None)
+        self.backend.delete(key)
+        if self.revocations is not None:
+            self.revocations.add(key)
+
+    def purge(self):
+        now = time.time()
+        self.backend.purge(now)
+        if self.revocations is not None:
+            self.revocations.purge(now)
+
+    def _remember(self, key: str, principal: Principal, expires_at: float):
+        with self._lock:
+            self._cache[key] = (principal, min(expires_at, time.time() + self.cache_ttl))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'cached': len(self._cache)}
+
+
+# Періодично видаляє прострочені сесії та старі записи журналу відкликань
+class SessionPurger:
+    def __init__(self, store: SessionStore, interval: float = PURGE_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='session-purger', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # Перший прохід одразу після старту, далі раз на interval
+        while True:
+            try:
+                self.store.purge()
+            except Exception as e:
+                Logger().log(f"Session purge failed: {e}", level='ERROR', source='sessions')
+            if self._stopping.wait(self.interval):
+                return
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+session_store = SessionStore(SQLiteBackend(), revocations=RevocationLog() if SHARED_SNAPSHOTS else None)
+session_purger = SessionPurger(session_store)
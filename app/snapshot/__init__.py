@@ -0,0 +1,302 @@
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence as SequenceABC
+from contextlib import contextmanager
+from typing import Optional, Sequence
+from app.metrics import Counter
+
+try:
+    import fcntl
+except ImportError:  # Windows: без міжпроцесного lock спільний знімок вимкнено
+    fcntl = None
+
+# Спільний знімок каталогу для воркерів uvicorn. Файл знімка — заголовок, масив записів фіксованого
+# розміру (відсортований за id) і купа UTF-8 рядків. Воркери мапають його лише для читання, тож
+# дані живуть у page cache один раз на машину. Поколінням керує окремий 8-байтовий файл, теж
+# змапаний: перевірка свіжості — читання з памʼяті без системних викликів
+MAGIC = b'TSCAT\x00\x00\x01'
+HEADER = struct.Struct('<8sQIIQ')  # magic, generation, count, record_size, heap_offset
+# id, price, sim_count, (offset, length) для name/type/cpu, прапорці; вирівняно до 8 байт
+RECORD = struct.Struct('<qdqIIIIIIB7x')
+GENERATION = struct.Struct('<Q')
+FIELDS = ('id', 'name', 'price', 'type', 'sim_count', 'cpu')
+HAS_SIM_COUNT = 1
+HAS_CPU = 2
+
+_ID = struct.Struct('<q')
+_PRICE = struct.Struct('<d')
+_SPAN = struct.Struct('<II')
+_FLAGS = struct.Struct('<B')
+
+catalog_snapshot_publishes_total = Counter('catalog_snapshot_publishes_total',
+                                           'Catalog snapshots written to the shared file.')
+catalog_snapshot_maps_total = Counter('catalog_snapshot_maps_total', 'Catalog snapshot generations mapped.')
+
+
+def encode(generation: int, products: Sequence) -> bytes:
+    # products — обʼєкти з полями ProductView
+    products = sorted(products, key=lambda p: p.id)
+    heap = bytearray()
+    spans = {}
+
+    def intern(value: str):
+        span = spans.get(value)
+        if span is None:
+            raw = value.encode()
+            span = spans[value] = (len(heap), len(raw))
+            heap.extend(raw)
+        return span
+
+    records = bytearray(RECORD.size * len(products))
+    for i, p in enumerate(products):
+        flags = (HAS_SIM_COUNT if p.sim_count is not None else 0) | (HAS_CPU if p.cpu is not None else 0)
+        RECORD.pack_into(records, i * RECORD.size, p.id, p.price, p.sim_count or 0,
+                         *intern(p.name), *intern(p.type), *intern(p.cpu or ''), flags)
+    header = HEADER.pack(MAGIC, generation, len(products), RECORD.size, HEADER.size + len(records))
+    return bytes(header + records + heap)
+
+
+class ProductRecord:
+    # Легкий view на запис у буфері: поля читаються при доступі, сумісний з ProductView
+    # для шаблонів, JSON (_asdict) і порівняння
+    __slots__ = ('_catalog', '_offset')
+    _fields = FIELDS
+
+    def __init__(self, catalog: 'MappedCatalog', offset: int):
+        self._catalog = catalog
+        self._offset = offset
+
+    def _text(self, field_offset: int) -> str:
+        start, length = _SPAN.unpack_from(self._catalog.buffer, self._offset + field_offset)
+        start += self._catalog.heap_offset
+        return str(self._catalog.buffer[start:start + length], 'utf-8')
+
+    def _flags(self) -> int:
+        return _FLAGS.unpack_from(self._catalog.buffer, self._offset + 48)[0]
+
+    @property
+    def id(self) -> int:
+        return _ID.unpack_from(self._catalog.buffer, self._offset)[0]
+
+    @property
+    def price(self) -> float:
+        return _PRICE.unpack_from(self._catalog.buffer, self._offset + 8)[0]
+
+    @property
+    def sim_count(self) -> Optional[int]:
+        if not self._flags() & HAS_SIM_COUNT:
+            return None
+        return _ID.unpack_from(self._catalog.buffer, self._offset + 16)[0]
+
+    @property
+    def name(self) -> str:
+        return self._text(24)
+
+    @property
+    def type(self) -> str:
+        return self._text(32)
+
+    @property
+    def cpu(self) -> Optional[str]:
+        return self._text(40) if self._flags() & HAS_CPU else None
+
+    def __iter__(self):
+        return (getattr(self, field) for field in FIELDS)
+
+    def _asdict(self) -> dict:
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __eq__(self, other):
+        if isinstance(other, (ProductRecord, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return 'ProductRecord(' + ', '.join(f'{k}={v!r}' for k, v in self._asdict().items()) + ')'
+
+
+class RecordSequence(SequenceABC):
+    # Записи у порядку id; view створюється лише при доступі, тож памʼять воркера не росте з каталогом
+    def __init__(self, catalog: 'MappedCatalog'):
+        self._catalog = catalog
+
+    def __len__(self):
+        return len(self._catalog.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        count = len(self)
+        if i < 0:
+            i += count
+        if not 0 <= i < count:
+            raise IndexError(i)
+        return ProductRecord(self._catalog, HEADER.size + i * RECORD.size)
+
+    def __iter__(self):
+        catalog = self._catalog
+        return (ProductRecord(catalog, HEADER.size + i * RECORD.size) for i in range(len(catalog.ids)))
+
+
+class RecordIndex(Mapping):
+    # id -> запис бінарним пошуком по колонці id прямо в буфері, без словника на воркер
+    def __init__(self, catalog: 'MappedCatalog'):
+        self._catalog = catalog
+
+    def __getitem__(self, product_id):
+        ids = self._catalog.ids
+        if isinstance(product_id, int):
+            i = bisect_left(ids, product_id)
+            if i < len(ids) and ids[i] == product_id:
+                return ProductRecord(self._catalog, HEADER.size + i * RECORD.size)
+        raise KeyError(product_id)
+
+    def __iter__(self):
+        return iter(self._catalog.ids)
+
+    def __len__(self):
+        return len(self._catalog.ids)
+
+
+class MappedCatalog:
+    def __init__(self, buffer):
+        magic, generation, count, record_size, heap_offset = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError('Unsupported catalog snapshot format')
+        self.buffer = buffer
+        self.generation = generation
+        self.heap_offset = heap_offset
+        self.size = len(buffer)
+        # Колонка id без копіювання: кожне 7-ме int64 в масиві записів
+        records = memoryview(buffer)[HEADER.size:HEADER.size + count * RECORD.size]
+        self.ids = records.cast('q')[::RECORD.size // _ID.size]
+        self.products = RecordSequence(self)
+        self.by_id = RecordIndex(self)
+
+
+class SharedGeneration:
+    # Лічильник поколінь у змапованому 8-байтовому файлі: читання без системних викликів,
+    # збільшення під flock з будь-якого процесу
+    def __init__(self, path: str):
+        self.path = path
+        self._control = None
+        self._control_file = None
+        self._lock = threading.Lock()
+
+    def _control_map(self):
+        control = self._control
+        if control is not None:
+            return control
+        with self._lock:
+            if self._control is None:
+                f = open(self.path, 'a+b')
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(f.fileno()).st_size < GENERATION.size:
+                        f.truncate(GENERATION.size)
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                self._control = mmap.mmap(f.fileno(), GENERATION.size)
+                self._control_file = f
+            return self._control
+
+    @property
+    def value(self) -> int:
+        return GENERATION.unpack_from(self._control_map(), 0)[0]
+
+    def bump(self) -> int:
+        control = self._control_map()
+        fcntl.flock(self._control_file, fcntl.LOCK_EX)
+        try:
+            generation = GENERATION.unpack_from(control, 0)[0] + 1
+            GENERATION.pack_into(control, 0, generation)
+        finally:
+            fcntl.flock(self._control_file, fcntl.LOCK_UN)
+        return generation
+
+
+class SharedSnapshotStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.control_path = path + '.gen'
+        self.lock_path = path + '.lock'
+        self.publishes = 0
+        self.maps = 0
+        self._generation = SharedGeneration(self.control_path)
+        self._mapped: Optional[MappedCatalog] = None
+
+    @property
+    def generation(self) -> int:
+        return self._generation.value
+
+    def bump(self) -> int:
+        # Викликається після commit зі зміною товарів у будь-якому процесі (воркер, імпорт)
+        return self._generation.bump()
+
+    def current(self) -> Optional[MappedCatalog]:
+        # Змапований знімок поточного покоління або None, якщо файл ще не перебудовано
+        generation = self.generation
+        mapped = self._mapped
+        if mapped is not None and mapped.generation == generation:
+            return mapped
+        mapped = self._map()
+        if mapped is None or mapped.generation != generation:
+            return None
+        return mapped
+
+    def _map(self) -> Optional[MappedCatalog]:
+        try:
+            with open(self.path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            mapped = MappedCatalog(buffer)
+        except (ValueError, struct.error):
+            return None
+        # Старий буфер не закривається явно: його ще можуть рендерити запити в процесі
+        self._mapped = mapped
+        self.maps += 1
+        catalog_snapshot_maps_total.inc()
+        return mapped
+
+    @contextmanager
+    def building(self):
+        # Один воркер перебудовує знімок, решта чекає і мапає готовий файл
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, generation: int, products: Sequence) -> MappedCatalog:
+        # Запис у тимчасовий файл і атомарна заміна: читачі бачать або старий, або новий знімок
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(encode(generation, products))
+        os.replace(tmp_path, self.path)
+        self.publishes += 1
+        catalog_snapshot_publishes_total.inc()
+        return self._map()
+
+    def stats(self) -> dict:
+        mapped = self._mapped
+        return {
+            'path': self.path,
+            'generation': self.generation,
+            'mapped_generation': mapped.generation if mapped else None,
+            'size_bytes': mapped.size if mapped else 0,
+            'products': len(mapped.products) if mapped else 0,
+            'publishes': self.publishes,
+            'maps': self.maps,
+        }
+
+
+SHARED_SNAPSHOTS = fcntl is not None
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import jinja2
+from sqlalchemy import text
+from app.models import Base, engine, ensure_columns, ensure_indexes, seed_products
+from app.metrics import Gauge, TimedTemplates
+from app.search import ensure_search_index
+from app.reports import backfill
+from app.utils import Logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: міграції без міжпроцесного lock
+    fcntl = None
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), '..', 'views', 'templates')
+TEMPLATE_CACHE_DIR = os.environ.get('TECHSTORE_TEMPLATE_CACHE',
+                                    os.path.join(tempfile.gettempdir(), 'techstore-jinja-cache'))
+
+# Профіль холодного старту: тривалість фаз і час до першого запиту.
+class StartupProfile:
+    def __init__(self, started: float = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.first_request: Optional[float] = None
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def mark_first_request(self):
+        if self.first_request is None:
+            self.first_request = time.perf_counter() - self.started
+
+    def snapshot(self) -> dict:
+        return {
+            'phases_ms': {k: round(v * 1000, 2) for k, v in self.phases.items()},
+            'first_request_ms': round(self.first_request * 1000, 2) if self.first_request is not None else None,
+        }
+
+profile = StartupProfile()
+startup_phase_seconds = Gauge('startup_phase_seconds', 'Duration of cold start phases.', ('phase',))
+Gauge('time_to_first_request_seconds', 'Seconds from app import to the first served request.',
+      function=lambda: profile.first_request if profile.first_request is not None else -1)
+
+class FirstRequestMiddleware:
+    def __init__(self, app, profile: StartupProfile = profile):
+        self.app = app
+        self.profile = profile
+        self.seen = False
+
+    async def __call__(self, scope, receive, send):
+        if not self.seen and scope['type'] == 'http':
+            self.seen = True
+            self.profile.mark_first_request()
+        await self.app(scope, receive, send)
+
+# Одне середовище Jinja2 на процес: байткод шаблонів кешується на диску між воркерами і перезапусками
+def create_templates(directory: str = TEMPLATES_DIR, cache_dir: Optional[str] = TEMPLATE_CACHE_DIR) -> TimedTemplates:
+    bytecode_cache = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(directory), autoescape=True,
+                             bytecode_cache=bytecode_cache, auto_reload=False)
+    return TimedTemplates(env=env)
+
+templates = create_templates()
+
+def precompile_templates(templates: TimedTemplates = templates) -> List[str]:
+    names = templates.env.list_templates(extensions=['html'])
+    for name in names:
+        templates.env.get_template(name)
+    return names
+
+# Міграції схеми: (версія, опис, крок). Кроки ідемпотентні, виконуються лише ті,
+# що новіші за збережену версію, тож звичайний старт робить один SELECT
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable
+
+def upgrade_tables(bind):
+    # Нові таблиці, nullable-колонки та індекси поверх уже створеної схеми
+    Base.metadata.create_all(bind=bind)
+    ensure_columns(bind)
+    ensure_indexes(bind)
+
+MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(1, 'create tables', lambda bind: Base.metadata.create_all(bind=bind)),
+    Migration(2, 'add missing columns', ensure_columns),
+    Migration(3, 'create indexes', ensure_indexes),
+    Migration(4, 'product search index', ensure_search_index),
+    Migration(5, 'seed products', seed_products),
+    Migration(6, 'product stock and reservations', upgrade_tables),
+    Migration(7, 'sales rollups', lambda bind: (upgrade_tables(bind), backfill(bind))),
+)
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+def schema_version(bind=engine) -> int:
+    with bind.connect() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")).first()
+        if not exists:
+            return 0
+        return conn.execute(text('SELECT max(version) FROM schema_version')).scalar() or 0
+
+def _set_schema_version(bind, version: int):
+    with bind.begin() as conn:
+        conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+        conn.execute(text('DELETE FROM schema_version'))
+        conn.execute(text('INSERT INTO schema_version (version) VALUES (:version)'), {'version': version})
+
+@contextmanager
+def _migration_lock(lock_path: Optional[str]):
+    # Кілька воркерів стартують одночасно: міграції виконує один, інші чекають і бачать нову версію
+    if fcntl is None or not lock_path:
+        yield
+        return
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def migrate(bind=engine, lock_path: Optional[str] = None) -> Tuple[int, int]:
+    if lock_path is None and bind.url.database:
+        lock_path = bind.url.database + '.migrate.lock'
+    current = schema_version(bind)
+    if current >= SCHEMA_VERSION:
+        return current, current
+    with _migration_lock(lock_path):
+        current = schema_version(bind)
+        start = current
+        for migration in MIGRATIONS:
+            if migration.version > current:
+                migration.apply(bind)
+                _set_schema_version(bind, migration.version)
+                current = migration.version
+                Logger().log(f"Schema migration {migration.version}: {migration.name}", source='startup')
+    return start, current
+
+def bootstrap(bind=engine, profile: StartupProfile = profile) -> dict:
+    with profile.phase('migrate'):
+        migrate(bind)
+    with profile.phase('templates'):
+        precompile_templates()
+    for phase, seconds in profile.phases.items():
+        startup_phase_seconds.set(seconds, phase=phase)
+    Logger().log("Startup profile", source='startup', **profile.snapshot())
+    return profile.snapshot()
@@ -0,0 +1,108 @@
+from typing import Callable, List
+from fastapi import Request
+from sqlalchemy import event
+from app.models import SessionLocal, AsyncSessionLocal, engine, async_engine
+
+# Ключ у execution_options, за яким SQL-події знаходять свій unit of work
+UOW_OPTION = 'unit_of_work'
+
+
+# Unit of Work: одна сесія на HTTP-запит, один commit наприкінці.
+# Усе, що не закомічено явно, відкочується при закритті.
+class UnitOfWork:
+    def __init__(self, session_factory=SessionLocal, bind=engine):
+        self.session = session_factory(bind=bind.execution_options(**{UOW_OPTION: self}))
+        self.query_count = 0
+        self.committed = False
+        self._on_commit: List[Callable] = []
+
+    def on_commit(self, callback: Callable):
+        self._on_commit.append(callback)
+
+    def _run_callbacks(self):
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
+
+    def commit(self):
+        self.session.commit()
+        self.committed = True
+        self._run_callbacks()
+
+    def rollback(self):
+        self.session.rollback()
+        self._on_commit = []
+
+    def close(self):
+        if self.session.in_transaction():
+            self.rollback()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncUnitOfWork:
+    def __init__(self, session_factory=AsyncSessionLocal, bind=async_engine):
+        self.session = session_factory(bind=bind.execution_options(**{UOW_OPTION: self}))
+        self.query_count = 0
+        self.committed = False
+        self._on_commit: List[Callable] = []
+
+    def on_commit(self, callback: Callable):
+        self._on_commit.append(callback)
+
+    async def commit(self):
+        await self.session.commit()
+        self.committed = True
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
+
+    async def rollback(self):
+        await self.session.rollback()
+        self._on_commit = []
+
+    async def run_sync(self, fn, *args, **kwargs):
+        # Синхронний код (observers, builder) з доступом до тієї ж сесії
+        return await self.session.run_sync(lambda session: fn(session, *args, **kwargs))
+
+    async def close(self):
+        if self.session.in_transaction():
+            await self.rollback()
+        await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+def get_uow(request: Request):
+    with UnitOfWork() as uow:
+        try:
+            yield uow
+        finally:
+            request.state.query_count = uow.query_count
+
+
+async def get_async_uow(request: Request):
+    async with AsyncUnitOfWork() as uow:
+        try:
+            yield uow
+        finally:
+            request.state.query_count = uow.query_count
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    uow = context.execution_options.get(UOW_OPTION) if context is not None else None
+    if uow is not None:
+        uow.query_count += 1
+
+
+event.listen(engine, 'before_cursor_execute', _count_query)
+event.listen(async_engine.sync_engine, 'before_cursor_execute', _count_query)
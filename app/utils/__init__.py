@@ -1,4 +1,11 @@
-from typing import List
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from app.metrics import Gauge, observer_call_seconds, observer_events_dropped
 
 class SingletonType(type):
     _instances = {}
@@ -7,34 +14,455 @@ class SingletonType(type):
             cls._instances[cls] = super(SingletonType, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
 
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+class RateLimit:
+    # Token bucket: не більше per_second записів на секунду з піком burst
+    def __init__(self, per_second: float, burst: int):
+        self.per_second = per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.suppressed = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.suppressed += 1
+        return False
+
+# Структурований логер: JSON-рядки, фільтр за рівнем, семплінг шумних джерел.
+# До start() пише синхронно; після start() записи йдуть через чергу у фоновий потік.
 class Logger(metaclass=SingletonType):
-    def log(self, message: str):
-        print(f"[LOG] {message}")
+    def __init__(self, level: str = 'INFO', maxsize: int = 10000, stream=None):
+        self.level = LEVELS[level]
+        self.stream = stream
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._limits: Dict[str, RateLimit] = {}
+        self._limits_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def set_level(self, level: str):
+        self.level = LEVELS[level]
+
+    def set_rate_limit(self, source: str, per_second: float, burst: int = None):
+        with self._limits_lock:
+            self._limits[source] = RateLimit(per_second, burst or max(1, int(per_second)))
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+    def _sample(self, source: str, record: dict) -> bool:
+        limit = self._limits.get(source)
+        if limit is None:
+            return True
+        with self._limits_lock:
+            if not limit.allow():
+                return False
+            if limit.suppressed:
+                record['suppressed'] = limit.suppressed
+                limit.suppressed = 0
+        return True
+
+    def log(self, message: str, level: str = 'INFO', source: str = 'app', **fields):
+        if LEVELS[level] < self.level:
+            return
+        record = {'ts': round(time.time(), 6), 'level': level, 'source': source, 'message': message}
+        if not self._sample(source, record):
+            return
+        if fields:
+            record.update(fields)
+        if self._thread is None:
+            self._write([record])
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, records: List[dict]):
+        lines = ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records)
+        # sys.stdout береться в момент запису, щоб працювало перенаправлення виводу
+        stream = self.stream or sys.stdout
+        with self._write_lock:
+            stream.write(lines)
+            stream.flush()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            batch = [record]
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            records = [r for r in batch if r is not None]
+            try:
+                if records:
+                    self._write(records)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='logger-writer', daemon=True)
+        self._thread.start()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        self._thread = None
+
+class LoggerHandler(logging.Handler):
+    # Міст зі стандартного logging (наприклад, SQLAlchemy echo) у Logger
+    def __init__(self, source: str):
+        super().__init__()
+        self.source = source
+
+    def emit(self, record: logging.LogRecord):
+        level = record.levelname if record.levelname in LEVELS else 'INFO'
+        logger = Logger()
+        if logger.enabled(level):
+            logger.log(record.getMessage(), level=level, source=self.source)
+
+def route_sql_logging(level: str = 'INFO', per_second: float = 20, burst: int = 50):
+    Logger().set_rate_limit('sql', per_second, burst)
+    sql_logger = logging.getLogger('sqlalchemy.engine')
+    if not any(isinstance(h, LoggerHandler) for h in sql_logger.handlers):
+        sql_logger.addHandler(LoggerHandler('sql'))
+    sql_logger.setLevel(LEVELS[level])
+    sql_logger.propagate = False
 
 class OrderObserver:
     def update(self, order):
         pass
 
+    def update_many(self, orders):
+        for order in orders:
+            self.update(order)
+
 class EmailNotifier(OrderObserver):
     def update(self, order):
         Logger().log(f"Email: Статус замовлення {order.id} змінено на {order.status}")
         # Тут можна додати реальне надсилання email
 
+    def update_many(self, orders):
+        Logger().log(f"Email: створено {len(orders)} замовлень: {', '.join(str(o.id) for o in orders)}")
+
 class SMSNotifier(OrderObserver):
     def update(self, order):
         Logger().log(f"SMS: Статус замовлення {order.id} змінено на {order.status}")
         # Тут можна додати реальне надсилання SMS
 
-class OrderSubject:
+    def update_many(self, orders):
+        Logger().log(f"SMS: створено {len(orders)} замовлень: {', '.join(str(o.id) for o in orders)}")
+
+class OrderEvent(NamedTuple):
+    id: int
+    user_id: Optional[int]
+    product_id: Optional[int]
+    status: str
+
+    @classmethod
+    def from_order(cls, order) -> 'OrderEvent':
+        return cls(order.id, getattr(order, 'user_id', None), getattr(order, 'product_id', None), order.status)
+
+class ObserverStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.dropped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, latency: float, error: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'dropped': self.dropped,
+                'latency_avg': self.latency_total / self.calls if self.calls else 0.0,
+                'latency_max': self.latency_max,
+            }
+
+def observer_name(observer) -> str:
+    return type(observer).__name__
+
+class SyncDispatcher:
+    synchronous = True
+
     def __init__(self):
-        self._observers: List[OrderObserver] = []
+        self.stats: Dict[str, ObserverStats] = {}
+
+    def _stats(self, observer) -> ObserverStats:
+        name = observer_name(observer)
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats.setdefault(name, ObserverStats())
+        return stats
+
+    def submit(self, observer, method: str, payload, key=None) -> bool:
+        stats = self._stats(observer)
+        start = time.perf_counter()
+        try:
+            getattr(observer, method)(payload)
+        except Exception:
+            latency = time.perf_counter() - start
+            stats.record(latency, error=True)
+            observer_call_seconds.observe(latency, observer=observer_name(observer), outcome='error')
+            raise
+        latency = time.perf_counter() - start
+        stats.record(latency)
+        observer_call_seconds.observe(latency, observer=observer_name(observer), outcome='ok')
+        return True
+
+    def submit_many(self, observer, method: str, payloads: list, keys: list) -> bool:
+        # Синхронно весь пакет — один виклик
+        return self.submit(observer, method, payloads)
 
-    def attach(self, observer: OrderObserver):
-        self._observers.append(observer)
+    def metrics(self) -> dict:
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+    def start(self):
+        pass
+
+    def shutdown(self, timeout: float = 5.0):
+        pass
+
+# Окрема "смуга" потоків для кожного типу спостерігача: повільний або
+# зламаний observer заповнює лише власні черги
+class _ObserverLane:
+    def __init__(self, name: str, workers: int, maxsize: int, block: bool, stats: ObserverStats):
+        self.name = name
+        self.block = block
+        self.stats = stats
+        self.queues = [queue.Queue(maxsize=maxsize) for _ in range(workers)]
+        self.threads = [threading.Thread(target=self._run, args=(q,), name=f'observer-{name}-{i}', daemon=True)
+                        for i, q in enumerate(self.queues)]
+        for thread in self.threads:
+            thread.start()
+
+    def _queue(self, key) -> queue.Queue:
+        # Один ключ (id замовлення) завжди потрапляє в ту саму чергу -> порядок зберігається
+        return self.queues[hash(key) % len(self.queues)]
+
+    def _put(self, q: queue.Queue, task, events: int) -> bool:
+        try:
+            if self.block:
+                q.put(task)
+            else:
+                q.put_nowait(task)
+            return True
+        except queue.Full:
+            self.stats.record_drop()
+            observer_events_dropped.inc(events, observer=self.name)
+            return False
+
+    def put(self, task, key) -> bool:
+        return self._put(self._queue(key), task, 1)
+
+    def put_many(self, observer, method: str, payloads: list, keys: list) -> bool:
+        # Пакет ділиться за чергами своїх замовлень: кожна черга отримує один виклик зі своєю частиною,
+        # тож події одного замовлення з notify і notify_many не обганяють одна одну
+        groups: Dict[int, Tuple[queue.Queue, list]] = {}
+        for payload, key in zip(payloads, keys):
+            q = self._queue(key)
+            groups.setdefault(id(q), (q, []))[1].append(payload)
+        delivered = True
+        for q, part in groups.values():
+            delivered = self._put(q, (observer, method, part), len(part)) and delivered
+        return delivered
+
+    def _run(self, q: queue.Queue):
+        while True:
+            task = q.get()
+            try:
+                if task is None:
+                    return
+                observer, method, payload = task
+                start = time.perf_counter()
+                try:
+                    getattr(observer, method)(payload)
+                except Exception as e:
+                    latency = time.perf_counter() - start
+                    self.stats.record(latency, error=True)
+                    observer_call_seconds.observe(latency, observer=self.name, outcome='error')
+                    Logger().log(f"Observer {self.name} failed: {e}", level='ERROR', source='observer')
+                else:
+                    latency = time.perf_counter() - start
+                    self.stats.record(latency)
+                    observer_call_seconds.observe(latency, observer=self.name, outcome='ok')
+            finally:
+                q.task_done()
+
+    def pending(self) -> int:
+        return sum(q.unfinished_tasks for q in self.queues)
+
+    def stop(self, timeout: float):
+        for q in self.queues:
+            q.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+
+class ThreadPoolDispatcher(SyncDispatcher):
+    synchronous = False
+
+    def __init__(self, workers_per_observer: int = 2, maxsize: int = 1000, block: bool = False):
+        super().__init__()
+        self.workers_per_observer = workers_per_observer
+        self.maxsize = maxsize
+        self.block = block
+        self._lanes: Dict[str, _ObserverLane] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _lane(self, observer) -> Optional[_ObserverLane]:
+        name = observer_name(observer)
+        lane = self._lanes.get(name)
+        if lane is None:
+            with self._lock:
+                if self._closed:
+                    return None
+                lane = self._lanes.get(name)
+                if lane is None:
+                    lane = _ObserverLane(name, self.workers_per_observer, self.maxsize, self.block,
+                                         self._stats(observer))
+                    self._lanes[name] = lane
+        return lane
+
+    def submit(self, observer, method: str, payload, key=None) -> bool:
+        lane = self._lane(observer)
+        if lane is None:
+            self._stats(observer).record_drop()
+            observer_events_dropped.inc(observer=observer_name(observer))
+            return False
+        return lane.put((observer, method, payload), key)
+
+    def submit_many(self, observer, method: str, payloads: list, keys: list) -> bool:
+        lane = self._lane(observer)
+        if lane is None:
+            self._stats(observer).record_drop()
+            observer_events_dropped.inc(len(payloads), observer=observer_name(observer))
+            return False
+        return lane.put_many(observer, method, payloads, keys)
+
+    def pending(self) -> int:
+        return sum(lane.pending() for lane in list(self._lanes.values()))
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def start(self):
+        with self._lock:
+            self._closed = False
+
+    def shutdown(self, timeout: float = 5.0):
+        # Нові події більше не приймаються; вже поставлені в чергу доставляються
+        with self._lock:
+            self._closed = True
+            lanes, self._lanes = list(self._lanes.values()), {}
+        deadline = time.monotonic() + timeout
+        for lane in lanes:
+            lane.stop(max(0.0, deadline - time.monotonic()))
+
+observer_dispatcher = ThreadPoolDispatcher()
+Gauge('observer_queue_depth', 'Order events waiting in observer queues.', function=observer_dispatcher.pending)
+# Спостерігачі, від яких залежить коректність (SSE, кеш сторінок), викликаються в потоці notify
+inline_dispatcher = SyncDispatcher()
+
+# Синхронні слухачі збережених змін замовлень (кеш сторінок). Код, що комітить статус,
+# викликає publish одразу після commit, незалежно від спостерігачів і їхніх черг
+class OrderChanges:
+    def __init__(self):
+        self._listeners: List[Callable[[List[int]], None]] = []
+
+    def add_listener(self, listener: Callable[[List[int]], None]):
+        self._listeners.append(listener)
+
+    def publish(self, order_ids: Iterable[int]):
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        for listener in self._listeners:
+            listener(order_ids)
+
+order_changes = OrderChanges()
+
+class OrderSubject:
+    def __init__(self, dispatcher: SyncDispatcher = None):
+        self._observers: List[Tuple[OrderObserver, SyncDispatcher]] = []
+        self._dispatcher = dispatcher or SyncDispatcher()
+
+    def attach(self, observer: OrderObserver, dispatcher: SyncDispatcher = None):
+        # Власний диспетчер для спостерігача, якому не можна губити події (напр. синхронний)
+        self._observers.append((observer, dispatcher or self._dispatcher))
 
     def detach(self, observer: OrderObserver):
-        self._observers.remove(observer)
+        for i, (attached, _) in enumerate(self._observers):
+            if attached == observer:
+                del self._observers[i]
+                return
+        raise ValueError(f'{observer_name(observer)} is not attached')
 
     def notify(self, order):
-        for observer in self._observers:
-            observer.update(order)
+        # Асинхронні спостерігачі отримують незмінний знімок, а не ORM-обʼєкт
+        event = None
+        for observer, dispatcher in self._observers:
+            if dispatcher.synchronous:
+                payload = order
+            else:
+                payload = event = event or OrderEvent.from_order(order)
+            dispatcher.submit(observer, 'update', payload, key=order.id)
+
+    def notify_many(self, orders):
+        # Одне сповіщення на пакет замовлень
+        if not orders:
+            return
+        events = None
+        keys = [o.id for o in orders]
+        for observer, dispatcher in self._observers:
+            if dispatcher.synchronous:
+                payload = orders
+            else:
+                payload = events = events or [OrderEvent.from_order(o) for o in orders]
+            dispatcher.submit_many(observer, 'update_many', payload, keys)
@@ -0,0 +1,142 @@
+# Пропускна здатність логіну за різної вартості KDF: CredentialService.authenticate на тимчасовій БД.
+# Окрім logins/s і латентності міряється затримка event loop — перевірка, що KDF не блокує обробники.
+#   python benchmarks/bench_login.py --kdf scrypt --costs 16384,32768 --workers 4 --concurrency 32
+#   python benchmarks/bench_login.py --kdf pbkdf2_sha256 --costs 100000,600000 --inline   (KDF в event loop)
+#   python benchmarks/bench_login.py --cache   (повторні логіни з кешу перевірених паролів)
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def install(workdir: str):
+    # Змінні середовища читаються при імпорті app.models
+    os.environ['TECHSTORE_DB_PATH'] = os.path.join(workdir, 'bench.db')
+    from app.models import Base, engine
+    Base.metadata.create_all(engine)
+
+
+def make_service(kdf: str, cost: int, workers: int, inline: bool, cache: bool):
+    from app.credentials import CredentialService, KDFPool, PasswordHasher, VerifiedLoginCache
+
+    class InlinePool(KDFPool):
+        async def run_async(self, fn, *args):
+            return fn(*args)
+
+    hasher = PasswordHasher(kdf, scrypt_n=cost, pbkdf2_iterations=cost)
+    pool = InlinePool(workers) if inline else KDFPool(workers)
+    return CredentialService(hasher, pool, VerifiedLoginCache(ttl=300 if cache else 0))
+
+
+def seed_users(service, prefix: str, count: int) -> List[str]:
+    from app.models import SessionLocal, User
+    emails = [f'{prefix}-{i}@example.com' for i in range(count)]
+    hashes = service.hash_passwords(['bench-password'] * count)
+    db = SessionLocal()
+    db.add_all(User(email=email, password=password_hash, name='Bench') for email, password_hash in zip(emails, hashes))
+    db.commit()
+    db.close()
+    return emails
+
+
+async def loop_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.005):
+    # Наскільки пізніше заплановано прокидається таймер: блокування loop видно одразу
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run_cost(args, cost: int) -> dict:
+    from app.uow import AsyncUnitOfWork
+    service = make_service(args.kdf, cost, args.workers, args.inline, args.cache)
+    emails = seed_users(service, f'{args.kdf}-{cost}', args.users)
+    latencies: List[float] = []
+    failures = 0
+    remaining = iter(range(args.logins))
+
+    async def worker():
+        nonlocal failures
+        for _ in remaining:
+            email = random.choice(emails)
+            start = time.perf_counter()
+            async with AsyncUnitOfWork() as uow:
+                user = await service.authenticate(uow, email, 'bench-password')
+            latencies.append(time.perf_counter() - start)
+            if user is None:
+                failures += 1
+
+    stop, lag = asyncio.Event(), []
+    ticker = asyncio.create_task(loop_lag(stop, lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    service.pool.shutdown()
+    ordered, lag = sorted(latencies), sorted(lag)
+
+    def percentile(values, p):
+        return round(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] * 1000, 2) if values else None
+
+    return {
+        'cost': cost,
+        'logins': len(ordered),
+        'failures': failures,
+        'logins_per_sec': round(len(ordered) / elapsed, 1),
+        'p50_ms': percentile(ordered, 50),
+        'p95_ms': percentile(ordered, 95),
+        'loop_lag_p99_ms': percentile(lag, 99),
+        'loop_lag_max_ms': round(lag[-1] * 1000, 2) if lag else None,
+        'cache': service.cache.stats(),
+    }
+
+
+async def run_benchmark(args) -> dict:
+    install(tempfile.mkdtemp(prefix='bench-login-'))
+    from app.utils import Logger
+    Logger().set_level('WARNING')
+    results = [await run_cost(args, int(cost)) for cost in args.costs.split(',')]
+    return {
+        'meta': {'kdf': args.kdf, 'workers': args.workers, 'concurrency': args.concurrency,
+                 'inline': args.inline, 'cache': args.cache, 'users': args.users},
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login throughput at configurable KDF costs')
+    parser.add_argument('--kdf', default='scrypt', choices=('scrypt', 'pbkdf2_sha256'))
+    parser.add_argument('--costs', default=None, help='comma-separated scrypt N or PBKDF2 iterations')
+    parser.add_argument('--workers', type=int, default=4, help='KDF pool threads')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent logins on the event loop')
+    parser.add_argument('--logins', type=int, default=200, help='logins per cost')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--inline', action='store_true', help='run the KDF on the event loop (no pool)')
+    parser.add_argument('--cache', action='store_true', help='enable the verified-login cache')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    if args.costs is None:
+        args.costs = '16384,32768' if args.kdf == 'scrypt' else '100000,600000'
+    result = asyncio.run(run_benchmark(args))
+    meta = result['meta']
+    print(f"kdf={meta['kdf']} workers={meta['workers']} concurrency={meta['concurrency']} "
+          f"inline={meta['inline']} cache={meta['cache']}")
+    print(f"{'cost':>8} {'logins':>7} {'fail':>5} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'lag p99':>8} {'lag max':>8} {'hits':>6}")
+    for r in result['results']:
+        print(f"{r['cost']:>8} {r['logins']:>7} {r['failures']:>5} {r['logins_per_sec']:>9} {r['p50_ms']:>8} "
+              f"{r['p95_ms']:>8} {r['loop_lag_p99_ms']:>8} {r['loop_lag_max_ms']:>8} {r['cache']['hits']:>6}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Конкурентний бенчмарк запису замовлень: профілі SQLite та group commit.
+#   python benchmarks/bench_orders.py --threads 16 --orders 200
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Product, User, apply_storage_profile
+from app.builder import GroupCommitWriter, OrderBuilder
+from app.utils import Logger
+import app.builder as builder_module
+
+
+def run(profile: str, group_commit: bool, threads: int, orders_per_thread: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-orders-'), 'bench.db')
+    # Короткий timeout драйвера показує "database is locked" без профілю; tuned задає власний busy_timeout
+    engine = create_engine(f'sqlite:///{path}', connect_args={'timeout': 0.1})
+    apply_storage_profile(engine, profile)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    db = session_factory(expire_on_commit=False)
+    user = User(email='bench@test.com', password='1', name='Bench')
+    product = Product.create_product('phone', name='BenchPhone', price=1, sim_count=1)
+    db.add_all([user, product])
+    db.commit()
+    db.close()
+
+    previous_factory = builder_module.SessionLocal
+    builder_module.SessionLocal = session_factory
+    OrderBuilder.group_commit = GroupCommitWriter(session_factory) if group_commit else None
+    errors = []
+
+    def worker():
+        for _ in range(orders_per_thread):
+            try:
+                OrderBuilder().create_order(user, product).save()
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    writer = OrderBuilder.group_commit
+    if writer is not None:
+        writer.stop()
+    OrderBuilder.group_commit = None
+    builder_module.SessionLocal = previous_factory
+    engine.dispose()
+    saved = threads * orders_per_thread - len(errors)
+    return {
+        'profile': profile,
+        'group_commit': group_commit,
+        'threads': threads,
+        'orders': saved,
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'orders_per_sec': round(saved / elapsed, 1),
+        'batches': writer.batches if writer else saved,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent order write benchmark')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=100, help='orders per thread')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    Logger().set_level('WARNING')
+    results = [run(profile, group_commit, args.threads, args.orders)
+               for profile, group_commit in (('default', False), ('tuned', False), ('tuned', True))]
+    print(f"{'profile':<8} {'group':<6} {'orders':>7} {'errors':>7} {'batches':>8} {'orders/s':>10}")
+    for r in results:
+        print(f"{r['profile']:<8} {str(r['group_commit']):<6} {r['orders']:>7} {r['errors']:>7} "
+              f"{r['batches']:>8} {r['orders_per_sec']:>10}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
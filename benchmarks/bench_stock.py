@@ -0,0 +1,110 @@
+# Флеш-розпродаж: конкурентні покупці одного товару з обмеженим залишком.
+# Перевіряє, що продано рівно min(залишок, спроби) одиниць і залишок не став відʼємним.
+#   python benchmarks/bench_stock.py --buyers 32 --attempts 50 --stock 500
+#   python benchmarks/bench_stock.py --buyers 32 --stock 500 --shards 8 --group-commit
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def install(workdir: str):
+    # Змінні середовища читаються при імпорті app.models
+    os.environ['TECHSTORE_DB_PATH'] = os.path.join(workdir, 'bench.db')
+    from app.models import Base, engine
+    Base.metadata.create_all(engine)
+
+
+def run(args) -> dict:
+    install(tempfile.mkdtemp(prefix='bench-stock-'))
+    from app.models import Order, Product, SessionLocal, User
+    from app.builder import GroupCommitWriter, OrderBuilder
+    from app.inventory import OutOfStock, inventory, stock_reservations_total
+    from app.utils import Logger
+    Logger().set_level('WARNING')
+
+    db = SessionLocal(expire_on_commit=False)
+    user = User(email='buyer@example.com', password='1', name='Buyer')
+    product = Product.create_product('phone', name='FlashPhone', price=1, sim_count=1)
+    db.add_all([user, product])
+    db.commit()
+    db.close()
+    inventory.set_stock(product.id, args.stock, shards=args.shards)
+    OrderBuilder.group_commit = GroupCommitWriter() if args.group_commit else None
+
+    sold, rejected, errors = [0], [0], []
+    lock = threading.Lock()
+
+    def buyer():
+        for _ in range(args.attempts):
+            try:
+                OrderBuilder().create_order(user, product).save()
+                outcome = sold
+            except OutOfStock:
+                outcome = rejected
+            except Exception as e:
+                errors.append(type(e).__name__)
+                continue
+            with lock:
+                outcome[0] += 1
+
+    threads = [threading.Thread(target=buyer) for _ in range(args.buyers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if OrderBuilder.group_commit is not None:
+        OrderBuilder.group_commit.stop()
+        OrderBuilder.group_commit = None
+
+    db = SessionLocal()
+    orders = db.query(Order).filter_by(product_id=product.id).count()
+    db.close()
+    remaining = inventory.stock_level(product.id)
+    attempts = args.buyers * args.attempts
+    return {
+        'buyers': args.buyers,
+        'attempts': attempts,
+        'stock': args.stock,
+        'shards': args.shards,
+        'group_commit': args.group_commit,
+        'sold': sold[0],
+        'rejected': rejected[0],
+        'short_circuited': int(stock_reservations_total.value(outcome='short_circuit')),
+        'errors': len(errors),
+        'orders_in_db': orders,
+        'remaining_stock': remaining,
+        'oversold': max(0, orders - args.stock),
+        'attempts_per_sec': round(attempts / elapsed, 1),
+        'elapsed': round(elapsed, 3),
+        'consistent': orders == sold[0] == min(args.stock, attempts) and remaining == args.stock - orders,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent buyers against limited stock')
+    parser.add_argument('--buyers', type=int, default=16, help='concurrent buyer threads')
+    parser.add_argument('--attempts', type=int, default=50, help='orders attempted per buyer')
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--shards', type=int, default=1, help='stock shards for the hot product')
+    parser.add_argument('--group-commit', action='store_true', help='batch concurrent orders with GroupCommitWriter')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    result = run(args)
+    for key, value in result.items():
+        print(f'{key:<18} {value}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    if not result['consistent'] or result['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
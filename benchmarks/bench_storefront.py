@@ -0,0 +1,265 @@
+# Навантажувальний бенчмарк сценарію register -> login -> /products -> /order -> /order_success.
+# За замовчуванням застосунок запускається в процесі (httpx ASGITransport) на тимчасовій БД,
+# SMTP і DNS-перевірка email замінені заглушками.
+#   python benchmarks/bench_storefront.py --concurrency 16 --duration 20 --json results.json
+#   python benchmarks/bench_storefront.py --duration 20 --compare results.json --threshold 15
+#   python benchmarks/bench_storefront.py --url http://127.0.0.1:8000   (запущений uvicorn)
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import httpx
+
+ROUTES = ('POST /register', 'POST /login', 'GET /products', 'POST /order', 'GET /order_success/{id}')
+PRODUCT_OPTION = re.compile(r'<option value="(\d+)"')
+
+# Лічильник SQL-запитів поточного HTTP-запиту. ASGITransport виконує застосунок у задачі клієнта,
+# а threadpool FastAPI копіює контекст, тож listener бачить лічильник саме цього запиту
+_queries: contextvars.ContextVar = contextvars.ContextVar('bench_queries', default=None)
+
+
+class NullSMTP:
+    sent = 0
+
+    def __init__(self, host=None, port=None, timeout=None):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def sendmail(self, sender, recipients, message):
+        NullSMTP.sent += 1
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.queries: List[int] = []
+        self.errors = 0
+        self.shed = 0
+
+    def summary(self, elapsed: float) -> dict:
+        ordered = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 2)
+
+        return {
+            'requests': len(ordered),
+            'errors': self.errors,
+            'shed': self.shed,
+            'rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': percentile(50),
+            'p95_ms': percentile(95),
+            'p99_ms': percentile(99),
+            'sql_per_request': round(sum(self.queries) / len(self.queries), 2) if self.queries else None,
+        }
+
+
+class Runner:
+    def __init__(self, make_client, count_queries: bool):
+        self.make_client = make_client
+        self.count_queries = count_queries
+        self.stats: Dict[str, RouteStats] = {route: RouteStats() for route in ROUTES}
+        self.flows = 0
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str,
+                      expect: int, **kwargs) -> Optional[httpx.Response]:
+        counter = [0]
+        token = _queries.set(counter) if self.count_queries else None
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        finally:
+            elapsed = time.perf_counter() - start
+            if token is not None:
+                _queries.reset(token)
+        stats = self.stats[route]
+        if response is not None and response.status_code in (429, 503) and 'retry-after' in response.headers:
+            # Відхилено admission control: клієнт чекає Retry-After, а не повторює одразу
+            stats.shed += 1
+            await asyncio.sleep(float(response.headers['retry-after']))
+            return None
+        if response is None or response.status_code != expect:
+            stats.errors += 1
+            return None
+        stats.latencies.append(elapsed)
+        if self.count_queries:
+            stats.queries.append(counter[0])
+        return response
+
+    async def flow(self, client: httpx.AsyncClient) -> bool:
+        email = f'bench-{uuid.uuid4().hex[:16]}@example.com'
+        form = {'email': email, 'password': 'bench-password', 'name': 'Bench'}
+        if not await self.request(client, 'POST /register', 'POST', '/register', 302, data=form):
+            return False
+        if not await self.request(client, 'POST /login', 'POST', '/login', 302,
+                                  data={'email': email, 'password': form['password']}):
+            return False
+        page = await self.request(client, 'GET /products', 'GET', '/products', 200)
+        product_ids = PRODUCT_OPTION.findall(page.text) if page else []
+        if not product_ids:
+            return False
+        order = await self.request(client, 'POST /order', 'POST', '/order', 302,
+                                   data={'product_id': random.choice(product_ids)})
+        location = order.headers.get('location', '') if order else ''
+        if not location.startswith('/order_success/'):
+            return False
+        return await self.request(client, 'GET /order_success/{id}', 'GET', location, 200) is not None
+
+    async def worker(self, deadline: float):
+        while time.monotonic() < deadline:
+            # Новий клієнт (і cookie jar) на кожного віртуального користувача
+            async with self.make_client() as client:
+                if await self.flow(client):
+                    self.flows += 1
+
+    async def run(self, concurrency: int, duration: float) -> float:
+        start = time.monotonic()
+        await asyncio.gather(*(self.worker(start + duration) for _ in range(concurrency)))
+        return time.monotonic() - start
+
+
+def install_in_process(workdir: str):
+    # Змінні середовища читаються при імпорті app.models / app.sessions
+    os.environ['TECHSTORE_DB_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['TECHSTORE_SESSIONS_DB_PATH'] = os.path.join(workdir, 'sessions.db')
+    from sqlalchemy import event
+    from app.main import app
+    from app.models import engine, async_engine
+    from app.mail import mail_queue
+    from app.facade import deliverability_cache
+    from app.admission import admission
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter = _queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+    event.listen(engine, 'before_cursor_execute', count)
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', count)
+    mail_queue.smtp_class = NullSMTP
+    deliverability_cache.resolver = lambda domain, domain_i18n: {}
+    # Усі віртуальні користувачі приходять з однієї адреси: ліміт частоти вимкнено, пули лишаються
+    admission.rate_limit = False
+    return app
+
+
+async def run_benchmark(args) -> dict:
+    if args.url:
+        runner = Runner(lambda: httpx.AsyncClient(base_url=args.url, timeout=args.timeout), count_queries=False)
+        elapsed = await runner.run(args.concurrency, args.duration)
+        mode = 'http'
+    else:
+        workdir = tempfile.mkdtemp(prefix='bench-storefront-')
+        app = install_in_process(workdir)
+        from app.utils import Logger
+        transport = httpx.ASGITransport(app=app)
+        runner = Runner(lambda: httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=args.timeout),
+                        count_queries=True)
+        async with app.router.lifespan_context(app):
+            Logger().set_level(args.log_level)
+            elapsed = await runner.run(args.concurrency, args.duration)
+        mode = 'asgi'
+    return {
+        'meta': {
+            'mode': mode,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'elapsed': round(elapsed, 3),
+            'commit': git_commit(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'flows': runner.flows,
+        'flows_per_sec': round(runner.flows / elapsed, 2) if elapsed else 0.0,
+        'emails_sent': NullSMTP.sent if mode == 'asgi' else None,
+        'routes': {route: stats.summary(elapsed) for route, stats in runner.stats.items()},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(result: dict):
+    meta = result['meta']
+    print(f"mode={meta['mode']} concurrency={meta['concurrency']} elapsed={meta['elapsed']}s "
+          f"flows={result['flows']} flows/s={result['flows_per_sec']}")
+    print(f"{'route':<26} {'reqs':>6} {'err':>5} {'shed':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql/req':>8}")
+    for route, r in result['routes'].items():
+        print(f"{route:<26} {r['requests']:>6} {r['errors']:>5} {r.get('shed', 0):>5} {r['rps']:>8} {str(r['p50_ms']):>8} "
+              f"{str(r['p95_ms']):>8} {str(r['p99_ms']):>8} {str(r['sql_per_request']):>8}")
+
+
+def compare(baseline: dict, result: dict, threshold: float) -> List[str]:
+    # Регресія: p95 зріс або rps впав більше ніж на threshold відсотків
+    regressions = []
+    print(f"\n{'route':<26} {'p95 base':>9} {'p95 now':>9} {'Δ%':>7} {'rps base':>9} {'rps now':>9} {'Δ%':>7}")
+    for route, now in result['routes'].items():
+        base = baseline.get('routes', {}).get(route)
+        if not base or not base.get('p95_ms') or not now.get('p95_ms') or not base.get('rps'):
+            continue
+        p95_delta = (now['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100
+        rps_delta = (now['rps'] - base['rps']) / base['rps'] * 100
+        print(f"{route:<26} {base['p95_ms']:>9} {now['p95_ms']:>9} {p95_delta:>7.1f} "
+              f"{base['rps']:>9} {now['rps']:>9} {rps_delta:>7.1f}")
+        if p95_delta > threshold:
+            regressions.append(f'{route}: p95 +{p95_delta:.1f}%')
+        if -rps_delta > threshold:
+            regressions.append(f'{route}: rps {rps_delta:.1f}%')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Storefront end-to-end load benchmark')
+    parser.add_argument('--concurrency', type=int, default=8, help='virtual users running the flow in parallel')
+    parser.add_argument('--duration', type=float, default=10, help='seconds')
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--log-level', default='WARNING', help='application Logger level during the run')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline JSON from a previous run')
+    parser.add_argument('--threshold', type=float, default=20, help='allowed regression, percent')
+    args = parser.parse_args()
+    result = asyncio.run(run_benchmark(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.threshold)
+        if regressions:
+            print('\nRegressions:\n  ' + '\n  '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.admission import (AdmissionController, AdmissionMiddleware, CapacityPool, PoolLimits, Rejected, TokenBuckets,
+                           admission_queue_seconds, admission_rejections_total)
+from app.sessions import MemoryBackend, Principal, SessionStore
+
+
+def make_app(controller: AdmissionController, gate: asyncio.Event):
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    @app.get('/items')
+    async def items():
+        return {'ok': True}
+
+    @app.post('/order')
+    async def order():
+        await gate.wait()
+        return {'ok': True}
+
+    return app
+
+
+def test_pool_hands_off_slots_and_bounds_queue():
+    async def scenario():
+        pool = CapacityPool('test', PoolLimits(concurrency=1, queue_size=1, queue_timeout=1.0))
+        assert await pool.acquire() == 0.0
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0.01)
+        with pytest.raises(Rejected) as e:
+            await pool.acquire()
+        assert (e.value.status, e.value.reason) == (503, 'queue_full')
+        pool.release()
+        assert await waiter > 0
+        assert pool.stats() == {'active': 1, 'queued': 0, 'limit': 1}
+        pool.release()
+        assert pool.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_returns_503_with_retry_after():
+    async def scenario():
+        gate = asyncio.Event()
+        controller = AdmissionController(
+            pools={'read': PoolLimits(4, 4, 1.0), 'write': PoolLimits(4, 4, 1.0)},
+            routes={('POST', '/order'): PoolLimits(concurrency=1, queue_size=1, queue_timeout=0.05)})
+        app = make_app(controller, gate)
+        before = admission_rejections_total.value(pool='write', reason='queue_timeout')
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            holder = asyncio.ensure_future(client.post('/order'))
+            await asyncio.sleep(0.05)
+            response = await client.post('/order')
+            assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+            # Пул запису зайнятий, але читання має окремий пул
+            assert (await client.get('/items')).status_code == 200
+            gate.set()
+            assert (await holder).status_code == 200
+        assert admission_rejections_total.value(pool='write', reason='queue_timeout') == before + 1
+        assert controller.stats()['write']['active'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_rate_limit_per_client():
+    async def scenario():
+        gate = asyncio.Event()
+        gate.set()
+        backend = MemoryBackend()
+        sessions = SessionStore(backend)
+        token = sessions.create(Principal(1, 'Buyer', 'buyer@test.com'))
+        # Сесія іншого воркера: є в backend, але не в локальному кеші
+        remote = SessionStore(backend).create(Principal(2, 'Remote', 'remote@test.com'))
+        controller = AdmissionController(
+            pools={'read': PoolLimits(4, 4, 1.0), 'write': PoolLimits(4, 4, 1.0, rate=0.5, burst=2)}, routes={},
+            sessions=sessions)
+        app = make_app(controller, gate)
+        observed = admission_queue_seconds.count(pool='write')
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            statuses = [(await client.post('/order')).status_code for _ in range(3)]
+            assert statuses == [200, 200, 429]
+            limited = await client.post('/order')
+            assert limited.status_code == 429 and int(limited.headers['Retry-After']) >= 1
+            # Вигаданий токен не обходить ліміт адреси
+            client.cookies.set('session_token', 'forged')
+            assert (await client.post('/order')).status_code == 429
+            # Admission не читає backend в event loop: поки сесію не закешував обробник, ключ — IP
+            client.cookies.set('session_token', remote)
+            assert (await client.post('/order')).status_code == 429
+            assert sessions.stats()['misses'] == 0
+            sessions.get(remote)
+            assert (await client.post('/order')).status_code == 200
+            # Дійсна сесія — окремий bucket, навіть з тієї ж адреси; читання не обмежуються
+            client.cookies.set('session_token', token)
+            assert (await client.post('/order')).status_code == 200
+            assert [(await client.get('/items')).status_code for _ in range(5)] == [200] * 5
+        assert admission_queue_seconds.count(pool='write') == observed + 4
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_evicts_idle_clients():
+    buckets = TokenBuckets(rate=1.0, burst=1, maxsize=2)
+    assert buckets.take('a') == 0 and buckets.take('a') > 0
+    buckets.take('b')
+    buckets.take('c')
+    # 'a' витіснено, тож повертається з повним bucket
+    assert buckets.take('a') == 0
@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.orm import with_polymorphic
+from app.models import Product, Phone, Computer, User, Order, SessionLocal, AsyncSessionLocal
+from app.builder import OrderBuilder
+
+
+def test_order_builder_save_async():
+    db = SessionLocal()
+    user = User(email='async@test.com', password='1', name='Async')
+    product = Product.create_product('phone', name='AsyncPhone', price=10, sim_count=1)
+    db.add_all([user, product])
+    db.commit()
+    order = asyncio.run(OrderBuilder().create_order(user, product).set_status('paid').save_async())
+    assert order.id is not None
+    assert order.status == 'paid'
+    saved = db.get(Order, order.id)
+    assert saved.user_id == user.id
+    db.delete(saved)
+    db.delete(product)
+    db.delete(user)
+    db.commit()
+    db.close()
+
+
+def test_async_session_polymorphic_load():
+    db = SessionLocal()
+    phone = Product.create_product('phone', name='AsyncPolyPhone', price=1, sim_count=3)
+    computer = Product.create_product('computer', name='AsyncPolyPC', price=2, cpu='M3')
+    db.add_all([phone, computer])
+    db.commit()
+
+    async def load():
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(with_polymorphic(Product, '*')).where(Product.id.in_([phone.id, computer.id])))
+            return {p.name: p for p in result.scalars().all()}
+
+    products = asyncio.run(load())
+    # Атрибути підкласів завантажені без lazy load
+    assert isinstance(products['AsyncPolyPhone'], Phone)
+    assert products['AsyncPolyPhone'].sim_count == 3
+    assert isinstance(products['AsyncPolyPC'], Computer)
+    assert products['AsyncPolyPC'].cpu == 'M3'
+    db.delete(phone)
+    db.delete(computer)
+    db.commit()
+    db.close()
@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from collections.abc import MutableSequence, Sequence
+import pytest
+from sqlalchemy import update
+from app.models import Product, SessionLocal
+from app.catalog import CatalogCache, ProductView, catalog
+
+
+def test_catalog_snapshot_hits_and_misses():
+    cache = CatalogCache()
+    first = cache.snapshot()
+    second = cache.snapshot()
+    assert first is second
+    stats = cache.stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 1
+
+
+def test_catalog_snapshot_is_immutable():
+    snapshot = catalog.snapshot()
+    # Кортеж або ліниві записи змапованого знімка: лише читання
+    assert isinstance(snapshot.products, Sequence) and not isinstance(snapshot.products, MutableSequence)
+    with pytest.raises(TypeError):
+        snapshot.by_id[-1] = None
+    if snapshot.products:
+        with pytest.raises(TypeError):
+            snapshot.products[0] = None
+    if snapshot.products:
+        with pytest.raises(AttributeError):
+            snapshot.products[0].name = 'changed'
+
+
+def test_catalog_invalidated_on_insert_update_delete():
+    db = SessionLocal()
+    version = catalog.version
+    phone = Product.create_product('phone', name='CachePhone', price=100, sim_count=2)
+    db.add(phone)
+    db.commit()
+    assert catalog.version == version + 1
+    view = catalog.get(phone.id)
+    assert view == ProductView(phone.id, 'CachePhone', 100, 'phone', 2, None)
+
+    phone.price = 150
+    db.commit()
+    assert catalog.get(phone.id).price == 150
+
+    db.execute(update(Product).where(Product.id == phone.id).values(name='CachePhone2'))
+    db.commit()
+    assert catalog.get(phone.id).name == 'CachePhone2'
+
+    db.delete(phone)
+    db.commit()
+    assert catalog.get(phone.id) is None
+    db.close()
+
+
+def test_catalog_not_invalidated_on_rollback():
+    db = SessionLocal()
+    catalog.snapshot()
+    version = catalog.version
+    db.add(Product.create_product('computer', name='RollbackPC', price=1, cpu='i3'))
+    db.flush()
+    db.rollback()
+    db.close()
+    assert catalog.version == version
+
+
+def test_catalog_snapshot_async_loads_subclass_columns():
+    db = SessionLocal()
+    computer = Product.create_product('computer', name='CachePC', price=200, cpu='M2')
+    db.add(computer)
+    db.commit()
+    snapshot = asyncio.run(catalog.snapshot_async())
+    assert snapshot.by_id[computer.id].cpu == 'M2'
+    db.delete(computer)
+    db.commit()
+    db.close()
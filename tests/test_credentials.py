@@ -0,0 +1,129 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import threading
+from app.models import User, SessionLocal
+from app.uow import AsyncUnitOfWork
+from app.facade import RegistrationFacade, DeliverabilityCache
+from app.credentials import CredentialService, KDFPool, PasswordHasher, VerifiedLoginCache
+
+
+def fast_service(**kwargs) -> CredentialService:
+    return CredentialService(PasswordHasher(scrypt_n=2 ** 10), KDFPool(2), **kwargs)
+
+
+def reset_user(email: str, password: str):
+    db = SessionLocal()
+    db.query(User).filter_by(email=email).delete()
+    db.add(User(email=email, password=password, name='Creds'))
+    db.commit()
+    db.close()
+
+
+def stored_password(email: str) -> str:
+    db = SessionLocal()
+    value = db.query(User.password).filter_by(email=email).scalar()
+    db.close()
+    return value
+
+
+def test_hasher_formats_and_rehash():
+    scrypt = PasswordHasher(scrypt_n=2 ** 10)
+    pbkdf2 = PasswordHasher('pbkdf2_sha256', pbkdf2_iterations=1000)
+    for hasher, prefix in ((scrypt, 'scrypt$1024,8,1$'), (pbkdf2, 'pbkdf2_sha256$1000$')):
+        encoded = hasher.hash('secret')
+        assert encoded.startswith(prefix)
+        assert hasher.verify('secret', encoded)
+        assert not hasher.verify('Secret', encoded)
+        assert encoded != hasher.hash('secret')
+    # Хеш, створений іншим алгоритмом, перевіряється за власними параметрами
+    assert scrypt.verify('secret', pbkdf2.hash('secret'))
+    assert scrypt.needs_rehash(pbkdf2.hash('secret'))
+    assert PasswordHasher(scrypt_n=2 ** 11).needs_rehash(scrypt.hash('secret'))
+    assert not scrypt.needs_rehash(scrypt.hash('secret'))
+    assert not PasswordHasher.is_hashed('pw123')
+    assert not scrypt.verify('x', 'scrypt$bad$salt$hash')
+
+
+def test_login_cache_keys_on_stored_hash():
+    cache = VerifiedLoginCache(maxsize=2)
+    cache.store('hash-a', 'pw')
+    assert cache.check('hash-a', 'pw')
+    assert not cache.check('hash-a', 'other')
+    assert not cache.check('hash-b', 'pw')
+    cache.store('hash-b', 'pw')
+    cache.store('hash-c', 'pw')
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'size': 2}
+
+
+def test_authenticate_migrates_legacy_plaintext():
+    email = 'legacy-login@test.com'
+    reset_user(email, 'pw123')
+    service = fast_service()
+
+    async def login(password):
+        async with AsyncUnitOfWork() as uow:
+            return await service.authenticate(uow, email, password)
+
+    assert asyncio.run(login('wrong')) is None
+    assert stored_password(email) == 'pw123'
+    assert asyncio.run(login('pw123')).email == email
+    migrated = stored_password(email)
+    assert migrated.startswith('scrypt$') and service.hasher.verify('pw123', migrated)
+    assert service.migrated == 1
+    # Повторний логін — з кешу, без KDF і без повторної міграції
+    calls = []
+    verify = service.hasher.verify
+    service.hasher.verify = lambda *args: calls.append(args) or verify(*args)
+    assert asyncio.run(login('pw123')) is not None
+    assert calls == [] and service.cache.stats()['hits'] == 1
+    assert asyncio.run(login('bad')) is None and len(calls) == 1
+    assert stored_password(email) == migrated
+    service.pool.shutdown()
+
+
+def test_verification_runs_off_the_event_loop():
+    email = 'kdf-thread@test.com'
+    service = fast_service(cache=VerifiedLoginCache(ttl=0))
+    reset_user(email, service.hasher.hash('pw'))
+    threads = []
+    verify = service.hasher.verify
+    service.hasher.verify = lambda *args: threads.append(threading.current_thread().name) or verify(*args)
+    hashes = []
+    hash_password = service.hasher.hash
+    service.hasher.hash = lambda *args: hashes.append(threading.current_thread().name) or hash_password(*args)
+
+    async def run():
+        async with AsyncUnitOfWork() as uow:
+            assert await service.authenticate(uow, email, 'pw') is not None
+        async with AsyncUnitOfWork() as uow:
+            assert await service.authenticate(uow, 'missing-kdf@test.com', 'pw') is None
+    asyncio.run(run())
+    assert len(threads) == 2 and all(name.startswith('kdf') for name in threads)
+    # Хеш-заглушка для невідомого email теж рахується в пулі, а prepare() при старті робить це заздалегідь
+    assert len(hashes) == 1 and hashes[0].startswith('kdf')
+    service.prepare()
+    assert len(hashes) == 1
+    service.pool.shutdown()
+
+
+def test_registration_stores_hashes(monkeypatch):
+    monkeypatch.setattr('app.facade.deliverability_cache', DeliverabilityCache(resolver=lambda d, i: {}))
+    monkeypatch.setattr('app.facade.RegistrationFacade.send_confirmation_email', lambda email, name: None)
+    monkeypatch.setattr('app.facade.credentials', fast_service())
+    emails = ['hash-one@example.com', 'hash-two@example.com']
+    db = SessionLocal()
+    db.query(User).filter(User.email.in_(emails)).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+    assert RegistrationFacade.register_user(emails[0], 'first', 'One')[0]
+    assert RegistrationFacade.register_users([(emails[1], 'second', 'Two')]) == [
+        (True, "Registration successful. Confirmation email sent.")]
+    hasher = PasswordHasher()
+    assert hasher.verify('first', stored_password(emails[0]))
+    assert hasher.verify('second', stored_password(emails[1]))
+    db = SessionLocal()
+    db.query(User).filter(User.email.in_(emails)).delete(synchronize_session=False)
+    db.commit()
+    db.close()
@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import threading
+import time
+from app.events import HubObserver, OrderEventHub, SQLiteEventRelay, event_stream
+from app.utils import OrderEvent, OrderSubject
+
+
+def test_hub_fanout_from_observer_thread():
+    hub = OrderEventHub()
+
+    async def run():
+        first = hub.subscribe(1)
+        second = hub.subscribe(1)
+        other = hub.subscribe(2)
+        subject = OrderSubject()
+        subject.attach(HubObserver(hub, relay=None))
+        # Спостерігачі працюють у фонових потоках диспетчера
+        thread = threading.Thread(target=subject.notify, args=(OrderEvent(1, 5, 7, 'paid'),))
+        thread.start()
+        thread.join()
+        events = await asyncio.wait_for(asyncio.gather(first.queue.get(), second.queue.get()), 1)
+        assert [e.status for e in events] == ['paid', 'paid']
+        assert other.queue.empty()
+        for subscription in (first, second, other):
+            hub.unsubscribe(subscription)
+        assert hub.subscriber_count() == 0
+    asyncio.run(run())
+    assert hub.stats()['delivered'] == 2
+
+
+def test_bounded_buffer_keeps_latest():
+    hub = OrderEventHub(buffer=2)
+
+    async def run():
+        subscription = hub.subscribe(1)
+        for status in ('a', 'b', 'c'):
+            hub.publish(OrderEvent(1, None, None, status))
+        assert [subscription.queue.get_nowait().status for _ in range(2)] == ['b', 'c']
+        hub.unsubscribe(subscription)
+    asyncio.run(run())
+    assert hub.stats()['dropped'] == 1
+
+
+def test_event_stream_heartbeat_and_close():
+    hub = OrderEventHub()
+
+    async def run():
+        subscription = hub.subscribe(3)
+        stream = event_stream(hub, subscription, OrderEvent(3, None, None, 'created'), heartbeat=0.01)
+        chunks = [await stream.__anext__(), await stream.__anext__()]
+        hub.publish(OrderEvent(3, None, None, 'shipped'))
+        chunks.append(await stream.__anext__())
+        hub.close()
+        rest = [chunk async for chunk in stream]
+        return chunks, rest
+    chunks, rest = asyncio.run(run())
+    assert chunks[0].startswith('retry:') and '"status": "created"' in chunks[0]
+    assert chunks[1] == ': heartbeat\n\n'
+    assert 'id: 2\n' in chunks[2] and '"status": "shipped"' in chunks[2]
+    assert all(chunk == ': heartbeat\n\n' for chunk in rest)
+    assert hub.subscriber_count() == 0
+
+
+def test_sqlite_relay_between_workers(tmp_path):
+    path = str(tmp_path / 'events.db')
+    hub_a, hub_b = OrderEventHub(), OrderEventHub()
+    relay_a, relay_b = SQLiteEventRelay(hub_a, path), SQLiteEventRelay(hub_b, path)
+
+    async def run():
+        sub_a, sub_b = hub_a.subscribe(9), hub_b.subscribe(9)
+        relay_a.publish(OrderEvent(9, 1, 2, 'paid'))
+        # Власні події не ретранслюються: локальні клієнти вже отримали їх напряму
+        assert relay_a.poll() == 0
+        assert relay_b.poll() == 1
+        assert relay_b.poll() == 0
+        assert (await asyncio.wait_for(sub_b.queue.get(), 1)).status == 'paid'
+        assert sub_a.queue.empty()
+    asyncio.run(run())
+    relay_a.retention = -1
+    relay_a.prune()
+    assert relay_a._conn().execute('SELECT count(*) FROM order_events').fetchone()[0] == 0
+
+
+def test_hub_observer_hands_relay_writes_to_writer_thread(tmp_path):
+    path = str(tmp_path / 'events.db')
+    hub_a, hub_b = OrderEventHub(), OrderEventHub()
+    relay_a, relay_b = SQLiteEventRelay(hub_a, path), SQLiteEventRelay(hub_b, path)
+    relay_a.start()
+    lock = relay_b._conn()
+    try:
+        # Інший процес тримає блокування запису: notify не чекає на нього
+        lock.execute('BEGIN IMMEDIATE')
+        subject = OrderSubject()
+        subject.attach(HubObserver(hub_a, relay_a))
+        start = time.perf_counter()
+        subject.notify_many([OrderEvent(3, 1, 2, 'created'), OrderEvent(4, 1, 2, 'created')])
+        assert time.perf_counter() - start < 0.5
+        assert hub_a.published == 2
+        lock.execute('COMMIT')
+    finally:
+        relay_a.stop()
+    assert relay_b.poll() == 2 and relay_a.pending() == 0
@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Product, User, Order
+import app.export as export
+from app.export import (ORDER_FIELDS, PRODUCT_FIELDS, OrderExportFilter, export_stream, orders_query,
+                        products_query)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    db = factory()
+    user = User(email='export@test.com', password='1', name='Export')
+    phone = Product.create_product('phone', name='ExportPhone', price=10, sim_count=2)
+    computer = Product.create_product('computer', name='ExportPC', price=20, cpu='M2')
+    db.add_all([user, phone, computer])
+    db.flush()
+    now = datetime(2024, 5, 1)
+    db.add_all([
+        Order(user_id=user.id, product_id=phone.id, status='created', created_at=now - timedelta(days=2)),
+        Order(user_id=user.id, product_id=computer.id, status='paid', created_at=now),
+        Order(user_id=user.id, product_id=phone.id, status='paid', created_at=now + timedelta(days=2)),
+    ])
+    db.commit()
+    db.close()
+    yield factory
+    engine.dispose()
+
+
+def read(chunks):
+    return b''.join(chunks).decode()
+
+
+def test_products_csv_polymorphic(session_factory):
+    rows = list(csv.DictReader(io.StringIO(read(export_stream('csv', PRODUCT_FIELDS, products_query(),
+                                                              session_factory=session_factory)))))
+    assert [(r['type'], r['name'], r['sim_count'], r['cpu']) for r in rows] == [
+        ('phone', 'ExportPhone', '2', ''), ('computer', 'ExportPC', '', 'M2')]
+    rows = read(export_stream('ndjson', PRODUCT_FIELDS, products_query('computer'),
+                              session_factory=session_factory)).splitlines()
+    assert [json.loads(r)['name'] for r in rows] == ['ExportPC']
+
+
+def test_orders_ndjson_filters_and_gzip(session_factory):
+    filters = OrderExportFilter(status='paid', since=datetime(2024, 4, 30), until=datetime(2024, 5, 2))
+    data = gzip.decompress(b''.join(export_stream('ndjson', ORDER_FIELDS, orders_query(filters), gzip=True,
+                                                  session_factory=session_factory)))
+    rows = [json.loads(line) for line in data.decode().splitlines()]
+    assert len(rows) == 1
+    assert rows[0]['product_name'] == 'ExportPC'
+    assert rows[0]['user_email'] == 'export@test.com'
+    assert rows[0]['created_at'] == '2024-05-01T00:00:00'
+
+
+def test_export_streams_in_chunks(session_factory, monkeypatch):
+    monkeypatch.setattr(export, 'CHUNK_BYTES', 10)
+    chunks = list(export_stream('csv', ORDER_FIELDS, orders_query(), session_factory=session_factory))
+    assert len(chunks) > 3
+    assert len(list(csv.reader(io.StringIO(read(chunks))))) == 4
+    with pytest.raises(ValueError):
+        export_stream('xml', ORDER_FIELDS, orders_query())
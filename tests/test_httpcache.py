@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from datetime import timedelta
+import httpx
+import pytest
+from sqlalchemy import event, update
+from app.main import app
+from app.models import Order, Product, User, SessionLocal, async_engine, utc_now
+from app.builder import OrderBuilder
+from app.events import order_event_hub
+from app.httpcache import ResponseCache, response_cache, strong_etag
+from app.inventory import inventory
+from app.sessions import Principal, session_store
+from app.utils import OrderEvent
+
+
+@pytest.fixture
+def buyer():
+    db = SessionLocal(expire_on_commit=False)
+    db.query(User).filter_by(email='etag@test.com').delete()
+    user = User(email='etag@test.com', password='1', name='Etag')
+    product = Product.create_product('phone', name='EtagPhone', price=10, sim_count=1)
+    db.add_all([user, product])
+    db.commit()
+    db.close()
+    yield user, product, session_store.create(Principal(user.id, user.name, user.email))
+    db = SessionLocal()
+    db.query(Order).filter_by(product_id=product.id).delete()
+    db.delete(db.get(Product, product.id))
+    db.query(User).filter_by(id=user.id).delete()
+    db.commit()
+    db.close()
+    response_cache.clear()
+
+
+def test_cache_evicts_by_size_and_invalidates_by_tag():
+    cache = ResponseCache(max_entries=10, max_bytes=10)
+    cache.put('a', b'1234', tags=[('order', 1)])
+    cache.put('b', b'1234', tags=[('order', 2)])
+    assert cache.get('a').etag == strong_etag(b'1234')
+    cache.put('c', b'1234')
+    # 'b' найдавніше використаний
+    assert cache.get('b') is None and cache.stats()['bytes'] == 8
+    assert cache.invalidate(('order', 1)) == 1 and cache.get('a') is None
+    # Сторінка, рендер якої почався до інвалідації її тегу, не зберігається; чужі теги не заважають
+    epoch = cache.epoch
+    cache.invalidate(('order', 3))
+    cache.put('d', b'12', tags=[('order', 3)], epoch=epoch)
+    assert cache.get('d') is None
+    cache.put('e', b'12', tags=[('order', 4)], epoch=epoch)
+    assert cache.get('e') is not None
+
+
+def test_epoch_guard_keeps_bounded_history():
+    cache = ResponseCache(history=2)
+    epoch = cache.epoch
+    for order_id in (1, 2, 3):
+        cache.invalidate(('order', order_id))
+    assert len(cache._tag_epochs) == 2
+    # Тег ('order', 1) витіснено з історії: рішення консервативне
+    cache.put('a', b'1', tags=[('order', 1)], epoch=epoch)
+    assert cache.get('a') is None
+    cache.put('b', b'1', tags=[('order', 1)], epoch=cache.epoch)
+    assert cache.get('b') is not None
+
+
+def test_pages_revalidate_with_etags(buyer):
+    user, product, token = buyer
+    order = OrderBuilder().create_order(user, product).save()
+    queries = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test',
+                                     cookies={'session_token': token}) as client:
+            index = await client.get('/')
+            assert index.headers['cache-control'] == 'public, max-age=300'
+            assert (await client.get('/', headers={'If-None-Match': index.headers['etag']})).status_code == 304
+
+            products = await client.get('/products')
+            assert products.status_code == 200 and 'EtagPhone' in products.text
+            assert products.headers['cache-control'] == 'private, no-cache'
+            again = await client.get('/products', headers={'If-None-Match': products.headers['etag']})
+            assert again.status_code == 304 and again.content == b''
+
+            url = f'/order_success/{order.id}'
+            page = await client.get(url)
+            assert page.status_code == 200 and 'created' in page.text
+            event.listen(async_engine.sync_engine, 'before_cursor_execute', count)
+            try:
+                assert (await client.get(url, headers={'If-None-Match': page.headers['etag']})).status_code == 304
+                assert (await client.get(url)).content == page.content
+            finally:
+                event.remove(async_engine.sync_engine, 'before_cursor_execute', count)
+            assert queries == []
+
+            # Подія замовлення (локальна чи ретрансльована з іншого воркера) видаляє сторінку
+            db = SessionLocal()
+            db.execute(update(Order).where(Order.id == order.id).values(status='expired'))
+            db.commit()
+            db.close()
+            order_event_hub.publish(OrderEvent(order.id, user.id, product.id, 'expired'))
+            fresh = await client.get(url, headers={'If-None-Match': page.headers['etag']})
+            assert fresh.status_code == 200 and 'expired' in fresh.text
+            assert fresh.headers['etag'] != page.headers['etag']
+
+    asyncio.run(scenario())
+
+
+def test_expired_reservation_drops_cached_page_without_events(buyer, monkeypatch):
+    user, product, token = buyer
+    monkeypatch.setattr(inventory, 'expiry', True)
+    inventory.set_stock(product.id, 1)
+    order = OrderBuilder().create_order(user, product).save()
+    url = f'/order_success/{order.id}'
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test',
+                                     cookies={'session_token': token}) as client:
+            page = await client.get(url)
+            assert 'created' in page.text
+            # Жодного OrderSubject/хабу: сторінку видаляє сам release_expired після commit
+            expired = inventory.release_expired(now=utc_now() + timedelta(seconds=inventory.reservation_ttl + 1))
+            assert order.id in [e.id for e in expired]
+            fresh = await client.get(url, headers={'If-None-Match': page.headers['etag']})
+            assert fresh.status_code == 200 and 'expired' in fresh.text
+
+    asyncio.run(scenario())
@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Product, Phone, Computer
+from app.importer import ProductImporter, import_products, parse_row, open_rows
+from app.importer.__main__ import main as importer_main
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+def write_csv(path, rows):
+    lines = ['type,name,price,sim_count,cpu'] + [','.join(str(v) for v in row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_parse_row_uses_factory_types():
+    cls, values = parse_row({'type': 'phone', 'name': ' P1 ', 'price': '10', 'sim_count': '2', 'cpu': ''})
+    assert cls is Phone
+    assert values == {'name': 'P1', 'price': 10.0, 'sim_count': 2}
+    cls, values = parse_row({'type': 'computer', 'name': 'C1', 'price': 5, 'cpu': 'M2'})
+    assert cls is Computer
+    assert values == {'name': 'C1', 'price': 5.0, 'cpu': 'M2'}
+    with pytest.raises(ValueError):
+        parse_row({'type': 'tablet', 'name': 'T', 'price': '1'})
+
+
+def test_csv_import_in_chunks(tmp_path, session_factory):
+    rows = [('phone', f'Phone {i}', i, 1 + i % 2, '') for i in range(25)]
+    rows += [('computer', f'PC {i}', 100 + i, '', 'M2') for i in range(10)]
+    rows.append(('tablet', 'Bad', 1, '', ''))
+    path = write_csv(tmp_path / 'feed.csv', rows)
+    seen = []
+    stats = import_products(path, session_factory=session_factory, chunk_size=10,
+                            progress=lambda s: seen.append(s.rows))
+    assert stats.rows == 36
+    assert stats.inserted == 35
+    assert stats.skipped == 1
+    assert stats.chunks == 4
+    assert seen == [10, 20, 30, 36]
+    assert stats.snapshot()['rows_per_sec'] > 0
+    db = session_factory()
+    assert db.query(Phone).count() == 25
+    assert db.query(Computer).filter_by(cpu='M2').count() == 10
+    assert db.query(Phone).filter_by(name='Phone 3').one().sim_count == 2
+    db.close()
+
+
+def test_jsonl_upsert_by_name(tmp_path, session_factory):
+    path = tmp_path / 'feed.jsonl'
+    path.write_text('\n'.join(json.dumps(r) for r in [
+        {'type': 'phone', 'name': 'iPhone', 'price': 100, 'sim_count': 1},
+        {'type': 'computer', 'name': 'MacBook', 'price': 200, 'cpu': 'M1'},
+    ]) + '\n', encoding='utf-8')
+    import_products(str(path), session_factory=session_factory)
+    path.write_text('\n'.join(json.dumps(r) for r in [
+        {'type': 'phone', 'name': 'MacBook', 'price': 1},
+        {'type': 'phone', 'name': 'iPhone', 'price': 90, 'sim_count': 2},
+        {'type': 'computer', 'name': 'MacBook', 'price': 150, 'cpu': 'M3'},
+        {'type': 'phone', 'name': 'Pixel', 'price': 80},
+        {'type': 'phone', 'name': 'Pixel', 'price': 70},
+    ]) + '\n', encoding='utf-8')
+    stats = ProductImporter(session_factory).run(open_rows(str(path)))
+    assert (stats.inserted, stats.updated, stats.skipped) == (1, 2, 2)
+    db = session_factory()
+    assert db.query(Product).count() == 3
+    phone = db.query(Phone).filter_by(name='iPhone').one()
+    assert (phone.price, phone.sim_count) == (90, 2)
+    computer = db.query(Computer).filter_by(name='MacBook').one()
+    assert (computer.price, computer.cpu) == (150, 'M3')
+    assert db.query(Phone).filter_by(name='Pixel').one().price == 70
+    db.close()
+    # Та сама назва з іншим типом не перезаписує існуючий товар
+    path.write_text(json.dumps({'type': 'phone', 'name': 'MacBook', 'price': 1}) + '\n', encoding='utf-8')
+    stats = import_products(str(path), session_factory=session_factory)
+    assert (stats.inserted, stats.updated, stats.skipped) == (0, 0, 1)
+
+
+def test_cli(tmp_path, capsys):
+    path = write_csv(tmp_path / 'feed.csv', [('phone', 'CLI Phone', 5, 1, '')])
+    importer_main([path, '--database', f"sqlite:///{tmp_path / 'cli.db'}", '--quiet'])
+    assert 'inserted=1' in capsys.readouterr().out
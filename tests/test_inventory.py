@@ -0,0 +1,146 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from datetime import timedelta
+import pytest
+from sqlalchemy import event
+from app.models import Order, Product, StockShard, User, SessionLocal, engine, utc_now
+from app.builder import OrderBuilder
+from app.catalog import catalog
+from app.inventory import Inventory, OutOfStock, inventory, stock_reservations_total
+
+
+@pytest.fixture
+def stocked(monkeypatch):
+    # Строк резерву вмикається явно (TECHSTORE_RESERVATION_EXPIRY)
+    monkeypatch.setattr(inventory, 'expiry', True)
+    db = SessionLocal(expire_on_commit=False)
+    user = User(email='stock@test.com', password='1', name='Stock')
+    product = Product.create_product('phone', name='FlashPhone', price=999, sim_count=1)
+    db.query(User).filter_by(email=user.email).delete()
+    db.add_all([user, product])
+    db.commit()
+    db.close()
+    yield user, product
+    db = SessionLocal()
+    db.query(Order).filter_by(product_id=product.id).delete()
+    db.query(StockShard).filter_by(product_id=product.id).delete()
+    db.delete(db.get(Product, product.id))
+    db.query(User).filter_by(id=user.id).delete()
+    db.commit()
+    db.close()
+    inventory.sold_out.clear()
+
+
+def orders_for(product_id: int):
+    db = SessionLocal()
+    orders = db.query(Order).filter_by(product_id=product_id).order_by(Order.id).all()
+    db.close()
+    return orders
+
+
+def test_reservation_decrements_and_short_circuits(stocked):
+    user, product = stocked
+    OrderBuilder().create_order(user, product).save()
+    assert orders_for(product.id)[0].reserved_until is None
+    inventory.set_stock(product.id, 2)
+    version = catalog.version
+    for _ in range(2):
+        OrderBuilder().create_order(user, product).save()
+    with pytest.raises(OutOfStock):
+        OrderBuilder().create_order(user, product).save()
+    assert inventory.stock_level(product.id) == 0
+    # Розпроданий товар відхиляється з памʼяті
+    before = stock_reservations_total.value(outcome='short_circuit')
+    with pytest.raises(OutOfStock):
+        OrderBuilder().create_order(user, product).save()
+    assert stock_reservations_total.value(outcome='short_circuit') == before + 1
+    orders = orders_for(product.id)
+    assert len(orders) == 3 and all(o.reserved_until is not None for o in orders[1:])
+    # Зміна залишку не інвалідовує знімок каталогу
+    assert catalog.version == version
+
+
+def test_concurrent_buyers_never_oversell(stocked):
+    user, product = stocked
+    inventory.set_stock(product.id, 5)
+    sold, rejected = [], []
+
+    def buy():
+        try:
+            sold.append(OrderBuilder().create_order(user, product).save())
+        except OutOfStock:
+            rejected.append(1)
+
+    threads = [threading.Thread(target=buy) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(sold) == 5 and len(rejected) == 15
+    assert len(orders_for(product.id)) == 5
+    assert inventory.stock_level(product.id) == 0
+
+
+def test_sharded_stock_and_bulk_orders(stocked):
+    user, product = stocked
+    inventory.set_stock(product.id, 7, shards=3)
+    db = SessionLocal()
+    assert sorted(s.stock for s in db.query(StockShard).filter_by(product_id=product.id)) == [2, 2, 3]
+    db.close()
+    # Інший воркер без підказки про шарди знаходить їх після невдалого основного UPDATE
+    other = Inventory()
+    db = SessionLocal()
+    assert all(other.reserve(db, product.id) for _ in range(3))
+    db.commit()
+    db.close()
+    assert inventory.stock_level(product.id) == 4
+    with pytest.raises(OutOfStock):
+        OrderBuilder().create_orders([(user.id, product.id)] * 5).save_many()
+    assert orders_for(product.id) == []
+    assert not inventory.sold_out.is_sold_out(product.id)
+    assert len(OrderBuilder().create_orders([(user.id, product.id)] * 4).save_many()) == 4
+    assert inventory.stock_level(product.id) == 0
+
+
+def test_expired_reservations_return_stock(stocked):
+    user, product = stocked
+    inventory.set_stock(product.id, 1)
+    OrderBuilder().create_order(user, product).save()
+    with pytest.raises(OutOfStock):
+        OrderBuilder().create_order(user, product).save()
+    assert inventory.release_expired() == []
+    events = inventory.release_expired(now=utc_now() + timedelta(seconds=inventory.reservation_ttl + 1))
+    assert [e.status for e in events] == ['expired']
+    assert orders_for(product.id)[0].status == 'expired'
+    assert inventory.stock_level(product.id) == 1
+    # Повторний прохід (інший воркер) не повертає ту саму одиницю двічі
+    assert inventory.release_expired(now=utc_now() + timedelta(days=1)) == []
+    OrderBuilder().create_order(user, product).save()
+    assert inventory.stock_level(product.id) == 0
+
+
+def test_untracked_products_skip_the_product_update(stocked, monkeypatch):
+    user, product = stocked
+    monkeypatch.setattr(inventory, 'expiry', False)
+    OrderBuilder().create_order(user, product).save()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        OrderBuilder().create_order(user, product).save()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert any(s.startswith('INSERT INTO orders') for s in statements)
+    assert not any(s.startswith('UPDATE products') for s in statements)
+    # Без строку резерву замовлення не отримують reserved_until, і reaper їх не скасує
+    assert all(o.reserved_until is None for o in orders_for(product.id))
+    # Облік, увімкнений в іншому процесі, помічається при наступному замовленні
+    inventory.set_stock(product.id, 1, session_factory=SessionLocal)
+    inventory._untracked.add(product.id)
+    OrderBuilder().create_order(user, product).save()
+    assert inventory.stock_level(product.id) == 0
@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import logging
+from app.utils import Logger, LoggerHandler
+
+
+def make_logger(**kwargs):
+    # Окремий екземпляр в обхід SingletonType, щоб не змінювати глобальний логер
+    logger = Logger.__new__(Logger)
+    logger.__init__(stream=io.StringIO(), **kwargs)
+    return logger
+
+
+def lines(logger):
+    return [json.loads(line) for line in logger.stream.getvalue().splitlines()]
+
+
+def test_logger_writes_json_lines():
+    logger = make_logger()
+    logger.log("Замовлення створено", order_id=5)
+    record = lines(logger)[0]
+    assert record['message'] == "Замовлення створено"
+    assert record['level'] == 'INFO'
+    assert record['source'] == 'app'
+    assert record['order_id'] == 5
+
+
+def test_logger_level_filter():
+    logger = make_logger(level='WARNING')
+    logger.log("hidden")
+    logger.log("shown", level='ERROR')
+    assert [r['message'] for r in lines(logger)] == ['shown']
+
+
+def test_logger_rate_limited_sampling():
+    logger = make_logger()
+    logger.set_rate_limit('sql', per_second=0.001, burst=3)
+    for i in range(10):
+        logger.log(f"SELECT {i}", source='sql')
+    logger.log("other source")
+    records = lines(logger)
+    assert [r['message'] for r in records if r['source'] == 'sql'] == ['SELECT 0', 'SELECT 1', 'SELECT 2']
+    assert records[-1]['message'] == 'other source'
+
+
+def test_logger_background_writer_flushes_on_stop():
+    logger = make_logger()
+    logger.start()
+    for i in range(100):
+        logger.log(f"queued {i}")
+    logger.stop()
+    assert len(lines(logger)) == 100
+    # Після stop логер знову пише синхронно
+    logger.log("sync again")
+    assert lines(logger)[-1]['message'] == 'sync again'
+
+
+def test_logger_handler_bridges_std_logging():
+    logger = Logger()
+    std_logger = logging.getLogger('tests.bridge')
+    std_logger.propagate = False
+    std_logger.setLevel(logging.INFO)
+    handler = LoggerHandler('bridge')
+    std_logger.addHandler(handler)
+    stream = io.StringIO()
+    previous, logger.stream = logger.stream, stream
+    try:
+        std_logger.info("bridged %s", 42)
+    finally:
+        logger.stream = previous
+        std_logger.removeHandler(handler)
+    record = json.loads(stream.getvalue())
+    assert record['message'] == 'bridged 42'
+    assert record['source'] == 'bridge'
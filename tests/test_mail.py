@@ -0,0 +1,169 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import smtplib
+import socket
+import pytest
+from aiosmtpd.controller import Controller
+from app.mail import EMAIL_FROM, MailQueue, mail_queue, send_mail, MailQueueFull, OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST, OVERFLOW_RAISE
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def make_queue(controller, **kwargs):
+    return MailQueue(host=controller.hostname, port=controller.port, user=None, use_tls=False, **kwargs)
+
+
+def test_mail_queue_delivers_over_one_connection(smtp_server):
+    controller, handler = smtp_server
+    mq = make_queue(controller)
+    for i in range(5):
+        assert mq.enqueue(f'user{i}@test.com', 'Subject', 'Body')
+    assert mq.join(timeout=5)
+    mq.stop()
+    assert len(handler.messages) == 5
+    assert handler.messages[0].rcpt_tos == ['user0@test.com']
+    assert mq._connections[0].connects == 1
+    stats = mq.stats.snapshot()
+    assert stats['sent'] == 5
+    assert stats['enqueued'] == 5
+    assert stats['failed'] == 0
+
+
+def test_mail_queue_retries_with_backoff(smtp_server):
+    controller, handler = smtp_server
+    attempts = {'count': 0}
+
+    class FlakySMTP(smtplib.SMTP):
+        def sendmail(self, *args, **kwargs):
+            attempts['count'] += 1
+            if attempts['count'] < 3:
+                raise smtplib.SMTPServerDisconnected('relay went away')
+            return super().sendmail(*args, **kwargs)
+
+    mq = make_queue(controller, backoff=0.01, smtp_class=FlakySMTP)
+    mq.enqueue('retry@test.com', 'Subject', 'Body')
+    assert mq.join(timeout=5)
+    mq.stop()
+    assert len(handler.messages) == 1
+    stats = mq.stats.snapshot()
+    assert stats['retries'] == 2
+    assert stats['sent'] == 1
+
+
+def test_mail_queue_gives_up_after_max_retries():
+    class DeadSMTP:
+        def __init__(self, *args, **kwargs):
+            raise ConnectionRefusedError('no relay')
+
+    mq = MailQueue(host='127.0.0.1', port=1, user=None, use_tls=False, max_retries=2, backoff=0.01,
+                   smtp_class=DeadSMTP)
+    mq.enqueue('dead@test.com', 'Subject', 'Body')
+    assert mq.join(timeout=5)
+    mq.stop()
+    stats = mq.stats.snapshot()
+    assert stats['failed'] == 1
+    assert stats['retries'] == 2
+
+
+def test_mail_queue_does_not_retry_permanent_rejections(smtp_server):
+    controller, handler = smtp_server
+
+    class RejectingHandler(RecordingHandler):
+        busy = 0
+
+        async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+            if address.startswith('missing@'):
+                return '550 No such user'
+            if address.startswith('busy@') and not self.busy:
+                self.busy += 1
+                return '451 Try again later'
+            envelope.rcpt_tos.append(address)
+            return '250 OK'
+
+    controller.handler = controller.smtpd.event_handler = rejecting = RejectingHandler()
+    mq = make_queue(controller, backoff=0.01, max_retries=3)
+    mq.enqueue('missing@test.com', 'Subject', 'Body')
+    assert mq.join(timeout=5)
+    stats = mq.stats.snapshot()
+    assert stats['rejected'] == 1 and stats['retries'] == 0 and stats['failed'] == 0
+    # 4xx — тимчасова відмова, лист повторюється
+    mq.enqueue('ok@test.com', 'Subject', 'Body')
+    mq.enqueue('busy@test.com', 'Subject', 'Body')
+    assert mq.join(timeout=5)
+    mq.stop()
+    assert [m.rcpt_tos for m in rejecting.messages] == [['ok@test.com'], ['busy@test.com']]
+    stats = mq.stats.snapshot()
+    assert stats['rejected'] == 1 and stats['retries'] == 1 and stats['sent'] == 2
+
+
+def test_mail_queue_sends_from_configured_address(smtp_server):
+    controller, handler = smtp_server
+    # Логін SMTP не стає адресою відправника
+    mq = MailQueue(host=controller.hostname, port=controller.port, user='relay-login', use_tls=False)
+    mq.user = None
+    mq.enqueue('from@test.com', 'Subject', 'Body')
+    assert mq.join(timeout=5)
+    mq.stop()
+    assert handler.messages[0].mail_from == EMAIL_FROM
+
+
+def test_mail_queue_overflow_policies():
+    mq = MailQueue(maxsize=2, overflow=OVERFLOW_DROP_NEW, autostart=False)
+    assert mq.enqueue('a@test.com', 'S', 'B')
+    assert mq.enqueue('b@test.com', 'S', 'B')
+    assert not mq.enqueue('c@test.com', 'S', 'B')
+    assert mq.depth == 2
+    assert mq.stats.snapshot()['dropped'] == 1
+
+    mq = MailQueue(maxsize=2, overflow=OVERFLOW_DROP_OLDEST, autostart=False)
+    for to in ('a@test.com', 'b@test.com', 'c@test.com'):
+        mq.enqueue(to, 'S', 'B')
+    assert [m.to for m in list(mq._queue.queue)] == ['b@test.com', 'c@test.com']
+
+    mq = MailQueue(maxsize=1, overflow=OVERFLOW_RAISE, autostart=False)
+    mq.enqueue('a@test.com', 'S', 'B')
+    with pytest.raises(MailQueueFull):
+        mq.enqueue('b@test.com', 'S', 'B')
+
+
+def test_mail_queue_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        MailQueue(overflow='explode')
+
+
+def test_shared_queue_starts_only_on_demand(smtp_server, monkeypatch):
+    controller, handler = smtp_server
+    # Імпорт застосунку не запускає воркери і не логіниться на SMTP
+    assert not mail_queue.running and not mail_queue.autostart
+    for name, value in (('host', controller.hostname), ('port', controller.port), ('user', ''), ('use_tls', False)):
+        monkeypatch.setattr(mail_queue, name, value)
+    assert send_mail('shared@test.com', 'S', 'B')
+    mail_queue.start()
+    try:
+        assert mail_queue.join(timeout=5)
+    finally:
+        mail_queue.stop()
+    assert [m.rcpt_tos for m in handler.messages][-1:] == [['shared@test.com']]
@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+import app.metrics as metrics
+from app.metrics import (Counter, Gauge, Histogram, MetricsMiddleware, Registry, RequestStats,
+                         instrument_engine, _request_stats)
+from app.utils import Logger
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    counter = Counter('demo_total', 'Demo counter.', ('route',), registry=registry)
+    gauge = Gauge('demo_depth', 'Demo gauge.', function=lambda: 3, registry=registry)
+    histogram = Histogram('demo_seconds', 'Demo histogram.', ('route',), buckets=(0.1, 1), registry=registry)
+    counter.inc(route='/a')
+    counter.inc(2, route='/a')
+    histogram.observe(0.05, route='/a')
+    histogram.observe(0.5, route='/a')
+    histogram.observe(5, route='/a')
+    lines = registry.render().splitlines()
+    assert '# TYPE demo_total counter' in lines
+    assert 'demo_total{route="/a"} 3' in lines
+    assert 'demo_depth 3' in lines
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{route="/a"} 3' in lines
+    assert gauge.function() == 3
+
+
+def test_engine_queries_attributed_to_request():
+    engine = create_engine('sqlite://')
+    instrument_engine(engine)
+    stats = RequestStats(capture_statements=True)
+    token = _request_stats.set(stats)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            conn.execute(text('SELECT 2'))
+            try:
+                conn.execute(text('SELECT * FROM missing_table'))
+            except Exception:
+                pass
+            assert not conn.info.get('metrics_query_start')
+    finally:
+        _request_stats.reset(token)
+    assert stats.queries == 2
+    assert stats.statements == ['SELECT 1', 'SELECT 2']
+    assert stats.db_time > 0
+
+
+def test_middleware_records_routes_and_slow_requests(monkeypatch):
+    engine = create_engine('sqlite://')
+    instrument_engine(engine)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get('/items/{item_id}')
+    def item(item_id: int):
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 42'))
+        return {'id': item_id}
+
+    stream = io.StringIO()
+    logger = Logger.__new__(Logger)
+    logger.__init__(stream=stream)
+    monkeypatch.setattr('app.utils.Logger', lambda: logger)
+    monkeypatch.setattr(metrics, 'SLOW_REQUEST_SECONDS', 0.0)
+    before = metrics.http_requests_total.value(method='GET', route='/items/{item_id}', status='200')
+    queries = metrics.http_request_queries.sum(route='/items/{item_id}')
+    client = TestClient(app)
+    assert client.get('/items/1').status_code == 200
+    assert client.get('/items/2').status_code == 200
+    assert metrics.http_requests_total.value(method='GET', route='/items/{item_id}', status='200') == before + 2
+    assert metrics.http_request_queries.sum(route='/items/{item_id}') == queries + 2
+    records = [r for r in map(json.loads, stream.getvalue().splitlines()) if r['source'] == 'slow_request']
+    assert len(records) == 2
+    assert records[0]['route'] == '/items/{item_id}'
+    assert records[0]['statements'] == ['SELECT 42']
@@ -0,0 +1,168 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import time
+import pytest
+from app.metrics import observer_events_dropped
+from app.utils import OrderSubject, OrderObserver, OrderEvent, SyncDispatcher, ThreadPoolDispatcher
+
+
+class FakeOrder:
+    def __init__(self, id, status='created'):
+        self.id = id
+        self.user_id = 1
+        self.product_id = 2
+        self.status = status
+
+
+class RecordingObserver(OrderObserver):
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def update(self, order):
+        with self._lock:
+            self.events.append((order.id, order.status))
+
+
+class FailingObserver(OrderObserver):
+    def update(self, order):
+        raise RuntimeError('boom')
+
+
+class SlowObserver(OrderObserver):
+    def __init__(self, release):
+        self.release = release
+
+    def update(self, order):
+        self.release.wait(5)
+
+
+def test_async_dispatch_keeps_order_per_order_id():
+    dispatcher = ThreadPoolDispatcher(workers_per_observer=4)
+    recorder = RecordingObserver()
+    subject = OrderSubject(dispatcher=dispatcher)
+    subject.attach(recorder)
+    order = FakeOrder(1)
+    statuses = [f'status-{i}' for i in range(50)]
+    for status in statuses:
+        order.status = status
+        subject.notify(order)
+    assert dispatcher.drain(5)
+    dispatcher.shutdown()
+    assert [status for _, status in recorder.events] == statuses
+
+
+def test_async_dispatch_isolates_failing_and_slow_observers():
+    dispatcher = ThreadPoolDispatcher(workers_per_observer=1)
+    release = threading.Event()
+    recorder = RecordingObserver()
+    subject = OrderSubject(dispatcher=dispatcher)
+    subject.attach(SlowObserver(release))
+    subject.attach(FailingObserver())
+    subject.attach(recorder)
+    start = time.perf_counter()
+    for i in range(3):
+        subject.notify(FakeOrder(i))
+    # notify не чекає на повільного спостерігача
+    assert time.perf_counter() - start < 1
+    deadline = time.monotonic() + 5
+    while len(recorder.events) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(recorder.events) == 3
+    release.set()
+    assert dispatcher.drain(5)
+    dispatcher.shutdown()
+    metrics = dispatcher.metrics()
+    assert metrics['FailingObserver']['errors'] == 3
+    assert metrics['RecordingObserver']['calls'] == 3
+    assert metrics['SlowObserver']['latency_max'] > 0
+
+
+def test_async_dispatch_bounded_queue_drops():
+    dispatcher = ThreadPoolDispatcher(workers_per_observer=1, maxsize=1)
+    release = threading.Event()
+    subject = OrderSubject(dispatcher=dispatcher)
+    subject.attach(SlowObserver(release))
+    before = observer_events_dropped.value(observer='SlowObserver')
+    for i in range(5):
+        subject.notify(FakeOrder(i))
+    release.set()
+    dispatcher.shutdown()
+    dropped = dispatcher.metrics()['SlowObserver']['dropped']
+    assert dropped >= 1
+    # Відкинуті події видно в /metrics
+    assert observer_events_dropped.value(observer='SlowObserver') - before == dropped
+
+
+def test_notify_many_keeps_order_per_order_id_across_lanes():
+    dispatcher = ThreadPoolDispatcher(workers_per_observer=4)
+    batches = []
+    recorder = RecordingObserver()
+
+    def update_many(events):
+        batches.append([event.id for event in events])
+        for event in events:
+            recorder.update(event)
+
+    recorder.update_many = update_many
+    subject = OrderSubject(dispatcher=dispatcher)
+    subject.attach(recorder)
+    orders = [FakeOrder(i) for i in range(8)]
+    subject.notify_many(orders)
+    for order in orders:
+        order.status = 'paid'
+        subject.notify(order)
+    assert dispatcher.drain(5)
+    dispatcher.shutdown()
+    # Пакет розділено за чергами замовлень, а не поставлено в чергу першого замовлення
+    assert len(batches) == 4
+    assert sorted(i for batch in batches for i in batch) == list(range(8))
+    for order in orders:
+        assert [status for order_id, status in recorder.events if order_id == order.id] == ['created', 'paid']
+
+
+def test_async_dispatch_sends_snapshots_and_drains_on_shutdown():
+    dispatcher = ThreadPoolDispatcher()
+    recorder = RecordingObserver()
+    received = []
+    recorder.update = lambda order: received.append(order)
+    subject = OrderSubject(dispatcher=dispatcher)
+    subject.attach(recorder)
+    for i in range(20):
+        subject.notify(FakeOrder(i))
+    dispatcher.shutdown()
+    assert len(received) == 20
+    assert all(isinstance(event, OrderEvent) for event in received)
+    # Після shutdown нові події відкидаються
+    subject.notify(FakeOrder(99))
+    assert len(received) == 20
+
+
+def test_sync_dispatch_propagates_errors_and_counts():
+    dispatcher = SyncDispatcher()
+    subject = OrderSubject(dispatcher=dispatcher)
+    subject.attach(FailingObserver())
+    with pytest.raises(RuntimeError):
+        subject.notify(FakeOrder(1))
+    assert dispatcher.metrics()['FailingObserver']['errors'] == 1
+
+
+def test_observer_with_own_dispatcher_is_not_dropped():
+    dispatcher = ThreadPoolDispatcher(workers_per_observer=1, maxsize=1)
+    release = threading.Event()
+    recorder = RecordingObserver()
+    subject = OrderSubject(dispatcher=dispatcher)
+    subject.attach(SlowObserver(release))
+    subject.attach(recorder, dispatcher=SyncDispatcher())
+    for i in range(5):
+        subject.notify(FakeOrder(i))
+    # Синхронний спостерігач отримав усі події до повернення notify, навіть коли смуга переповнена
+    assert [order_id for order_id, _ in recorder.events] == list(range(5))
+    release.set()
+    dispatcher.shutdown()
+    assert dispatcher.metrics()['SlowObserver']['dropped'] >= 1
+    subject.detach(recorder)
+    with pytest.raises(ValueError):
+        subject.detach(recorder)
@@ -0,0 +1,99 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from sqlalchemy import inspect
+from app.models import Product, User, Order, SessionLocal, engine, ensure_indexes
+from app.orders import order_history, order_history_async
+from app.uow import UnitOfWork, AsyncUnitOfWork
+
+
+def make_history():
+    db = SessionLocal()
+    stale = db.query(User).filter_by(email='history@test.com').first()
+    if stale:
+        db.query(Order).filter_by(user_id=stale.id).delete()
+        db.delete(stale)
+        db.commit()
+    user = User(email='history@test.com', password='1', name='History')
+    phone = Product.create_product('phone', name='HistoryPhone', price=1, sim_count=2)
+    computer = Product.create_product('computer', name='HistoryPC', price=2, cpu='M4')
+    db.add_all([user, phone, computer])
+    db.flush()
+    orders = [Order(user_id=user.id, product_id=(phone if i % 2 else computer).id, status='created') for i in range(5)]
+    db.add_all(orders)
+    db.commit()
+    ids = (user.id, phone.id, computer.id, [o.id for o in orders])
+    db.close()
+    return ids
+
+
+def cleanup(user_id, phone_id, computer_id):
+    db = SessionLocal()
+    db.query(Order).filter_by(user_id=user_id).delete()
+    db.delete(db.get(User, user_id))
+    db.delete(db.get(Product, phone_id))
+    db.delete(db.get(Product, computer_id))
+    db.commit()
+    db.close()
+
+
+def test_order_history_keyset_fixed_queries():
+    user_id, phone_id, computer_id, order_ids = make_history()
+    try:
+        with UnitOfWork() as uow:
+            start = uow.query_count
+            page = order_history(uow.session, user_id, limit=2)
+            # Замовлення + один selectin-запит для товарів з підкласами
+            assert uow.query_count - start == 2
+            assert [o.id for o in page.items] == order_ids[::-1][:2]
+            assert {o.product.cpu or o.product.sim_count for o in page.items} == {'M4', 2}
+            assert uow.query_count - start == 2
+            seen = [o.id for o in page.items]
+            while page.next_before:
+                page = order_history(uow.session, user_id, before=page.next_before, limit=2)
+                seen += [o.id for o in page.items]
+            assert seen == order_ids[::-1]
+    finally:
+        cleanup(user_id, phone_id, computer_id)
+
+
+def test_order_history_async():
+    user_id, phone_id, computer_id, order_ids = make_history()
+
+    async def load():
+        async with AsyncUnitOfWork() as uow:
+            return await order_history_async(uow.session, user_id, before=order_ids[-1], limit=10)
+    try:
+        page = asyncio.run(load())
+        assert [o.id for o in page.items] == order_ids[:-1][::-1]
+        assert page.next_before is None
+        assert page.items[0].to_dict()['product']['name'] == 'HistoryPhone'
+    finally:
+        cleanup(user_id, phone_id, computer_id)
+
+
+def test_orders_indexes():
+    ensure_indexes()
+    names = {ix['name'] for ix in inspect(engine).get_indexes('orders')}
+    assert {'ix_orders_user_id_id', 'ix_orders_product_id'} <= names
+
+
+def test_bulk_endpoint_ignores_client_status():
+    import httpx
+    from app.main import app
+    from app.sessions import Principal, session_store
+    user_id, phone_id, computer_id, _ = make_history()
+    token = session_store.create(Principal(user_id, 'History', 'history@test.com'))
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test',
+                                     cookies={'session_token': token}) as client:
+            return await client.post('/orders/bulk', json={'items': [{'product_id': phone_id, 'status': 'paid'}]})
+
+    try:
+        response = asyncio.run(scenario())
+        assert response.status_code == 200
+        assert [o['status'] for o in response.json()['orders']] == ['created']
+    finally:
+        cleanup(user_id, phone_id, computer_id)
@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from sqlalchemy import inspect
+from app.models import Product, SessionLocal, engine, ensure_indexes
+from app.catalog import CatalogCache, ProductFilter, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def paged_products():
+    db = SessionLocal()
+    products = [Product.create_product('phone', name=f'PagePhone{i}', price=5000 + i % 3, sim_count=1 + i % 2)
+                for i in range(7)]
+    products += [Product.create_product('computer', name=f'PagePC{i}', price=5000 + i, cpu='PageCPU')
+                 for i in range(3)]
+    db.add_all(products)
+    db.commit()
+    yield products
+    for p in products:
+        db.delete(p)
+    db.commit()
+    db.close()
+
+
+def collect(cache, sort, limit, filters):
+    items, after, pages = [], None, 0
+    while True:
+        page = cache.page(sort, after, limit, filters)
+        items.extend(page.items)
+        pages += 1
+        if not page.next_cursor:
+            return items, pages
+        after = page.next_cursor
+
+
+def test_keyset_pagination_walks_all_rows_in_order(paged_products):
+    ids = {p.id for p in paged_products}
+    filters = ProductFilter(min_price=5000, max_price=5002)
+    items, pages = collect(CatalogCache(), 'price', 3, filters)
+    ours = [v for v in items if v.id in ids]
+    assert len(ours) == len([p for p in paged_products if p.price <= 5002])
+    keys = [(v.price, v.id) for v in items]
+    assert keys == sorted(keys)
+    assert len({v.id for v in items}) == len(items)
+
+
+def test_keyset_pagination_filters(paged_products):
+    cache = CatalogCache()
+    computers, _ = collect(cache, 'name', 2, ProductFilter(type='computer', cpu='PageCPU'))
+    assert [v.name for v in computers] == ['PagePC0', 'PagePC1', 'PagePC2']
+    phones, _ = collect(cache, 'name', 5, ProductFilter(sim_count=2, min_price=5000, max_price=5002))
+    assert phones and all(v.sim_count == 2 and v.type == 'phone' for v in phones)
+
+
+def test_page_cache_invalidated_on_change(paged_products):
+    cache = CatalogCache()
+    filters = ProductFilter(type='computer', cpu='PageCPU')
+    first = cache.page('name', None, 10, filters)
+    assert cache.page('name', None, 10, filters) is first
+    cache.invalidate()
+    assert cache.page('name', None, 10, filters) is not first
+
+
+def test_cursor_roundtrip_and_invalid():
+    assert decode_cursor(encode_cursor('Phone', 42)) == ('Phone', 42)
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+    with pytest.raises(ValueError):
+        CatalogCache().page(sort='stock')
+
+
+def test_catalog_indexes_exist():
+    ensure_indexes()
+    names = {i['name'] for i in inspect(engine).get_indexes('products')}
+    assert {'ix_products_price_id', 'ix_products_name_id'} <= names
+    assert 'ix_phones_sim_count_id' in {i['name'] for i in inspect(engine).get_indexes('phones')}
+    assert 'ix_computers_cpu_id' in {i['name'] for i in inspect(engine).get_indexes('computers')}
@@ -5,7 +5,7 @@ import pytest
 from app.utils import Logger, SingletonType, OrderSubject, EmailNotifier, SMSNotifier
 from app.models import Product, Phone, Computer, User, Order, SessionLocal
 from app.builder import OrderBuilder
-from app.facade import RegistrationFacade
+from app.facade import RegistrationFacade, DeliverabilityCache
 from sqlalchemy.exc import IntegrityError
 
 # --- Singleton ---
@@ -100,6 +100,7 @@ def test_observer_detach(capsys):
 # --- Facade (Registration) ---
 def test_registration_facade(monkeypatch):
     # Mock email sending
+    monkeypatch.setattr('app.facade.deliverability_cache', DeliverabilityCache(resolver=lambda domain, i18n: {}))
     monkeypatch.setattr('app.facade.RegistrationFacade.send_confirmation_email', lambda email, name: None)
     db = SessionLocal()
     email = 'facade@test.com'
@@ -128,6 +129,7 @@ def test_registration_facade_invalid_email(monkeypatch):
     assert "Invalid email" in msg
 
 def test_registration_facade_empty_password(monkeypatch):
+    monkeypatch.setattr('app.facade.deliverability_cache', DeliverabilityCache(resolver=lambda domain, i18n: {}))
     monkeypatch.setattr('app.facade.RegistrationFacade.send_confirmation_email', lambda email, name: None)
     success, msg = RegistrationFacade.register_user('empty@pw.com', '', 'TestUser')
     assert not success
@@ -244,6 +246,7 @@ def test_observer_no_observers():
         pytest.fail("Observer notify failed with no observers")
 
 def test_facade_email_send(monkeypatch):
+    monkeypatch.setattr('app.facade.deliverability_cache', DeliverabilityCache(resolver=lambda domain, i18n: {}))
     from app.models import SessionLocal, User
     called = {}
     def fake_send(email, name):
@@ -293,6 +296,7 @@ def test_observer_update_not_implemented():
         pytest.fail("update() should be a no-op")
 
 def test_facade_duplicate_email(monkeypatch):
+    monkeypatch.setattr('app.facade.deliverability_cache', DeliverabilityCache(resolver=lambda domain, i18n: {}))
     monkeypatch.setattr('app.facade.RegistrationFacade.send_confirmation_email', lambda email, name: None)
     db = SessionLocal()
     email = 'dupemail@test.com'
@@ -306,4 +310,58 @@ def test_facade_duplicate_email(monkeypatch):
     assert "already registered" in msg
     db.delete(user)
     db.commit()
-    db.close() 
\ No newline at end of file
+    db.close()
+
+def test_builder_save_many():
+    db = SessionLocal()
+    user = User(email='bulk@test.com', password='1', name='Bulk')
+    product1 = Product.create_product('phone', name='BulkPhone', price=10, sim_count=1)
+    product2 = Product.create_product('computer', name='BulkPC', price=20, cpu='i5')
+    db.add_all([user, product1, product2])
+    db.commit()
+    items = [(user.id, product1.id), (user.id, product2.id), (user.id, product1.id)]
+    orders = OrderBuilder().create_orders(items).save_many()
+    assert len({o.id for o in orders}) == 3
+    assert [o.status for o in orders] == ['created', 'created', 'created']
+    for order in orders:
+        db.delete(db.get(Order, order.id))
+    db.delete(product1)
+    db.delete(product2)
+    db.delete(user)
+    db.commit()
+    db.close()
+
+def test_builder_save_many_unknown_product():
+    db = SessionLocal()
+    user = User(email='bulk2@test.com', password='1', name='Bulk2')
+    db.add(user)
+    db.commit()
+    count = db.query(Order).count()
+    with pytest.raises(ValueError):
+        OrderBuilder().create_orders([(user.id, -1)]).save_many()
+    assert db.query(Order).count() == count
+    db.delete(user)
+    db.commit()
+    db.close()
+
+def test_bulk_order_item_rejects_client_status():
+    from app.controllers import BulkOrderItem, BulkOrderRequest
+    # Статус від клієнта відкидається: у пакет потрапляють лише (user_id, product_id)
+    payload = BulkOrderRequest(items=[{'product_id': 1, 'status': 'paid'}])
+    assert not hasattr(payload.items[0], 'status')
+    assert 'status' not in payload.items[0].model_dump()
+    assert list(BulkOrderItem.model_fields) == ['product_id']
+
+def test_observer_notify_many_once_per_batch():
+    calls = []
+    class BatchObserver(EmailNotifier):
+        def update_many(self, orders):
+            calls.append(len(orders))
+    class TestOrder:
+        status = 'created'
+        def __init__(self, id):
+            self.id = id
+    subject = OrderSubject()
+    subject.attach(BatchObserver())
+    subject.notify_many([TestOrder(1), TestOrder(2), TestOrder(3)])
+    assert calls == [3]
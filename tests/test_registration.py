@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from email_validator import EmailUndeliverableError
+from app.models import User, SessionLocal
+from app.facade import RegistrationFacade, DeliverabilityCache
+
+
+class StubResolver:
+    def __init__(self, bad=(), unknown=()):
+        self.bad = set(bad)
+        self.unknown = set(unknown)
+        self.calls = []
+
+    def __call__(self, domain, domain_i18n):
+        self.calls.append(domain)
+        if domain in self.bad:
+            raise EmailUndeliverableError(f"The domain name {domain} does not exist.")
+        if domain in self.unknown:
+            return {'unknown-deliverability': 'timeout'}
+        return {'mx': [(10, f'mx.{domain}')]}
+
+
+def cleanup(emails):
+    db = SessionLocal()
+    db.query(User).filter(User.email.in_(emails)).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+def test_cache_positive_and_negative():
+    resolver = StubResolver(bad={'nowhere-mail.com'})
+    cache = DeliverabilityCache(resolver=resolver)
+    cache.check('Example.com')
+    cache.check('example.com')
+    for _ in range(2):
+        with pytest.raises(EmailUndeliverableError):
+            cache.check('nowhere-mail.com')
+    assert resolver.calls == ['example.com', 'nowhere-mail.com']
+    assert cache.stats() == {'hits': 2, 'misses': 2, 'size': 2}
+
+
+def test_cache_ttl_lru_and_timeouts():
+    resolver = StubResolver(unknown={'slow.test'})
+    cache = DeliverabilityCache(resolver=resolver, ttl=0, maxsize=2)
+    cache.check('a.test')
+    cache.check('a.test')
+    assert resolver.calls == ['a.test', 'a.test']
+    cache.ttl = 3600
+    for domain in ('a.test', 'b.test', 'c.test'):
+        cache.check(domain)
+    assert cache.stats()['size'] == 2
+    cache.check('a.test')
+    assert resolver.calls[-1] == 'a.test'
+    cache.check('slow.test')
+    cache.check('slow.test')
+    assert resolver.calls.count('slow.test') == 2
+
+
+def test_register_users_batch(monkeypatch):
+    resolver = StubResolver(bad={'nowhere-mail.com'})
+    monkeypatch.setattr('app.facade.deliverability_cache', DeliverabilityCache(resolver=resolver))
+    sent = []
+    monkeypatch.setattr('app.facade.RegistrationFacade.send_confirmation_email',
+                        lambda email, name: sent.append(email))
+    emails = ['batch1@example.com', 'batch2@example.com', 'batch3@example.com']
+    cleanup(emails)
+    RegistrationFacade.register_user(emails[2], 'pw', 'Existing')
+    sent.clear()
+    results = RegistrationFacade.register_users([
+        (emails[0], 'pw', 'One'),
+        (emails[1], 'pw', 'Two'),
+        (emails[1], 'pw', 'Two again'),
+        (emails[2], 'pw', 'Three'),
+        ('x@nowhere-mail.com', 'pw', 'Bad'),
+        ('batch4@example.com', '', 'No password'),
+    ])
+    assert [ok for ok, _ in results] == [True, True, False, False, False, False]
+    assert "already registered" in results[2][1]
+    assert "already registered" in results[3][1]
+    assert "Invalid email" in results[4][1]
+    assert "password" in results[5][1]
+    assert sent == emails[:2]
+    assert resolver.calls == ['example.com', 'nowhere-mail.com']
+    db = SessionLocal()
+    assert db.query(User).filter(User.email.in_(emails)).count() == 3
+    db.close()
+    cleanup(emails)
@@ -0,0 +1,183 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from datetime import date, datetime
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from app.models import Base, Order, Product, SalesByProduct, SalesLedger, StockShard, User, SessionLocal, utc_now
+from app.reports import RollupObserver, apply_orders, backfill, reconcile, sales_report
+from app.utils import OrderSubject
+
+
+@pytest.fixture
+def shop(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'reports.db'}")
+    Base.metadata.create_all(engine)
+    db = SessionLocal(bind=engine, expire_on_commit=False)
+    user = User(email='reports@test.com', password='1', name='Reports')
+    phone = Product.create_product('phone', name='Phone', price=100, sim_count=1)
+    laptop = Product.create_product('computer', name='Laptop', price=1000, cpu='M2')
+    db.add_all([user, phone, laptop])
+    db.commit()
+    orders = [
+        Order(user_id=user.id, product_id=phone.id, status='created', created_at=datetime(2026, 3, 1, 10)),
+        Order(user_id=user.id, product_id=phone.id, status='paid', created_at=datetime(2026, 3, 1, 23, 59)),
+        Order(user_id=user.id, product_id=laptop.id, status='paid', created_at=datetime(2026, 3, 2, 0, 1)),
+        Order(user_id=user.id, product_id=laptop.id, status='expired', created_at=datetime(2026, 3, 2, 9)),
+    ]
+    db.add_all(orders)
+    db.commit()
+    db.close()
+    yield engine, user, phone, laptop, orders
+    engine.dispose()
+
+
+def report(engine, group, **kwargs):
+    db = SessionLocal(bind=engine)
+    try:
+        result = sales_report(db, group, **kwargs)
+    finally:
+        db.close()
+    return result, [(row.key, row.orders, row.revenue) for row in result.rows]
+
+
+def set_status(engine, order_id, status, price=None):
+    db = SessionLocal(bind=engine)
+    order = db.get(Order, order_id)
+    order.status = status
+    if price is not None:
+        db.get(Product, order.product_id).price = price
+    db.commit()
+    db.close()
+
+
+def test_backfill_in_chunks_is_idempotent(shop):
+    engine, *_ = shop
+    chunks = []
+    assert backfill(engine, chunk_size=3, progress=chunks.append) == 4
+    assert chunks == [3, 4]
+    # Повторний backfill без rebuild нічого не додає
+    backfill(engine)
+    result, rows = report(engine, 'type')
+    assert rows == [('computer', 1, 1000.0), ('phone', 2, 200.0)]
+    assert (result.orders, result.revenue) == (3, 1200.0)
+    assert report(engine, 'day')[1] == [('2026-03-02', 1, 1000.0), ('2026-03-01', 2, 200.0)]
+    result, rows = report(engine, 'product', limit=1)
+    assert rows == [(str(shop[3].id), 1, 1000.0)] and result.rows[0].name == 'Laptop'
+    assert result.orders == 3
+    backfill(engine, rebuild=True)
+    assert report(engine, 'type')[0].orders == 3
+
+
+def test_status_changes_apply_incrementally(shop):
+    engine, user, phone, laptop, orders = shop
+    backfill(engine)
+    subject = OrderSubject()
+    subject.attach(RollupObserver(engine))
+    db = SessionLocal(bind=engine, expire_on_commit=False)
+    order = Order(user_id=user.id, product_id=phone.id, status='created', created_at=datetime(2026, 3, 3))
+    db.add(order)
+    db.commit()
+    db.close()
+    subject.notify(order)
+    subject.notify(order)
+    assert report(engine, 'type')[0].orders == 4
+    set_status(engine, orders[0].id, 'cancelled')
+    subject.notify_many([orders[0]])
+    assert report(engine, 'type')[1] == [('computer', 1, 1000.0), ('phone', 2, 200.0)]
+    # Повернення в продажі з ціною на момент першого обліку, а не поточною
+    set_status(engine, orders[0].id, 'paid', price=5)
+    assert apply_orders([orders[0].id, orders[3].id], engine) == 1
+    assert report(engine, 'product')[1][-1] == (str(phone.id), 3, 300.0)
+
+
+def test_order_writes_update_rollups_in_their_transaction(monkeypatch):
+    from datetime import timedelta
+    from app.builder import OrderBuilder
+    from app.inventory import inventory
+    monkeypatch.setattr(inventory, 'expiry', True)
+    db = SessionLocal(expire_on_commit=False)
+    # Інші тести видаляють свої замовлення й товари, а SQLite повторно видає їхні id
+    db.query(SalesLedger).filter(SalesLedger.order_id.not_in(db.query(Order.id))).delete(synchronize_session=False)
+    db.query(SalesByProduct).filter(SalesByProduct.product_id.not_in(db.query(Product.id))).delete(
+        synchronize_session=False)
+    user = User(email='rollup-tx@test.com', password='1', name='Rollup')
+    product = Product.create_product('phone', name='RollupPhone', price=10, sim_count=1)
+    db.query(User).filter_by(email=user.email).delete()
+    db.add_all([user, product])
+    db.commit()
+
+    def sold():
+        # Нова транзакція читання: у WAL попередня бачила б старий знімок
+        db.rollback()
+        row = db.get(SalesByProduct, product.id, populate_existing=True)
+        return (row.orders, row.revenue) if row else (0, 0.0)
+
+    try:
+        # Жодних спостерігачів: зведення оновлює сам код, що пише замовлення
+        OrderBuilder().create_order(user, product).save()
+        OrderBuilder().create_orders([(user.id, product.id)] * 2).save_many()
+        assert sold() == (3, 30.0)
+        inventory.set_stock(product.id, 1)
+        OrderBuilder().create_order(user, product).save()
+        assert sold() == (4, 40.0)
+        inventory.release_expired(now=utc_now() + timedelta(seconds=inventory.reservation_ttl + 1))
+        assert sold() == (3, 30.0)
+    finally:
+        order_ids = [o.id for o in db.query(Order).filter_by(product_id=product.id)]
+        db.query(SalesLedger).filter(SalesLedger.order_id.in_(order_ids)).delete()
+        db.query(SalesByProduct).filter_by(product_id=product.id).delete()
+        db.query(Order).filter_by(product_id=product.id).delete()
+        db.query(StockShard).filter_by(product_id=product.id).delete()
+        db.delete(db.get(Product, product.id))
+        db.query(User).filter_by(id=user.id).delete()
+        db.commit()
+        db.close()
+
+
+def test_reconcile_applies_missed_events(shop):
+    engine, user, phone, laptop, orders = shop
+    backfill(engine)
+    # Замовлення і зміна статусу записані в обхід застосунку
+    db = SessionLocal(bind=engine, expire_on_commit=False)
+    order = Order(user_id=user.id, product_id=laptop.id, status='created', created_at=datetime(2026, 3, 2, 12))
+    db.add(order)
+    db.commit()
+    db.close()
+    set_status(engine, orders[1].id, 'expired')
+    assert reconcile(engine, chunk_size=1) == 2
+    assert report(engine, 'type')[1] == [('computer', 2, 2000.0), ('phone', 1, 100.0)]
+    assert reconcile(engine) == 0
+
+
+def test_report_filters_and_validation(shop):
+    engine, *_ = shop
+    backfill(engine)
+    result, rows = report(engine, 'day', since=date(2026, 3, 2), until=date(2026, 3, 31))
+    assert rows == [('2026-03-02', 1, 1000.0)] and (result.orders, result.revenue) == (1, 1000.0)
+    with pytest.raises(ValueError):
+        report(engine, 'customer')
+
+
+def test_sales_report_is_staff_only(monkeypatch):
+    from app.main import app
+    from app.sessions import Principal, session_store
+    buyer = session_store.create(Principal(1, 'Buyer', 'buyer@test.com'))
+    staff = session_store.create(Principal(2, 'Staff', 'Staff@Test.com'))
+    monkeypatch.setattr('app.sessions.STAFF_EMAILS', frozenset({'staff@test.com'}))
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            statuses = [(await client.get('/reports/sales')).status_code]
+            for token in (buyer, staff):
+                client.cookies.set('session_token', token)
+                statuses.append((await client.get('/reports/sales')).status_code)
+            return statuses
+
+    try:
+        assert asyncio.run(scenario()) == [401, 403, 200]
+    finally:
+        session_store.revoke(buyer)
+        session_store.revoke(staff)
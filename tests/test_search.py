@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Product, Phone, Computer
+from app.importer import ProductImporter
+from app.search import (ensure_search_index, match_expression, rebuild_search_index, search, search_async)
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def add(factory, *products):
+    db = factory()
+    db.add_all(products)
+    db.commit()
+    ids = [p.id for p in products]
+    db.close()
+    return ids
+
+
+def test_match_expression_escapes_input():
+    assert match_expression('iPhone 15') == '"iPhone"* "15"*'
+    assert match_expression('name:"x" OR -') == '"name"* "x"* "OR"*'
+    assert match_expression('  ') is None
+
+
+def test_triggers_keep_index_in_sync(db_engine):
+    factory = sessionmaker(bind=db_engine, autoflush=False)
+    assert ensure_search_index(db_engine)
+    assert not ensure_search_index(db_engine)
+    phone_id, pc_id, _ = add(factory,
+                             Product.create_product('phone', name='Galaxy S24', price=30000, sim_count=2),
+                             Product.create_product('computer', name='ThinkPad X1', price=60000, cpu='Intel i7'),
+                             Product.create_product('computer', name='Galaxy Book', price=40000, cpu='Intel i5'))
+    assert [p.name for p in search('gal', session_factory=factory)] == ['Galaxy S24', 'Galaxy Book']
+    assert [p.id for p in search('i7', session_factory=factory)] == [pc_id]
+    assert search('galaxy', product_type='phone', session_factory=factory)[0].sim_count == 2
+    db = factory()
+    db.get(Computer, pc_id).cpu = 'AMD Ryzen'
+    db.get(Phone, phone_id).name = 'Pixel 9'
+    db.commit()
+    db.delete(db.get(Phone, phone_id))
+    db.commit()
+    db.close()
+    assert [p.name for p in search('ryz', session_factory=factory)] == ['ThinkPad X1']
+    assert search('pixel', session_factory=factory) == ()
+    assert search('', session_factory=factory) == ()
+
+
+def test_bm25_prefers_name_matches(db_engine):
+    factory = sessionmaker(bind=db_engine, autoflush=False)
+    ensure_search_index(db_engine)
+    add(factory, Product.create_product('computer', name='Office PC', price=1, cpu='Apple M2'),
+        Product.create_product('computer', name='Apple iMac', price=2, cpu='M3'))
+    assert [p.name for p in search('apple', session_factory=factory)] == ['Apple iMac', 'Office PC']
+
+
+def test_rebuild_indexes_existing_and_imported_catalog(db_engine, tmp_path):
+    factory = sessionmaker(bind=db_engine, autoflush=False)
+    add(factory, Product.create_product('phone', name='Legacy Phone', price=1, sim_count=1))
+    # Каталог, створений до появи індексу, заповнюється при першому ensure_search_index
+    assert ensure_search_index(db_engine)
+    ProductImporter(factory).run([{'type': 'computer', 'name': 'Imported Desktop', 'price': 5, 'cpu': 'Xeon'}])
+    assert [p.name for p in search('xeon', session_factory=factory)] == ['Imported Desktop']
+    assert rebuild_search_index(db_engine) == 2
+    assert [p.name for p in search('legacy', session_factory=factory)] == ['Legacy Phone']
+
+    async def run():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'search.db'}")
+        try:
+            return await search_async('imp', session_factory=async_sessionmaker(bind=async_engine))
+        finally:
+            await async_engine.dispose()
+    assert [p.name for p in asyncio.run(run())] == ['Imported Desktop']
@@ -0,0 +1,99 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+import pytest
+from app.sessions import (Principal, SessionStore, MemoryBackend, SQLiteBackend, FileBackend, RevocationLog,
+                          SessionPurger)
+
+PRINCIPAL = Principal(7, 'Session', 'session@test.com')
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'file'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'sessions.db'))
+    if request.param == 'file':
+        return FileBackend(str(tmp_path / 'sessions'))
+    return MemoryBackend()
+
+
+def test_session_create_get_revoke(backend):
+    store = SessionStore(backend)
+    token = store.create(PRINCIPAL)
+    assert store.get(token) == PRINCIPAL
+    assert store.get('unknown-token') is None
+    store.revoke(token)
+    assert store.get(token) is None
+
+
+def test_session_shared_between_workers(backend):
+    worker1 = SessionStore(backend)
+    worker2 = SessionStore(backend)
+    token = worker1.create(PRINCIPAL)
+    assert worker2.get(token) == PRINCIPAL
+    assert worker2.stats()['misses'] == 1
+    assert worker2.get(token) == PRINCIPAL
+    assert worker2.stats()['hits'] == 1
+
+
+def test_revoke_reaches_other_workers_cache(backend, tmp_path):
+    db, generation = str(tmp_path / 'revocations.db'), str(tmp_path / 'revoked')
+    worker1 = SessionStore(backend, revocations=RevocationLog(db, generation))
+    worker2 = SessionStore(backend, revocations=RevocationLog(db, generation))
+    token = worker1.create(PRINCIPAL)
+    other = worker1.create(Principal(8, 'Other', 'other@test.com'))
+    assert worker2.get(token) == PRINCIPAL and worker2.get(other).id == 8
+    misses = worker2.stats()['misses']
+    worker1.revoke(token)
+    # Поки журнал не перечитано, admission не довіряє кешу; get прибирає лише відкликаний ключ
+    assert worker2.cached(other) is None
+    assert worker2.get(token) is None
+    assert worker2.get(other).id == 8
+    assert worker2.cached(other).id == 8
+    assert worker2.stats()['misses'] == misses + 1
+    # Без журналу відкликання видно лише після LOCAL_CACHE_TTL
+    stale = SessionStore(backend)
+    token = worker1.create(PRINCIPAL)
+    assert stale.get(token) == PRINCIPAL
+    worker1.revoke(token)
+    assert stale.get(token) == PRINCIPAL
+
+
+def test_purge_drops_expired_sessions_and_old_revocations(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'sessions.db'))
+    log = RevocationLog(str(tmp_path / 'sessions.db'), str(tmp_path / 'revoked'), retention=0)
+    store = SessionStore(backend, ttl=0.05, revocations=log)
+    store.revoke(store.create(PRINCIPAL))
+    store.create(Principal(8, 'Other', 'other@test.com'))
+    time.sleep(0.1)
+    purger = SessionPurger(store, interval=60)
+    purger.start()
+    purger.stop()
+    conn = backend._connect()
+    assert conn.execute('SELECT COUNT(*) FROM auth_sessions').fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM auth_revocations').fetchone()[0] == 0
+
+
+def test_session_expires(backend):
+    store = SessionStore(backend, ttl=0.05, cache_ttl=0.05)
+    token = store.create(PRINCIPAL)
+    assert store.get(token) == PRINCIPAL
+    time.sleep(0.1)
+    assert store.get(token) is None
+
+
+def test_session_lru_eviction():
+    backend = MemoryBackend()
+    store = SessionStore(backend, cache_size=2)
+    tokens = [store.create(Principal(i, 'U', f'u{i}@test.com')) for i in range(3)]
+    assert store.stats()['cached'] == 2
+    # Витіснений з локального кешу токен дочитується з backend
+    assert store.get(tokens[0]).id == 0
+    assert store.stats()['misses'] == 1
+
+
+def test_session_backend_stores_only_token_hash():
+    backend = MemoryBackend()
+    token = SessionStore(backend).create(PRINCIPAL)
+    assert token not in backend._data
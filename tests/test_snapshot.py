@@ -0,0 +1,63 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import subprocess
+import jinja2
+import pytest
+from app.models import Product, SessionLocal
+from app.catalog import CatalogCache, ProductView
+from app.snapshot import SharedSnapshotStore, MappedCatalog, ProductRecord, encode
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_records_roundtrip_as_product_views():
+    views = [ProductView(7, 'Ноутбук', 1500.5, 'computer', None, 'M2'),
+             ProductView(3, 'Phone', 99.0, 'phone', 2, None),
+             ProductView(5, 'Phone', 0.0, 'phone', 0, None)]
+    mapped = MappedCatalog(encode(4, views))
+    assert mapped.generation == 4
+    assert [p.id for p in mapped.products] == [3, 5, 7]
+    # Записи не зберігаються у воркері: view створюється при кожному доступі
+    assert mapped.products[0] is not mapped.products[0] and mapped.products[0] == mapped.products[-3]
+    assert [p.id for p in mapped.products[1:]] == [5, 7] and len(mapped.products) == 3
+    with pytest.raises(IndexError):
+        mapped.products[3]
+    assert mapped.by_id[7] == views[0] and mapped.by_id.get(5) == views[2]
+    assert mapped.by_id.get(4) is None and 4 not in mapped.by_id and len(mapped.by_id) == 3
+    assert mapped.by_id[3]._asdict() == views[1]._asdict()
+    with pytest.raises(AttributeError):
+        mapped.products[0].name = 'changed'
+    with pytest.raises(TypeError):
+        mapped.by_id[1] = None
+    html = jinja2.Template('{% for p in products %}{{ p.name }}:{{ p.price }}:{{ p.cpu or "" }};{% endfor %}')
+    assert html.render(products=mapped.products) == 'Phone:99.0:;Phone:0.0:;Ноутбук:1500.5:M2;'
+
+
+def test_workers_share_snapshot_and_detect_new_generation(tmp_path):
+    path = str(tmp_path / 'catalog.snap')
+    first, second = CatalogCache(store=SharedSnapshotStore(path)), CatalogCache(store=SharedSnapshotStore(path))
+    snapshot = first.snapshot()
+    assert all(isinstance(p, ProductRecord) for p in snapshot.products)
+    # Другий воркер мапає вже опублікований файл, без запиту до БД
+    assert second.snapshot().version == snapshot.version
+    assert (first.store.publishes, second.store.publishes) == (1, 0)
+
+    db = SessionLocal()
+    phone = Product.create_product('phone', name='SharedPhone', price=321, sim_count=1)
+    db.add(phone)
+    db.commit()
+    try:
+        # Зміну зафіксував інший процес (наприклад, імпорт): покоління росте у спільному файлі
+        subprocess.run([sys.executable, '-c', f'from app.snapshot import SharedSnapshotStore; '
+                                              f'SharedSnapshotStore({path!r}).bump()'], cwd=ROOT, check=True)
+        assert second.version == snapshot.version + 1
+        fresh = asyncio.run(second.snapshot_async())
+        assert fresh.by_id[phone.id] == ProductView(phone.id, 'SharedPhone', 321, 'phone', 1, None)
+        assert first.get(phone.id).name == 'SharedPhone'
+        assert second.store.publishes + first.store.publishes == 2
+    finally:
+        db.delete(phone)
+        db.commit()
+        db.close()
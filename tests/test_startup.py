@@ -0,0 +1,66 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from sqlalchemy import create_engine, inspect, text
+from app.models import Product, SessionLocal
+from app.startup import (SCHEMA_VERSION, FirstRequestMiddleware, StartupProfile, create_templates, migrate,
+                         precompile_templates, schema_version)
+
+
+def test_migrate_runs_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'boot.db'}")
+    assert schema_version(engine) == 0
+    assert migrate(engine) == (0, SCHEMA_VERSION)
+    assert schema_version(engine) == SCHEMA_VERSION
+    tables = set(inspect(engine).get_table_names())
+    assert {'products', 'orders', 'users', 'products_fts', 'schema_version'} <= tables
+    db = SessionLocal(bind=engine)
+    assert db.query(Product).count() == 2
+    db.close()
+    # Повторний старт: жодної міграції і жодного повторного seed
+    assert migrate(engine) == (SCHEMA_VERSION, SCHEMA_VERSION)
+    db = SessionLocal(bind=engine)
+    assert db.query(Product).count() == 2
+    db.close()
+    engine.dispose()
+
+
+def test_migrate_resumes_from_stored_version(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text('UPDATE schema_version SET version = 3'))
+        conn.execute(text('DROP TABLE products_fts'))
+    assert migrate(engine) == (3, SCHEMA_VERSION)
+    assert 'products_fts' in inspect(engine).get_table_names()
+    engine.dispose()
+
+
+def test_precompiled_templates_use_bytecode_cache(tmp_path):
+    templates = create_templates(cache_dir=str(tmp_path))
+    names = precompile_templates(templates)
+    assert 'products.html' in names
+    assert len(os.listdir(tmp_path)) == len(names)
+    # Інше середовище (новий воркер) бере байткод з кешу
+    other = create_templates(cache_dir=str(tmp_path))
+    assert other.env.get_template('login.html').render(request=None)
+
+
+def test_startup_profile_and_first_request():
+    profile = StartupProfile()
+    with profile.phase('migrate'):
+        pass
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope['type'])
+
+    middleware = FirstRequestMiddleware(app, profile)
+    asyncio.run(middleware({'type': 'http'}, None, None))
+    first = profile.first_request
+    asyncio.run(middleware({'type': 'http'}, None, None))
+    snapshot = profile.snapshot()
+    assert 'migrate' in snapshot['phases_ms']
+    assert first is not None and profile.first_request == first
+    assert calls == ['http', 'http']
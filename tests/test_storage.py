@@ -0,0 +1,70 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from app.models import Product, User, Order, SessionLocal, StorageProfile, apply_storage_profile
+from app.builder import GroupCommitWriter, OrderBuilder
+
+
+def test_storage_profile_sets_pragmas(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    apply_storage_profile(engine, StorageProfile(journal_mode='WAL', synchronous='NORMAL', busy_timeout_ms=1234))
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+        assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == 1234
+    engine.dispose()
+
+
+@pytest.fixture
+def order_fixtures():
+    # Потоки читають user/product без refresh: спільна Session не допускає конкурентних lazy load
+    db = SessionLocal(expire_on_commit=False)
+    user = User(email='group@test.com', password='1', name='Group')
+    product = Product.create_product('phone', name='GroupPhone', price=1, sim_count=1)
+    db.add_all([user, product])
+    db.commit()
+    yield db, user, product
+    db.query(Order).filter_by(user_id=user.id).delete()
+    db.delete(product)
+    db.delete(user)
+    db.commit()
+    db.close()
+
+
+def test_group_commit_coalesces_concurrent_saves(order_fixtures):
+    db, user, product = order_fixtures
+    writer = GroupCommitWriter(max_wait=0.02)
+    OrderBuilder.group_commit = writer
+    orders = []
+    try:
+        threads = [threading.Thread(target=lambda: orders.append(OrderBuilder().create_order(user, product).save()))
+                   for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        OrderBuilder.group_commit = None
+        writer.stop()
+    assert len({o.id for o in orders}) == 20
+    assert writer.orders == 20
+    assert writer.batches < 20
+    assert db.query(Order).filter_by(user_id=user.id).count() == 20
+
+
+def test_group_commit_isolates_failing_order(order_fixtures):
+    db, user, product = order_fixtures
+    existing = OrderBuilder().create_order(user, product).save()
+    writer = GroupCommitWriter()
+    try:
+        duplicate = Order(id=existing.id, user_id=user.id, product_id=product.id)
+        with pytest.raises(IntegrityError):
+            writer.submit(duplicate)
+        order = writer.submit(Order(user_id=user.id, product_id=product.id))
+        assert order.id is not None
+    finally:
+        writer.stop()
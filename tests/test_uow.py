@@ -0,0 +1,103 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+from sqlalchemy import select
+from app.models import Product, User, Order, SessionLocal
+from app.builder import OrderBuilder
+from app.facade import RegistrationFacade, DeliverabilityCache
+from app.uow import UnitOfWork, AsyncUnitOfWork
+
+
+def test_uow_commits_once_and_counts_queries():
+    db = SessionLocal()
+    stale = db.query(User).filter_by(email='uow@test.com').first()
+    if stale:
+        db.delete(stale)
+        db.commit()
+    product = Product.create_product('phone', name='UowPhone', price=1, sim_count=1)
+    db.add(product)
+    db.commit()
+    sent = []
+    with UnitOfWork() as uow:
+        user = User(email='uow@test.com', password='1', name='Uow')
+        uow.session.add(user)
+        uow.session.flush()
+        order = OrderBuilder().create_order(user, product).save(uow.session)
+        order_id, user_id = order.id, user.id
+        uow.on_commit(lambda: sent.append(order_id))
+        assert order_id is not None
+        assert sent == []
+        # До commit інші сесії замовлення не бачать
+        assert db.get(Order, order_id) is None
+        uow.commit()
+        assert sent == [order_id]
+        assert uow.query_count >= 2
+    saved = db.get(Order, order_id)
+    assert saved is not None
+    db.delete(saved)
+    db.delete(db.get(User, user_id))
+    db.delete(product)
+    db.commit()
+    db.close()
+
+
+def test_uow_rolls_back_uncommitted_work():
+    called = []
+    with UnitOfWork() as uow:
+        uow.session.add(User(email='uow-rollback@test.com', password='1', name='Rollback'))
+        uow.session.flush()
+        uow.on_commit(lambda: called.append(True))
+    db = SessionLocal()
+    assert db.query(User).filter_by(email='uow-rollback@test.com').first() is None
+    db.close()
+    assert called == []
+
+
+def test_facade_register_in_uow(monkeypatch):
+    monkeypatch.setattr('app.facade.deliverability_cache', DeliverabilityCache(resolver=lambda domain, i18n: {}))
+    sent = []
+    monkeypatch.setattr('app.facade.RegistrationFacade.send_confirmation_email',
+                        lambda email, name: sent.append(email))
+    email = 'uow-facade@test.com'
+    with UnitOfWork() as uow:
+        success, _ = RegistrationFacade.register_user(email, 'pw', 'Facade', uow=uow)
+        assert success
+        assert sent == []
+        uow.commit()
+    assert sent == [email]
+    with UnitOfWork() as uow:
+        success, msg = RegistrationFacade.register_user(email, 'pw', 'Facade', uow=uow)
+        assert not success
+        assert "already registered" in msg
+    db = SessionLocal()
+    db.delete(db.query(User).filter_by(email=email).first())
+    db.commit()
+    db.close()
+
+
+def test_async_uow_shares_session_with_builder():
+    db = SessionLocal()
+    user = User(email='async-uow@test.com', password='1', name='AsyncUow')
+    product = Product.create_product('computer', name='AsyncUowPC', price=1, cpu='i5')
+    db.add_all([user, product])
+    db.commit()
+
+    async def flow():
+        async with AsyncUnitOfWork() as uow:
+            loaded = (await uow.session.execute(select(User).filter_by(email=user.email))).scalars().first()
+            order = await OrderBuilder().create_order(loaded, product).save_async(uow.session)
+            statuses = await uow.run_sync(lambda session: session.get(Order, order.id).status)
+            await uow.commit()
+            return order.id, statuses, uow.query_count
+
+    order_id, status, queries = asyncio.run(flow())
+    assert status == 'created'
+    assert queries >= 2
+    saved = db.get(Order, order_id)
+    assert saved is not None
+    db.delete(saved)
+    db.delete(product)
+    db.delete(user)
+    db.commit()
+    db.close()